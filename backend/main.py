@@ -1,20 +1,53 @@
+import time
+from contextlib import asynccontextmanager
+
+# Début de l'import de l'application (routes et services) : durée exposée sur /metrics
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 # Import des routes (à jour selon ta structure)
 from backend.routes import (
     data,
+    debug,
+    jobs,
     prediction,
     resources,
     stats_tests,
     visualisations,
 )
+from backend.services import metrics, profiler, renderer, warmup
+from backend.services.jobs import jobs as background_jobs
+from backend.services.model_registry import registry
+from backend.services.utils import pool as stats_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Modèles chargés une fois, puis surveillés pour un rechargement à chaud
+    started = time.perf_counter()
+    registry.start()
+    warmup.record("models", time.perf_counter() - started)
+    # scipy, plotly, kaleido (rendu jetable)... chargés en arrière-plan selon WARMUP :
+    # le premier graphique ne paie ni les imports ni Chromium
+    warmup.start()
+    # Processus de calcul (analyse globale, bootstrap) démarrés une fois, hors des requêtes
+    stats_pool.start()
+    yield
+    background_jobs.shutdown()
+    registry.stop()
+    renderer.shutdown()
+    stats_pool.shutdown()
+
 
 # Création de l'application FastAPI
 app = FastAPI(
     title="TTK StatTestIA – API Backend",
     description="API d'analyse statistique, visualisation et prédiction du diabète.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Configuration CORS (pour Vercel et développement local)
@@ -30,15 +63,32 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lu par le frontend pour revalider les graphiques (If-None-Match) et suivre les tâches (Location)
+    expose_headers=["ETag", "Location", "Preference-Applied", "X-Model-Used", "X-Model-Name", "X-Model-Version",
+                    "X-Profile-Id"],
 )
+# Latences, requêtes en cours et tailles par route (exposées sur /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
+# Profil d'une requête à la demande (X-Profile: 1 + X-Admin-Token) ; absent sans ADMIN_TOKEN
+if profiler.PROFILING_ENABLED:
+    app.add_middleware(profiler.ProfilingMiddleware)
 
 # Inclusion des routes
 app.include_router(data.router, prefix="/data", tags=["Données"])
+app.include_router(debug.router, prefix="/debug", tags=["Débogage"], include_in_schema=profiler.PROFILING_ENABLED)
+app.include_router(jobs.router, prefix="/jobs", tags=["Tâches"])
 app.include_router(prediction.router, prefix="/prediction", tags=["Prédiction"])
 app.include_router(resources.router, prefix="/resources", tags=["Ressources"])
 app.include_router(stats_tests.router, prefix="/stats", tags=["Tests statistiques"])
 app.include_router(visualisations.router, prefix="/visualisation", tags=["Visualisation"])
 
+warmup.record("import", time.perf_counter() - _import_started)
+
+# Métriques au format Prometheus
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Page d'accueil (test rapide)
 @app.get("/")
 async def root():
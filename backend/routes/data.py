@@ -1,42 +1,45 @@
-from fastapi import APIRouter, UploadFile, Form
-import pandas as pd
-from io import StringIO
+from fastapi import APIRouter, Depends, UploadFile, Form
+from starlette.concurrency import run_in_threadpool
+from backend.routes.deps import get_session_id
+from backend.services.compaction import memory_report
 from backend.services.data_store import DataStore
-from backend.services.utils.helpers import numeric_columns, categorical_columns
+from backend.services.ingest import ingest_csv
+from backend.services.profile import get_profile
 
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_csv(file: UploadFile):
+async def upload_csv(file: UploadFile, session_id: str = Depends(get_session_id)):
     """
     Téléverser un CSV, détecter le séparateur automatiquement,
     le sauvegarder en mémoire et renvoyer les colonnes disponibles.
+    Le fichier est lu en flux (jamais entièrement en mémoire) ; le débit de lecture
+    est renvoyé dans `ingest.throughput_mb_s`.
     """
     try:
-        # === Lire le fichier entier ===
-        raw = await file.read()
-        
-        # === Détection automatique du séparateur ===
-        sample = raw[:10000].decode("utf-8", errors="ignore")
-        sep = ","
-        if sample.count(";") > sample.count(",") and sample.count(";") > sample.count("\t"):
-            sep = ";"
-        elif sample.count("\t") > sample.count(","):
-            sep = "\t"
-
-        # === Lecture complète du fichier CSV ===
-        df = pd.read_csv(StringIO(raw.decode("utf-8", errors="ignore")), sep=sep)
+        # === Fichier tamponné lu sur place, détection du séparateur, lecture multi-thread ===
+        df, ingest = await ingest_csv(file)
         
         # === Sauvegarde en mémoire via DataStore ===
-        DataStore.set_df(df)
+        # Snapshot et profil calculés hors de la boucle d'événements (comme la lecture)
+        compaction = ingest.pop("compaction", None)
+        await run_in_threadpool(DataStore.set_df, df, session_id)
+        if compaction is not None:
+            DataStore.set_extra("compaction", compaction, session_id)
+            ingest["bytes_before"] = compaction["total_bytes_before"]
+            ingest["bytes_after"] = compaction["total_bytes_after"]
+        # Profil des colonnes calculé une fois ici, relu ensuite par toutes les routes
+        await run_in_threadpool(get_profile, session_id)
 
         # === Réponse JSON envoyée au frontend ===
         return {
             "message": "Fichier téléversé avec succès.",
+            "session_id": session_id,
             "rows": int(df.shape[0]),
             "cols": int(df.shape[1]),
-            "sep": sep,
+            "sep": ingest["sep"],
             "columns": list(df.columns),
+            "ingest": ingest,
         }
 
     except Exception as e:
@@ -44,57 +47,83 @@ async def upload_csv(file: UploadFile):
 
 # --- Cible (colonne à prédire éventuellement)
 @router.post("/set-target")
-async def set_target(target: str | None = Form(None)):
-    DataStore.set_target(target)
+async def set_target(target: str | None = Form(None), session_id: str = Depends(get_session_id)):
+    DataStore.set_target(target, session_id)
     return {"target": target}
 
 # --- Aperçu des données (10 premières lignes)
 @router.get("/preview")
-def preview(n: int = 10):
-    df = DataStore.get_df()
+def preview(n: int = 10, session_id: str = Depends(get_session_id)):
+    df = DataStore.get_df(session_id)
     if df is None:
         return {"error": "Aucune donnée téléversée."}
     return {"head": df.head(n).to_dict(orient="records")}
 
 
 @router.get("/column-values")
-def column_values(var: str, n: int | None = None):
+def column_values(var: str, n: int | None = None, session_id: str = Depends(get_session_id)):
     """Retourne les valeurs d'une colonne (optionnellement tronquées) pour calculs côté client."""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         return {"error": "Aucune donnée téléversée."}
     if var not in df.columns:
         return {"error": f"Colonne '{var}' introuvable."}
-    series = df[var].dropna()
-    # Convertir en valeurs simples (numériques si possible)
-    try:
-        vals = pd.to_numeric(series, errors='coerce').dropna().tolist()
-    except Exception:
-        vals = series.astype(str).tolist()
+    # Valeurs numériques issues du profil (conversion déjà faite au téléversement)
+    values = get_profile(session_id)[var].numeric_values()
     if n:
-        vals = vals[:int(n)]
-    return {"values": vals}
+        values = values.iloc[:int(n)]
+    return {"values": values.tolist()}
 
 # --- Liste des colonnes disponibles
 @router.get("/columns")
-def columns():
-    df = DataStore.get_df()
+def columns(session_id: str = Depends(get_session_id)):
+    df = DataStore.get_df(session_id)
     if df is None:
         return {"error": "Aucune donnée téléversée."}
+    profile = get_profile(session_id)
     return {
         "all": list(df.columns),
-        "numeric": numeric_columns(df),
-        "categorical": categorical_columns(df),
-        "target": DataStore.get_target()
+        "numeric": profile.numeric_columns(),
+        "categorical": profile.categorical_columns(),
+        "target": DataStore.get_target(session_id)
     }
 
+# --- Profil des colonnes (type, manquants, modalités, min/max)
+@router.get("/profile")
+def profile(session_id: str = Depends(get_session_id)):
+    prof = get_profile(session_id)
+    if prof is None:
+        return {"error": "Aucune donnée téléversée."}
+    return {"rows": prof.rows, "columns": [c.to_dict() for c in prof.columns.values()]}
+
+# --- Empreinte mémoire par colonne (avant / après compaction des types)
+@router.get("/memory")
+def memory(session_id: str = Depends(get_session_id)):
+    df = DataStore.get_df(session_id)
+    if df is None:
+        return {"error": "Aucune donnée téléversée."}
+    # `compaction` vaut None pour un jeu rechargé depuis un snapshot : seul l'état actuel est connu
+    return {**memory_report(df), "compaction": DataStore.get_extra("compaction", session_id)}
+
 # --- Route de débogage pour vérifier les données
 @router.get("/debug")
-async def debug_data():
-    df = DataStore.get_df()
+async def debug_data(session_id: str = Depends(get_session_id)):
+    df = DataStore.get_df(session_id)
     return {
         "data_loaded": df is not None,
         "columns": df.columns.tolist() if df is not None else [],
         "shape": df.shape if df is not None else "No data",
-        "rows_count": len(df) if df is not None else 0
-    }
\ No newline at end of file
+        "rows_count": len(df) if df is not None else 0,
+        "session_id": session_id,
+        "store": DataStore.usage(),
+    }
+
+# --- Jeux de données actuellement en mémoire (toutes sessions)
+@router.get("/sessions")
+def list_sessions():
+    return {**DataStore.usage(), "sessions": DataStore.sessions()}
+
+# --- Libérer le jeu de données de la session
+@router.delete("/session")
+def drop_session(session_id: str = Depends(get_session_id)):
+    return {"session_id": session_id, "dropped": DataStore.drop(session_id)}
\ No newline at end of file
@@ -0,0 +1,52 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from backend.routes.deps import require_admin
+from backend.services import profiler
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+# ===========================
+#     PROFILS DE REQUÊTES
+# ===========================
+# Capture : n'importe quelle requête avec `X-Profile: 1` (ou `?profile=1`) et `X-Admin-Token` ;
+# la réponse porte `X-Profile-Id`.
+
+
+@router.get("/profiles")
+def list_profiles():
+    """Profils enregistrés, du plus récent au plus ancien (requête, statut, durée, échantillons)."""
+    return {
+        "profiles": profiler.list_profiles(),
+        "interval_ms": profiler.PROFILING_INTERVAL_MS,
+        "kept": profiler.PROFILES_KEPT,
+    }
+
+
+@router.get("/profiles/{profile_id}")
+def download_profile(profile_id: str, format: Literal["speedscope", "collapsed"] = "speedscope"):
+    """
+    Profil à ouvrir dans https://www.speedscope.app (`speedscope`, par défaut) ou à passer
+    à flamegraph.pl / inferno (`collapsed` : piles repliées, une ligne par pile).
+    """
+    profile = profiler.load(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profil introuvable.")
+    if format == "collapsed":
+        return PlainTextResponse(
+            profiler.collapsed(profile),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+        )
+    return JSONResponse(
+        profile,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'},
+    )
+
+
+@router.delete("/profiles/{profile_id}")
+def delete_profile(profile_id: str):
+    if not profiler.delete(profile_id):
+        raise HTTPException(status_code=404, detail="Profil introuvable.")
+    return {"deleted": profile_id}
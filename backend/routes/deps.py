@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from fastapi import Header, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+from backend.services.data_store import DEFAULT_SESSION, SESSION_ID_PATTERN
+from backend.services.jobs import SUCCEEDED, JobContext, jobs
+from backend.services.profiler import PROFILING_ENABLED, is_admin
+
+# Attente maximale acceptée dans `Prefer: respond-async, wait=N` (secondes)
+MAX_PREFER_WAIT_S = 30.0
+
+
+def get_session_id(
+    x_session_id: Optional[str] = Header(None, alias="X-Session-ID"),
+    session_id: Optional[str] = Query(None, description="Identifiant de session / de jeu de données"),
+) -> str:
+    """
+    Résout la session courante : en-tête `X-Session-ID`, sinon paramètre `session_id`,
+    sinon la session partagée par défaut (compatibilité avec l'ancien frontend).
+    """
+    sid = x_session_id or session_id or DEFAULT_SESSION
+    if not SESSION_ID_PATTERN.match(sid):
+        raise HTTPException(status_code=400, detail="Identifiant de session invalide.")
+    return sid
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")) -> None:
+    """
+    Routes d'administration (/debug) : en-tête `X-Admin-Token` égal à ADMIN_TOKEN.
+    Sans ADMIN_TOKEN configuré, elles n'existent pas (404).
+    """
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide.")
+
+
+@dataclass
+class AsyncPreference:
+    """Le client accepte une réponse différée (202 + identifiant de tâche), après `wait` secondes au plus."""
+    requested: bool = False
+    wait: float = 0.0
+
+
+def get_async_preference(
+    prefer: Optional[str] = Header(None),
+    background: bool = Query(False, description="Calcul en tâche de fond : réponse 202 avec l'identifiant (voir /jobs)"),
+) -> AsyncPreference:
+    """
+    En-tête `Prefer: respond-async[, wait=N]` (RFC 7240) ou paramètre `background=true`.
+    Sans l'un ou l'autre, la route répond comme avant, de façon synchrone.
+    """
+    requested, wait = background, 0.0
+    for token in (prefer or "").split(","):
+        name, _, value = (t.strip() for t in token.partition("="))
+        if name.lower() == "respond-async":
+            requested = True
+        elif name.lower() == "wait":
+            try:
+                wait = min(max(float(value), 0.0), MAX_PREFER_WAIT_S)
+            except ValueError:
+                pass
+    return AsyncPreference(requested, wait if requested else 0.0)
+
+
+def run_or_submit(
+    preference: AsyncPreference,
+    kind: str,
+    session_id: str,
+    params: dict,
+    compute: Callable[[], Any],
+    cached: bool = False,
+    media_type: Optional[str] = None,
+    task: Optional[Callable[[JobContext], Any]] = None,
+) -> Any:
+    """
+    Résultat de `compute()`, calculé dans la requête ou, si le client l'accepte, dans une
+    tâche de fond : la réponse est alors `202` avec l'identifiant de la tâche (en-tête
+    `Location`), sauf si le résultat est déjà en cache ou arrive dans le délai `wait`.
+    `task` remplace `compute` dans la tâche de fond quand elle suit l'avancement.
+    """
+    if not preference.requested or cached:
+        return compute()
+    job = jobs.submit(kind, task or (lambda ctx: compute()), params=params, session_id=session_id,
+                      media_type=media_type)
+    if preference.wait > 0:
+        jobs.wait(job.id, preference.wait)
+        if job.status == SUCCEEDED:
+            return job.result
+    return JSONResponse(
+        {**job.to_dict(with_result=False), "status_url": f"/jobs/{job.id}", "result_url": f"/jobs/{job.id}/result"},
+        status_code=202,
+        headers={"Location": f"/jobs/{job.id}", "Preference-Applied": "respond-async"},
+    )
@@ -0,0 +1,70 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse, Response
+
+from backend.routes.deps import get_session_id
+from backend.services.jobs import CANCELLED, FAILED, SUCCEEDED, Job, jobs
+
+router = APIRouter()
+
+# ===========================
+#     TÂCHES DE FOND
+# ===========================
+# Soumission : toute route /stats/* ou /visualisation/* avec `Prefer: respond-async`
+# (ou `?background=true`) répond 202 avec l'identifiant ; /prediction/train aussi.
+
+
+def _job(job_id: str, session_id: str) -> Job:
+    job = jobs.get(job_id)
+    if job is None or job.session_id != session_id:
+        raise HTTPException(status_code=404, detail="Tâche introuvable ou expirée.")
+    return job
+
+
+def _status(job: Job) -> dict:
+    out = {**job.to_dict(with_result=False), "status_url": f"/jobs/{job.id}"}
+    if job.status == SUCCEEDED:
+        out["result_url"] = f"/jobs/{job.id}/result"
+    return out
+
+
+@router.get("")
+def list_jobs(kind: Optional[str] = None, session_id: str = Depends(get_session_id)):
+    """Tâches de la session (filtrées par type, ex. `stats.kruskal`), de la plus ancienne à la plus récente."""
+    return {
+        "jobs": [_status(j) for j in jobs.list(session_id=session_id) if kind is None or j.kind == kind],
+        **jobs.stats(),
+    }
+
+
+@router.get("/{job_id}")
+def job_status(job_id: str, session_id: str = Depends(get_session_id)):
+    """État et avancement d'une tâche ; `result_url` une fois terminée avec succès."""
+    return _status(_job(job_id, session_id))
+
+
+@router.get("/{job_id}/result")
+def job_result(job_id: str, session_id: str = Depends(get_session_id)):
+    """
+    Résultat de la tâche, dans la représentation de la requête d'origine (JSON, image, NDJSON).
+    409 tant qu'elle n'est pas terminée ou si elle a été annulée ; 500 si elle a échoué.
+    """
+    job = _job(job_id, session_id)
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=f"Tâche en échec : {job.error}")
+    if job.status == CANCELLED:
+        raise HTTPException(status_code=409, detail="Tâche annulée.")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Tâche non terminée ({job.status}).",
+                            headers={"Retry-After": "1", "Location": f"/jobs/{job.id}"})
+    if job.media_type is not None:
+        return Response(content=job.result, media_type=job.media_type)
+    return JSONResponse(job.result)
+
+
+@router.delete("/{job_id}")
+def cancel_job(job_id: str, session_id: str = Depends(get_session_id)):
+    """Annule la tâche : immédiatement si elle attend, au prochain point de contrôle si elle tourne."""
+    _job(job_id, session_id)
+    return _status(jobs.cancel(job_id))
@@ -1,11 +1,28 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+import itertools
 import pandas as pd
 import numpy as np
 import logging
-import pickle
 import os
 
+from backend.services.batch_prediction import (
+    check_columns,
+    frame_probabilities,
+    input_format,
+    read_chunks,
+    simulate_probabilities,
+    stream_scores,
+    trained_on_frame,
+)
+from backend.routes.deps import get_session_id
+from backend.services.ingest import detect_separator, spool_upload
+from backend.services.jobs import jobs
+from backend.services.model_registry import registry
+from backend.services.training import submit_training
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
@@ -19,102 +36,34 @@ class PredictionInput(BaseModel):
     latitude: float = 48.8566
     longitude: float = 2.3522
 
-def load_model():
-    """Charge le modèle ML entraîné"""
-    try:
-        # Chemin vers votre modèle sauvegardé
-        model_path = "backend/models/diabetes_model.pkl"
-        if os.path.exists(model_path):
-            with open(model_path, 'rb') as f:
-                model = pickle.load(f)
-            logger.info("✅ Modèle ML chargé avec succès")
-            return model
-        else:
-            logger.warning("⚠️ Modèle non trouvé, utilisation du mode simulation")
-            return None
-    except Exception as e:
-        logger.error(f"❌ Erreur chargement modèle: {e}")
-        return None
-
 def simulate_prediction(age, bmi, systolic_bp, glucose_fasting, hba1c, family_history):
     """
     Simule une prédiction réaliste basée sur les caractéristiques médicales
     Remplacez cette fonction par votre vrai modèle ML
     """
-    # Pondérations réalistes pour le diabète
-    base_risk = 0.1
-    
-    # Âge : risque augmente avec l'âge
-    age_factor = min(age / 80, 1.0) * 0.3
-    
-    # IMC : risque augmente avec l'obésité
-    bmi_factor = 0
-    if bmi < 18.5:      # Maigreur
-        bmi_factor = 0.1
-    elif bmi < 25:      # Normal
-        bmi_factor = 0.05
-    elif bmi < 30:      # Surpoids
-        bmi_factor = 0.2
-    else:               # Obésité
-        bmi_factor = 0.4
-    
-    # Pression artérielle
-    bp_factor = 0
-    if systolic_bp < 120:    # Normal
-        bp_factor = 0.05
-    elif systolic_bp < 130:  # Élevé
-        bp_factor = 0.15
-    elif systolic_bp < 140:  # Hypertension stage 1
-        bp_factor = 0.25
-    else:                    # Hypertension stage 2
-        bp_factor = 0.35
-    
-    # Glycémie à jeun (mg/dL)
-    glucose_factor = 0
-    if glucose_fasting < 100:   # Normal
-        glucose_factor = 0.05
-    elif glucose_fasting < 126: # Prédiabète
-        glucose_factor = 0.4
-    else:                       # Diabétique
-        glucose_factor = 0.8
-    
-    # HbA1c (%)
-    hba1c_factor = 0
-    if hba1c < 5.7:     # Normal
-        hba1c_factor = 0.05
-    elif hba1c < 6.5:   # Prédiabète
-        hba1c_factor = 0.5
-    else:               # Diabétique
-        hba1c_factor = 0.9
-    
-    # Antécédents familiaux
-    family_factor = family_history * 0.15
-    
-    # Calcul du risque total
-    total_risk = (
-        base_risk + 
-        age_factor + 
-        bmi_factor + 
-        bp_factor + 
-        glucose_factor + 
-        hba1c_factor + 
-        family_factor
-    )
-    
-    # Normalisation entre 0 et 1
-    probability = min(max(total_risk, 0), 0.95)
-    
-    return probability
+    # Pondérations réalistes pour le diabète (seuils dans batch_prediction.RULES,
+    # partagés avec le scoring par lots)
+    features = np.array([[age, bmi, systolic_bp, glucose_fasting, hba1c, family_history]], dtype=float)
+    return float(simulate_probabilities(features)[0])
 
 @router.post("/manual")
-async def manual_prediction(input_data: PredictionInput):
+async def manual_prediction(
+    input_data: PredictionInput,
+    model_name: Optional[str] = Query(None, alias="model", description="Version du modèle (nom du fichier .pkl)"),
+):
+    if model_name and registry.get(model_name) is None:
+        raise HTTPException(status_code=404, detail=f"Modèle '{model_name}' introuvable. Disponibles : {registry.names()}")
     try:
         logger.info(f"📥 Données reçues: {input_data.dict()}")
         
-        # Essayer de charger le vrai modèle d'abord
-        model = load_model()
+        # Essayer le vrai modèle d'abord
+        entry = registry.get(model_name)
+        model = None if entry is None else entry.model
         
-        if model:
+        if model is not None and trained_on_frame(model):
+            # Pipeline entraîné sur le jeu téléversé : il prend les champs par leur nom
+            probability = float(frame_probabilities(model, pd.DataFrame([input_data.dict()]))[0])
+        elif model is not None:
             # Utiliser le vrai modèle ML
             features = np.array([[
                 input_data.age,
@@ -156,7 +105,9 @@ async def manual_prediction(input_data: PredictionInput):
             "threshold": threshold,
             "risk_category": risk_category,
             "status": "success",
-            "model_used": "real" if model else "simulation",
+            "model_used": "real" if model is not None else "simulation",
+            "model_name": entry.name if entry else None,
+            "model_version": entry.version if entry else None,
             "latitude": input_data.latitude,
             "longitude": input_data.longitude
         }
@@ -166,4 +117,115 @@ async def manual_prediction(input_data: PredictionInput):
         
     except Exception as e:
         logger.error(f"❌ Erreur prédiction: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
+
+
+@router.post("/batch")
+async def batch_prediction(
+    file: UploadFile,
+    model_name: Optional[str] = Query(None, alias="model", description="Version du modèle (nom du fichier .pkl)"),
+    threshold: float = Query(0.5, ge=0, le=1),
+    output: Literal["ndjson", "csv"] = "ndjson",
+):
+    """
+    Score une cohorte (CSV, tableau JSON, NDJSON ou Arrow, une ligne par patient avec les
+    champs de PredictionInput). Les lignes sont lues, scorées sur des matrices entières et
+    renvoyées par blocs : la mémoire reste constante quelle que soit la taille du fichier.
+    """
+    if model_name and registry.get(model_name) is None:
+        raise HTTPException(status_code=404, detail=f"Modèle '{model_name}' introuvable. Disponibles : {registry.names()}")
+    try:
+        fmt = input_format(file.filename, file.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    entry = registry.get(model_name)
+    # Copie sur disque : le fichier tamponné par Starlette est fermé avant la fin du flux de réponse
+    path, _, head = await spool_upload(file)
+    try:
+        chunks = read_chunks(path, fmt, sep=detect_separator(head.decode("utf-8", errors="ignore")))
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError("Fichier vide.")
+        check_columns(first, entry.model if entry else None)
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=f"Lecture du fichier impossible : {e}")
+
+    def body():
+        try:
+            yield from stream_scores(itertools.chain([first], chunks), entry.model if entry else None, threshold, output)
+        finally:
+            os.remove(path)
+
+    headers = {
+        "X-Model-Used": "real" if entry else "simulation",
+        "X-Model-Name": entry.name if entry else "",
+        "X-Model-Version": str(entry.version) if entry else "",
+    }
+    media_type = "text/csv" if output == "csv" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+
+@router.get("/models")
+def list_models():
+    """Modèles en mémoire : version, temps de chargement et empreinte mémoire."""
+    return registry.describe()
+
+
+@router.post("/models/reload")
+def reload_models():
+    """Relit immédiatement le dossier des modèles (sans attendre la surveillance)."""
+    registry.refresh()
+    return registry.describe()
+
+
+# ===========================
+#     ENTRAÎNEMENT
+# ===========================
+
+class TrainInput(BaseModel):
+    target: Optional[str] = Field(None, description="Colonne cible (par défaut celle de /data/set-target)")
+    algorithm: Literal["logistic_regression", "random_forest"] = "random_forest"
+    name: Optional[str] = Field(None, description="Nom du modèle publié (par défaut <cible>_<algorithme>)")
+    n_estimators: int = Field(100, ge=10, le=1000, description="Nombre d'arbres (forêt aléatoire)")
+
+
+def _training_job(job_id: str, session_id: str):
+    job = jobs.get(job_id)
+    if job is None or job.kind != "training" or job.session_id != session_id:
+        raise HTTPException(status_code=404, detail="Entraînement introuvable.")
+    return job
+
+
+@router.post("/train", status_code=202)
+def train_model(data: TrainInput, session_id: str = Depends(get_session_id)):
+    """
+    Entraîne un modèle sur le jeu téléversé et sa cible, en tâche de fond : la réponse
+    contient l'identifiant de la tâche, à suivre avec GET /prediction/train/{job_id}.
+    Le modèle est ensuite disponible pour /prediction/manual et /prediction/batch (?model=<nom>).
+    """
+    try:
+        job = submit_training(session_id, data.target, data.algorithm, data.name, data.n_estimators)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.to_dict(with_result=False)
+
+
+@router.get("/train")
+def list_trainings(session_id: str = Depends(get_session_id)):
+    """Entraînements de la session, du plus ancien au plus récent."""
+    return {"jobs": [j.to_dict(with_result=False) for j in jobs.list(kind="training", session_id=session_id)]}
+
+
+@router.get("/train/{job_id}")
+def training_status(job_id: str, session_id: str = Depends(get_session_id)):
+    """Avancement de l'entraînement, puis métriques et nom du modèle publié."""
+    return _training_job(job_id, session_id).to_dict()
+
+
+@router.delete("/train/{job_id}")
+def cancel_training(job_id: str, session_id: str = Depends(get_session_id)):
+    """Annule l'entraînement (au prochain point de contrôle s'il a commencé)."""
+    _training_job(job_id, session_id)
+    return jobs.cancel(job_id).to_dict(with_result=False)
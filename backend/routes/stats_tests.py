@@ -1,18 +1,27 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-import pandas as pd
-import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Literal
 
 # ✅ Import correct depuis ton dossier services
 from backend.services.stats_services import (
-    spearman_corr,
-    kruskal_test,
-    ks_two_samples,
-    friedman_test,
-    mann_whitney,
+    spearman_columns,
+    kruskal_columns,
+    ks_columns,
+    spearman_matrix,
+    friedman,
+    mann_whitney_columns,
     chi2_test,
 )
+from backend.routes.deps import AsyncPreference, get_async_preference, get_session_id, run_or_submit
 from backend.services.data_store import DataStore
+from backend.services.bootstrap import MAX_RESAMPLES
+from backend.services.global_analysis import GLOBAL_MAX_LEVELS, prepare_global, stream_global
+from backend.services.jobs import JobContext
+from backend.services.permutation import DEFAULT_PERMUTATIONS, DEFAULT_TOLERANCE
+from backend.services.profile import DatasetProfile, get_profile
+from backend.services.rank_cache import RankCache, get_rank_cache
+from backend.services import metrics, result_cache
 
 router = APIRouter()
 
@@ -20,109 +29,210 @@ class TestInput(BaseModel):
     var1: str
     var2: str | None = None
 
-def _convert_to_numeric(series):
-    """Convertit une série en numérique, gère les erreurs"""
+class BootstrapInput(TestInput):
+    # bootstrap > 0 : intervalles de confiance bootstrap de la statistique (et de la taille d'effet)
+    bootstrap: int = Field(0, ge=0, le=MAX_RESAMPLES)
+    ci_method: Literal["percentile", "bca"] = "percentile"
+    confidence: float = Field(0.95, gt=0, lt=1)
+    seed: int | None = None
+
+    def bootstrap_options(self) -> dict:
+        return {"bootstrap": self.bootstrap, "ci_method": self.ci_method, "confidence": self.confidence, "seed": self.seed}
+
+class RankTestInput(BootstrapInput):
+    # "permutation" : p-value par permutation des rangs, plus fiable sur les petits effectifs
+    method: Literal["asymptotic", "permutation"] = "asymptotic"
+    n_permutations: int = Field(DEFAULT_PERMUTATIONS, ge=100, le=1_000_000)
+    # Demi-largeur visée de l'intervalle de confiance de la p-value (0 = pas d'arrêt anticipé)
+    tolerance: float = Field(DEFAULT_TOLERANCE, ge=0, lt=0.5)
+
+    def permutation_options(self) -> dict:
+        return {"method": self.method, "n_permutations": self.n_permutations, "tolerance": self.tolerance, **self.bootstrap_options()}
+
+class MatrixInput(BaseModel):
+    columns: list[str] | None = None
+    max_memory_mb: float = Field(256, gt=0)
+    # Paires avec valeurs manquantes : rangs recalculés paire par paire (identique à /spearman).
+    # False : approximation plus rapide, signalée par `"approximate": true` dans la réponse
+    exact: bool = True
+
+def _convert_to_numeric(profile: DatasetProfile, var: str):
+    """Valeurs numériques (sans NaN) d'une colonne, converties une fois pour toutes dans le profil"""
+    return profile[var].numeric_values()
+
+def _numeric_count(ranks: RankCache, var: str) -> int:
+    """Nombre de valeurs numériques d'une colonne (0 si elle n'est pas numérique), lu dans le cache de rangs"""
     try:
-        return pd.to_numeric(series, errors='coerce').dropna()
-    except:
-        return pd.Series(dtype=float)
+        return ranks.column(var).n
+    except ValueError:
+        return 0
+
+def _cached(session_id: str, test: str, columns: list[str], options: dict, compute,
+            preference: AsyncPreference | None = None):
+    """
+    Résultat mémorisé pour le contenu actuel du jeu (voir result_cache). Les résultats
+    tirés au hasard (permutations, bootstrap) ne sont mémorisés qu'avec une graine fixée.
+    Si le client accepte une réponse différée, un résultat absent du cache est calculé
+    en tâche de fond (202 + identifiant, voir /jobs).
+    """
+    def timed():
+        with metrics.span("compute"):
+            return compute()
+
+    randomized = options.get("method") == "permutation" or options.get("bootstrap", 0) > 0
+    if randomized and options.get("seed") is None:
+        run, cached = timed, False
+    else:
+        run = lambda: result_cache.cached_result(session_id, test, columns, options, timed)
+        cached = result_cache.is_cached(session_id, test, columns, options)
+    return run_or_submit(preference or AsyncPreference(), f"stats.{test}", session_id,
+                         {"columns": columns, **options}, run, cached)
 
 # ===========================
 #     TESTS NON PARAMÉTRIQUES
 # ===========================
 
 @router.post("/spearman")
-def spearman_route(data: TestInput):
+def spearman_route(data: BootstrapInput, session_id: str = Depends(get_session_id),
+                   preference: AsyncPreference = Depends(get_async_preference)):
     """Test de corrélation entre deux variables numériques"""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if data.var1 not in df.columns or data.var2 not in df.columns:
         raise HTTPException(status_code=400, detail="Colonnes invalides.")
     
     try:
-        # Conversion en numérique
-        var1_data = _convert_to_numeric(df[data.var1])
-        var2_data = _convert_to_numeric(df[data.var2])
+        # Rangs lus (ou calculés une seule fois) dans le cache du jeu de données
+        ranks = get_rank_cache(session_id)
+        n1 = _numeric_count(ranks, data.var1)
+        n2 = _numeric_count(ranks, data.var2)
         
-        if len(var1_data) == 0 or len(var2_data) == 0:
+        if n1 == 0 or n2 == 0:
             raise HTTPException(status_code=400, detail="Variables non numériques ou données manquantes")
         
-        res = spearman_corr(var1_data, var2_data)
+        options = data.bootstrap_options()
+        res = _cached(session_id, "spearman", [data.var1, data.var2], options,
+                      lambda: spearman_columns(ranks, data.var1, data.var2, **options), preference)
         return res
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du test Spearman: {str(e)}")
 
+@router.post("/spearman-matrix")
+def spearman_matrix_route(data: MatrixInput, session_id: str = Depends(get_session_id),
+                          preference: AsyncPreference = Depends(get_async_preference)):
+    """Matrice de corrélation de Spearman entre toutes les variables numériques (ou celles demandées)"""
+    df = DataStore.get_df(session_id)
+    if df is None:
+        raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
+    profile = get_profile(session_id)
+    columns = data.columns or profile.numeric_columns()
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Colonnes invalides : {missing}")
+    
+    try:
+        ranks = get_rank_cache(session_id)
+        if any(_numeric_count(ranks, c) == 0 for c in columns):
+            raise HTTPException(status_code=400, detail="Variables non numériques ou données manquantes")
+        if len(columns) < 2:
+            raise HTTPException(status_code=400, detail="Au moins deux variables numériques sont nécessaires")
+        
+        # La taille des tuiles ne change pas le résultat : elle ne fait pas partie de la clé
+        return _cached(session_id, "spearman_matrix", columns, {"exact": data.exact},
+                       lambda: spearman_matrix(ranks, columns, max_memory_mb=data.max_memory_mb, exact=data.exact),
+                       preference)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la matrice de Spearman: {str(e)}")
+
 @router.post("/mannwhitney")
-def mannwhitney_route(data: TestInput):
+def mannwhitney_route(data: RankTestInput, session_id: str = Depends(get_session_id),
+                      preference: AsyncPreference = Depends(get_async_preference)):
     """Test Mann-Whitney pour comparer deux variables numériques indépendantes"""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if data.var1 not in df.columns or data.var2 not in df.columns:
         raise HTTPException(status_code=400, detail="Colonnes invalides.")
     
     try:
-        # Conversion en numérique
-        var1_data = _convert_to_numeric(df[data.var1])
-        var2_data = _convert_to_numeric(df[data.var2])
+        # Rangs lus (ou calculés une seule fois) dans le cache du jeu de données
+        ranks = get_rank_cache(session_id)
+        n1 = _numeric_count(ranks, data.var1)
+        n2 = _numeric_count(ranks, data.var2)
         
-        if len(var1_data) == 0 or len(var2_data) == 0:
+        if n1 == 0 or n2 == 0:
             raise HTTPException(status_code=400, detail="Variables non numériques ou données manquantes")
         
         # Vérifier qu'il y a assez de données
-        if len(var1_data) < 3 or len(var2_data) < 3:
+        if n1 < 3 or n2 < 3:
             raise HTTPException(status_code=400, detail="Pas assez de données (minimum 3 observations par variable)")
         
         # Utiliser mann_whitney pour comparer les deux distributions
-        res = mann_whitney(var1_data, var2_data)
+        options = data.permutation_options()
+        res = _cached(session_id, "mann_whitney", [data.var1, data.var2], options,
+                      lambda: mann_whitney_columns(ranks, data.var1, data.var2, **options), preference)
         return res
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du test Mann-Whitney: {str(e)}")
 
 @router.post("/kruskal")
-def kruskal_route(data: TestInput):
+def kruskal_route(data: RankTestInput, session_id: str = Depends(get_session_id),
+                  preference: AsyncPreference = Depends(get_async_preference)):
     """Test Kruskal-Wallis pour comparer deux variables numériques"""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if data.var1 not in df.columns or data.var2 not in df.columns:
         raise HTTPException(status_code=400, detail="Colonnes invalides.")
     
     try:
-        # Conversion en numérique
-        var1_data = _convert_to_numeric(df[data.var1])
-        var2_data = _convert_to_numeric(df[data.var2])
+        # Rangs lus (ou calculés une seule fois) dans le cache du jeu de données
+        ranks = get_rank_cache(session_id)
+        n1 = _numeric_count(ranks, data.var1)
+        n2 = _numeric_count(ranks, data.var2)
         
-        if len(var1_data) == 0 or len(var2_data) == 0:
+        if n1 == 0 or n2 == 0:
             raise HTTPException(status_code=400, detail="Variables non numériques ou données manquantes")
         
         # Pour Kruskal-Wallis avec deux variables, on les traite comme deux groupes
-        res = kruskal_test([var1_data.values, var2_data.values])
+        options = data.permutation_options()
+        res = _cached(session_id, "kruskal", [data.var1, data.var2], options,
+                      lambda: kruskal_columns(ranks, [data.var1, data.var2], **options), preference)
         return res
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du test Kruskal-Wallis: {str(e)}")
 
 @router.post("/friedman")
-def friedman_route(data: TestInput):
+def friedman_route(data: TestInput, session_id: str = Depends(get_session_id),
+                   preference: AsyncPreference = Depends(get_async_preference)):
     """Test Friedman pour données appariées"""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
+    profile = get_profile(session_id)
     
     try:
         if not data.var1 or not data.var2:
             raise HTTPException(status_code=400, detail="Le test Friedman nécessite deux variables")
         
         # Conversion en numérique
-        var1_data = _convert_to_numeric(df[data.var1])
-        var2_data = _convert_to_numeric(df[data.var2])
+        var1_data = _convert_to_numeric(profile, data.var1)
+        var2_data = _convert_to_numeric(profile, data.var2)
         
         if len(var1_data) == 0 or len(var2_data) == 0:
             raise HTTPException(status_code=400, detail="Variables non numériques ou données manquantes")
         
         # Trouver une troisième variable numérique
-        numeric_cols = df.select_dtypes(include=['number']).columns
+        numeric_cols = profile.numeric_columns()
         other_numeric_cols = [col for col in numeric_cols if col not in [data.var1, data.var2]]
         
         if len(other_numeric_cols) == 0:
@@ -130,7 +240,7 @@ def friedman_route(data: TestInput):
             raise HTTPException(status_code=400, detail="Le test Friedman nécessite une troisième variable numérique")
         
         third_var = other_numeric_cols[0]
-        var3_data = _convert_to_numeric(df[third_var])
+        var3_data = _convert_to_numeric(profile, third_var)
         
         # Prendre le minimum d'observations communes
         min_len = min(len(var1_data), len(var2_data), len(var3_data))
@@ -142,56 +252,143 @@ def friedman_route(data: TestInput):
         var2_data = var2_data.values[:min_len] 
         var3_data = var3_data.values[:min_len]
         
-        res = friedman_test([var1_data, var2_data, var3_data])
+        # Rangs intra-ligne vectorisés (pas de boucle Python par ligne)
+        res = _cached(session_id, "friedman", [data.var1, data.var2, third_var], {},
+                      lambda: friedman([var1_data, var2_data, var3_data]), preference)
         return res
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du test Friedman: {str(e)}")
 
 @router.post("/ks")
-def ks_route(data: TestInput):
+def ks_route(data: BootstrapInput, session_id: str = Depends(get_session_id),
+             preference: AsyncPreference = Depends(get_async_preference)):
     """Test Kolmogorov-Smirnov pour comparer deux distributions"""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if data.var1 not in df.columns or data.var2 not in df.columns:
         raise HTTPException(status_code=400, detail="Colonnes invalides.")
     
     try:
-        # Conversion en numérique
-        var1_data = _convert_to_numeric(df[data.var1])
-        var2_data = _convert_to_numeric(df[data.var2])
+        # Rangs lus (ou calculés une seule fois) dans le cache du jeu de données
+        ranks = get_rank_cache(session_id)
+        n1 = _numeric_count(ranks, data.var1)
+        n2 = _numeric_count(ranks, data.var2)
         
-        if len(var1_data) == 0 or len(var2_data) == 0:
+        if n1 == 0 or n2 == 0:
             raise HTTPException(status_code=400, detail="Variables non numériques ou données manquantes")
         
-        res = ks_two_samples(var1_data, var2_data)
+        options = data.bootstrap_options()
+        res = _cached(session_id, "ks", [data.var1, data.var2], options,
+                      lambda: ks_columns(ranks, data.var1, data.var2, **options), preference)
         return res
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur lors du test Kolmogorov-Smirnov: {str(e)}")
 
 
 @router.post("/chi2")
-def chi2_route(data: TestInput):
+def chi2_route(data: TestInput, session_id: str = Depends(get_session_id),
+               preference: AsyncPreference = Depends(get_async_preference)):
     """Test du Chi² d'indépendance entre deux variables catégorielles"""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
+    profile = get_profile(session_id)
     if not data.var1 or not data.var2:
         raise HTTPException(status_code=400, detail="Le test Chi² nécessite deux variables.")
     if data.var1 not in df.columns or data.var2 not in df.columns:
         raise HTTPException(status_code=400, detail="Colonnes invalides.")
 
     try:
-        # On convertit en catégories (string) pour construire la table de contingence
-        a = df[data.var1].astype(str).fillna('NA')
-        b = df[data.var2].astype(str).fillna('NA')
+        # Nombre de modalités lu dans le profil (les manquants comptent comme une modalité)
+        n_a = profile[data.var1].distinct_count + (profile[data.var1].null_count > 0)
+        n_b = profile[data.var2].distinct_count + (profile[data.var2].null_count > 0)
         # Si l'une des colonnes a trop de modalités, prévenir
-        if a.nunique() > 100 or b.nunique() > 100:
+        if n_a > 100 or n_b > 100:
             raise HTTPException(status_code=400, detail="Trop de modalités pour effectuer le test Chi² (max 100 par variable).")
 
-        res = chi2_test(df, data.var1, data.var2)
+        res = _cached(session_id, "chi2", [data.var1, data.var2], {},
+                      lambda: chi2_test(df, data.var1, data.var2), preference)
         return res
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Erreur lors du test Chi²: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Erreur lors du test Chi²: {str(e)}")
+
+
+# ===========================
+#     ANALYSE GLOBALE
+# ===========================
+
+@router.get("/global")
+def global_route(
+    target: str | None = None,
+    max_levels: int = Query(GLOBAL_MAX_LEVELS, ge=2),
+    session_id: str = Depends(get_session_id),
+    preference: AsyncPreference = Depends(get_async_preference),
+):
+    """
+    Analyse globale : Kruskal-Wallis, Spearman, Kolmogorov-Smirnov et Friedman pour chaque paire
+    variable catégorielle × variable numérique. Les résultats sont envoyés en NDJSON
+    (une ligne JSON par paire) au fur et à mesure de leur calcul. En tâche de fond,
+    le même NDJSON est lu sur /jobs/{job_id}/result, avec l'avancement paire par paire.
+    """
+    df = DataStore.get_df(session_id)
+    if df is None:
+        raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
+    target = target or DataStore.get_target(session_id)
+    if target is not None and target not in df.columns:
+        raise HTTPException(status_code=400, detail="Colonne cible invalide.")
+
+    try:
+        state, header = prepare_global(df, get_profile(session_id), get_rank_cache(session_id), target, max_levels)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la préparation de l'analyse globale: {str(e)}")
+    if header["pairs"] == 0:
+        raise HTTPException(status_code=400, detail="Aucune paire variable catégorielle × variable numérique à analyser.")
+
+    def collect(ctx: JobContext) -> bytes:
+        lines = []
+        stream = stream_global(state, header)
+        try:
+            for line in stream:
+                lines.append(line)
+                done = min(len(lines) - 1, header["pairs"])
+                ctx.progress(done / (header["pairs"] + 1), f"{done}/{header['pairs']} paires")
+        finally:
+            # Annulation : les paires non commencées sont abandonnées
+            stream.close()
+        return "".join(lines).encode("utf-8")
+
+    def respond() -> StreamingResponse:
+        # L'état partagé est écrit avant l'envoi du statut : une erreur ici reste une vraie 500
+        try:
+            lines = stream_global(state, header)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erreur lors de l'analyse globale: {str(e)}")
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    return run_or_submit(
+        preference, "stats.global", session_id, {"target": target, "max_levels": max_levels},
+        respond, media_type="application/x-ndjson", task=collect,
+    )
+
+
+# ===========================
+#     CACHE DES RÉSULTATS
+# ===========================
+
+@router.get("/cache")
+def cache_stats_route():
+    """Compteurs du cache de résultats (succès, échecs, taille)"""
+    return result_cache.cache_stats()
+
+@router.delete("/cache")
+def cache_clear_route():
+    """Vide le cache de résultats"""
+    result_cache.clear()
+    return {"message": "Cache des résultats vidé.", **result_cache.cache_stats()}
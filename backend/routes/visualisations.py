@@ -1,5 +1,6 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
+from typing import TYPE_CHECKING, Callable, Literal, Optional
 import base64
 
 # ✅ Imports corrigés (avec le bon chemin complet)
@@ -9,10 +10,17 @@ from backend.services.viz_services import (
     scatter,
     line,
     kde,
-    bar
+    bar,
+    figure_bytes,
 )
+from backend.routes.deps import AsyncPreference, get_async_preference, get_session_id, run_or_submit
+from backend.services import figure_cache, metrics, renderer
 from backend.services.data_store import DataStore
 
+# plotly n'est chargé qu'au premier graphique (ou par le préchauffage, voir services/warmup.py)
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
 router = APIRouter()
 
 # ===========================
@@ -24,26 +32,141 @@ def _encode_fig_to_base64(fig_bytes: bytes) -> str:
     return base64.b64encode(fig_bytes).decode("utf-8")
 
 
+# Types acceptés (en-tête Accept) -> représentation renvoyée. `json` (image PNG en
+# base64 dans un objet JSON) reste la réponse par défaut de l'ancien frontend.
+_ACCEPTED = {
+    "application/json": "json",
+    "application/*": "json",
+    "*/*": "json",
+    "image/png": "png",
+    "image/svg+xml": "svg",
+    "image/*": "png",
+    "application/vnd.plotly+json": "spec",
+}
+_MEDIA_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "spec": "application/vnd.plotly+json",
+}
+
+
+def _negotiate(accept: Optional[str]) -> str:
+    """Représentation préférée par le client (qualité `q` la plus haute, puis ordre de l'en-tête)."""
+    if not accept:
+        return "json"
+    best, best_q = None, 0.0
+    for part in accept.split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        representation = _ACCEPTED.get(media.lower())
+        if representation is not None and q > best_q:
+            best, best_q = representation, q
+    if best is None:
+        raise HTTPException(
+            status_code=406,
+            detail=f"Formats disponibles : application/json, {', '.join(_MEDIA_TYPES.values())}.",
+        )
+    return best
+
+
+def _figure_response(
+    chart: str,
+    params: dict,
+    session_id: str,
+    if_none_match: Optional[str],
+    accept: Optional[str],
+    build: Callable[[], "go.Figure"],
+    preference: Optional[AsyncPreference] = None,
+) -> Response:
+    """
+    Graphique dans la représentation demandée (Accept) : PNG ou SVG bruts, spécification
+    Plotly (aucun rendu kaleido) ou, par défaut, PNG en base64 dans du JSON.
+    Le résultat est mémorisé par contenu du jeu, type, paramètres et format, avec son ETag.
+    Si le client présente déjà cet ETag (If-None-Match), répond 304 sans rien construire.
+    Si le client accepte une réponse différée, un graphique absent du cache est rendu en
+    tâche de fond (202 + identifiant ; la même représentation est lue sur /jobs/{job_id}/result).
+    """
+    representation = _negotiate(accept)
+    fmt = "png" if representation == "json" else representation
+    key = figure_cache.lookup(session_id, chart, params, fmt)
+    headers = {"Cache-Control": "private, no-cache", "Vary": "Accept"}
+    if key is not None:
+        headers["ETag"] = figure_cache.etag_for(key, representation)
+        if figure_cache.etag_matches(if_none_match, headers["ETag"]):
+            figure_cache.not_modified()
+            return Response(status_code=304, headers=headers)
+
+    def render() -> bytes:
+        with metrics.span("build"):
+            fig = build()
+        return figure_bytes(fig, fmt)
+
+    def produce():
+        fig_bytes = figure_cache.cached_figure(key, render)
+        if representation == "json":
+            with metrics.span("serialize"):
+                return {"type": chart, "image_base64": _encode_fig_to_base64(fig_bytes)}
+        return fig_bytes
+
+    try:
+        result = run_or_submit(
+            preference or AsyncPreference(), f"visualisation.{chart}", session_id, params, produce,
+            cached=figure_cache.is_cached(key), media_type=_MEDIA_TYPES.get(representation),
+        )
+    except renderer.RendererBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except renderer.RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    if isinstance(result, Response):
+        # 202 : tâche de fond
+        return result
+    if representation == "json":
+        return JSONResponse(result, headers=headers)
+    return Response(content=result, media_type=_MEDIA_TYPES[representation], headers=headers)
+
+
 @router.get("/histogram")
-def histogram_endpoint(var: str, bins: int = Query(30, ge=1, le=200)):
+def histogram_endpoint(
+    var: str,
+    bins: int = Query(30, ge=1, le=200),
+    session_id: str = Depends(get_session_id),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    preference: AsyncPreference = Depends(get_async_preference),
+):
     """Affiche un histogramme pour une variable numérique."""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if var not in df.columns:
         raise HTTPException(status_code=400, detail=f"Colonne '{var}' introuvable.")
     
     try:
-        fig_bytes = histogram(var, bins)
-        return {"type": "histogram", "image_base64": _encode_fig_to_base64(fig_bytes)}
+        return _figure_response("histogram", {"var": var, "bins": bins}, session_id, if_none_match, accept,
+                                lambda: histogram(var, bins, session_id), preference)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création histogramme : {e}")
 
 
 @router.get("/boxplot")
-def boxplot_endpoint(y: str, x: Optional[str] = None):
+def boxplot_endpoint(
+    y: str,
+    x: Optional[str] = None,
+    session_id: str = Depends(get_session_id),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    preference: AsyncPreference = Depends(get_async_preference),
+):
     """Affiche une boîte à moustaches (Boxplot) d'une variable numérique, optionnellement groupée."""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if y not in df.columns:
@@ -52,71 +175,137 @@ def boxplot_endpoint(y: str, x: Optional[str] = None):
         raise HTTPException(status_code=400, detail=f"Colonne '{x}' invalide.")
 
     try:
-        fig_bytes = boxplot(y, x)
-        return {"type": "boxplot", "image_base64": _encode_fig_to_base64(fig_bytes)}
+        return _figure_response("boxplot", {"y": y, "x": x}, session_id, if_none_match, accept,
+                                lambda: boxplot(y, x, session_id), preference)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création boxplot : {e}")
 
 
 @router.get("/scatter")
-def scatter_endpoint(x: str, y: str, hue: Optional[str] = None):
-    """Affiche un nuage de points (Scatter Plot)."""
-    df = DataStore.get_df()
+def scatter_endpoint(
+    x: str,
+    y: str,
+    hue: Optional[str] = None,
+    mode: Literal["auto", "points", "density", "sample"] = Query(
+        "auto", description="auto : points bruts jusqu'à SCATTER_MAX_POINTS, puis densité ou échantillon stratifié"
+    ),
+    session_id: str = Depends(get_session_id),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    preference: AsyncPreference = Depends(get_async_preference),
+):
+    """Affiche un nuage de points (Scatter Plot), agrégé au-delà de SCATTER_MAX_POINTS."""
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if x not in df.columns or y not in df.columns:
         raise HTTPException(status_code=400, detail="Colonnes invalides.")
+    if hue and hue not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Colonne '{hue}' invalide.")
 
     try:
-        fig_bytes = scatter(x, y, hue)
-        return {"type": "scatter", "image_base64": _encode_fig_to_base64(fig_bytes)}
+        return _figure_response("scatter", {"x": x, "y": y, "hue": hue, "mode": mode}, session_id, if_none_match,
+                                accept, lambda: scatter(x, y, hue, session_id, mode), preference)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création scatter plot : {e}")
 
 
 @router.get("/line")
-def line_endpoint(y: str, order_by: str):
+def line_endpoint(
+    y: str,
+    order_by: str,
+    session_id: str = Depends(get_session_id),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    preference: AsyncPreference = Depends(get_async_preference),
+):
     """Affiche une courbe d’évolution."""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if y not in df.columns or order_by not in df.columns:
         raise HTTPException(status_code=400, detail="Colonnes invalides.")
     
     try:
-        fig_bytes = line(y, order_by)
-        return {"type": "line", "image_base64": _encode_fig_to_base64(fig_bytes)}
+        return _figure_response("line", {"y": y, "order_by": order_by}, session_id, if_none_match, accept,
+                                lambda: line(y, order_by, session_id), preference)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création courbe : {e}")
 
 
 @router.get("/kde")
-def kde_endpoint(var: str):
-    """Affiche la densité (KDE) d’une variable numérique."""
-    df = DataStore.get_df()
+def kde_endpoint(
+    var: str,
+    by: Optional[str] = Query(None, description="Variable catégorielle : une densité par modalité"),
+    bandwidth: Literal["scott", "silverman"] = "scott",
+    session_id: str = Depends(get_session_id),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    preference: AsyncPreference = Depends(get_async_preference),
+):
+    """Affiche la densité (KDE) d’une variable numérique, éventuellement une par modalité de `by`."""
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if var not in df.columns:
         raise HTTPException(status_code=400, detail=f"Colonne '{var}' introuvable.")
-    
+    if by and by not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Colonne '{by}' introuvable.")
+
     try:
-        fig_bytes = kde(var)
-        return {"type": "kde", "image_base64": _encode_fig_to_base64(fig_bytes)}
+        return _figure_response("kde", {"var": var, "by": by, "bandwidth": bandwidth}, session_id, if_none_match,
+                                accept, lambda: kde(var, session_id, by, bandwidth), preference)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création KDE : {e}")
 
 
 @router.get("/bar")
-def bar_endpoint(cat: str, topk: int = Query(10, ge=1, le=50)):
+def bar_endpoint(
+    cat: str,
+    topk: int = Query(10, ge=1, le=50),
+    session_id: str = Depends(get_session_id),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None),
+    preference: AsyncPreference = Depends(get_async_preference),
+):
     """Affiche un diagramme en barres pour une variable catégorielle."""
-    df = DataStore.get_df()
+    df = DataStore.get_df(session_id)
     if df is None:
         raise HTTPException(status_code=400, detail="Aucune donnée téléversée.")
     if cat not in df.columns:
         raise HTTPException(status_code=400, detail=f"Colonne '{cat}' introuvable.")
     
     try:
-        fig_bytes = bar(cat, topk)
-        return {"type": "bar", "image_base64": _encode_fig_to_base64(fig_bytes)}
+        return _figure_response("bar", {"cat": cat, "topk": topk}, session_id, if_none_match, accept,
+                                lambda: bar(cat, topk, session_id), preference)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur création bar chart : {e}")
+
+
+@router.get("/cache")
+def cache_stats_endpoint():
+    """Compteurs du cache des images rendues (succès, 304, taille)."""
+    return figure_cache.cache_stats()
+
+
+@router.delete("/cache")
+def cache_clear_endpoint():
+    """Vide le cache des images rendues."""
+    figure_cache.clear()
+    return {"message": "Cache des graphiques vidé.", **figure_cache.cache_stats()}
+
+
+@router.get("/renderer")
+def renderer_stats_endpoint():
+    """État du pool de rendu kaleido : processus, file d'attente, latences."""
+    return renderer.renderer_stats()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Variables attendues par le modèle, dans l'ordre des colonnes de la matrice
+FEATURES = ["age", "bmi", "systolic_bp", "glucose_fasting", "hba1c", "family_history"]
+# Colonne d'identifiant recopiée telle quelle dans la sortie si elle est présente
+ID_COLUMN = "id"
+# Lignes lues, scorées et renvoyées par bloc : la mémoire ne dépend pas de la taille de la cohorte
+BATCH_CHUNK_ROWS = int(os.getenv("BATCH_CHUNK_ROWS", "100000"))
+BATCH_FORMATS = ("csv", "json", "ndjson", "arrow")
+OUTPUT_FORMATS = ("ndjson", "csv")
+
+# Modèle à règles : (seuils, contribution de chaque classe). La classe i couvre
+# seuils[i-1] <= x < seuils[i], comme la chaîne de `if x < seuil` d'origine.
+BASE_RISK = 0.1
+MAX_PROBABILITY = 0.95
+RULES = {
+    "bmi": ([18.5, 25, 30], [0.1, 0.05, 0.2, 0.4]),                 # maigreur, normal, surpoids, obésité
+    "systolic_bp": ([120, 130, 140], [0.05, 0.15, 0.25, 0.35]),     # normal, élevé, HTA 1, HTA 2
+    "glucose_fasting": ([100, 126], [0.05, 0.4, 0.8]),              # normal, prédiabète, diabète (mg/dL)
+    "hba1c": ([5.7, 6.5], [0.05, 0.5, 0.9]),                        # normal, prédiabète, diabète (%)
+}
+RISK_CATEGORIES = ([0.3, 0.7], np.array(["Faible risque", "Risque modéré", "Haut risque"], dtype=object))
+
+
+def _rule(name: str, x: np.ndarray) -> np.ndarray:
+    thresholds, levels = RULES[name]
+    return np.asarray(levels)[np.searchsorted(thresholds, x, side="right")]
+
+
+def simulate_probabilities(X: np.ndarray) -> np.ndarray:
+    """
+    Modèle à règles vectorisé : une probabilité par ligne de X (colonnes dans l'ordre de
+    FEATURES). Même somme, dans le même ordre, que la version scalaire : résultats identiques.
+    Les lignes incomplètes donnent NaN.
+    """
+    X = np.asarray(X, dtype=float)
+    age, bmi, bp, glucose, hba1c, family = X.T
+    total = (
+        BASE_RISK
+        + np.minimum(age / 80, 1.0) * 0.3
+        + _rule("bmi", bmi)
+        + _rule("systolic_bp", bp)
+        + _rule("glucose_fasting", glucose)
+        + _rule("hba1c", hba1c)
+        + family * 0.15
+    )
+    probability = np.minimum(np.maximum(total, 0), MAX_PROBABILITY)
+    probability[np.isnan(X).any(axis=1)] = np.nan
+    return probability
+
+
+def predict_probabilities(model, X: np.ndarray) -> np.ndarray:
+    """Probabilités de la classe positive : modèle chargé sur toute la matrice, sinon modèle à règles."""
+    if model is None:
+        return simulate_probabilities(X)
+    probability = np.full(len(X), np.nan)
+    complete = ~np.isnan(X).any(axis=1)
+    if complete.any():
+        probability[complete] = model.predict_proba(X[complete])[:, 1]
+    return probability
+
+
+def trained_on_frame(model) -> bool:
+    """Pipeline entraîné sur un DataFrame (voir training) : il choisit et prétraite lui-même ses colonnes."""
+    return getattr(model, "feature_names_in_", None) is not None
+
+
+def frame_probabilities(model, df: pd.DataFrame) -> np.ndarray:
+    """
+    Probabilités pour un bloc de lignes. Un pipeline entraîné sur le jeu téléversé reçoit
+    ses propres colonnes (absentes = manquantes, imputées par le pipeline) ; sinon la matrice FEATURES.
+    """
+    if trained_on_frame(model):
+        return model.predict_proba(df.reindex(columns=list(model.feature_names_in_)))[:, 1]
+    X = df[FEATURES].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    return predict_probabilities(model, X)
+
+
+def score_frame(df: pd.DataFrame, model=None, threshold: float = 0.5) -> pd.DataFrame:
+    """Résultats d'un bloc de patients (mêmes champs que /prediction/manual)."""
+    probability = frame_probabilities(model, df)
+    missing = np.isnan(probability)
+    out = pd.DataFrame(index=df.index)
+    if ID_COLUMN in df.columns:
+        out[ID_COLUMN] = df[ID_COLUMN].to_numpy()
+    out["probability"] = np.round(probability, 4)
+    result = np.where(probability >= threshold, "Diabétique", "Non diabétique").astype(object)
+    category = RISK_CATEGORIES[1][np.searchsorted(RISK_CATEGORIES[0], probability, side="right")]
+    result[missing] = None
+    category[missing] = None
+    out["result"] = result
+    out["risk_category"] = category
+    return out
+
+
+# --- Lecture par blocs -------------------------------------------------------
+
+def input_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    """Format du fichier d'entrée d'après son extension, sinon son type MIME."""
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    by_ext = {"csv": "csv", "txt": "csv", "json": "json", "ndjson": "ndjson", "jsonl": "ndjson",
+              "arrow": "arrow", "feather": "arrow", "ipc": "arrow"}
+    if ext in by_ext:
+        return by_ext[ext]
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    by_type = {"text/csv": "csv", "application/json": "json", "application/x-ndjson": "ndjson",
+               "application/vnd.apache.arrow.file": "arrow", "application/vnd.apache.arrow.stream": "arrow"}
+    if ctype in by_type:
+        return by_type[ctype]
+    raise ValueError(f"Format non reconnu : utiliser un fichier {', '.join(BATCH_FORMATS)}.")
+
+
+def _csv_chunks(path: str, sep: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow.csv as pacsv
+    except ImportError:
+        yield from pd.read_csv(path, sep=sep, chunksize=chunk_rows, encoding_errors="ignore")
+        return
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=1 << 22),
+        parse_options=pacsv.ParseOptions(delimiter=sep),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+    )
+    for batch in reader:
+        yield from _split(batch.to_pandas(), chunk_rows)
+
+
+def _arrow_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    source = pa.memory_map(path, "r")
+    try:
+        reader = ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        source.seek(0)
+        batches = ipc.open_stream(source)
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_rows):
+            yield batch.slice(start, chunk_rows).to_pandas()
+
+
+def _split(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def read_chunks(path: str, fmt: str, sep: str = ",", chunk_rows: int = BATCH_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Blocs de lignes du fichier téléversé. CSV, NDJSON et Arrow sont lus au fil de l'eau ;
+    un tableau JSON doit être décodé en entier (le format n'a pas de découpage naturel).
+    """
+    if fmt == "csv":
+        return _csv_chunks(path, sep, chunk_rows)
+    if fmt == "arrow":
+        return _arrow_chunks(path, chunk_rows)
+    if fmt == "ndjson":
+        return pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False)
+    if fmt == "json":
+        with open(path, "rb") as f:
+            rows = json.load(f)
+        if not isinstance(rows, list):
+            raise ValueError("Le JSON doit être un tableau d'objets patients.")
+        return _split(pd.DataFrame.from_records(rows), chunk_rows)
+    raise ValueError(f"Format inconnu : {fmt}")
+
+
+def check_columns(df: pd.DataFrame, model=None) -> None:
+    if trained_on_frame(model):
+        return
+    missing = [c for c in FEATURES if c not in df.columns]
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {missing}. Attendues : {FEATURES}.")
+
+
+def stream_scores(
+    chunks: Iterator[pd.DataFrame],
+    model=None,
+    threshold: float = 0.5,
+    output: str = "ndjson",
+) -> Iterator[bytes]:
+    """Résultats bloc par bloc, en NDJSON (une ligne par patient) ou en CSV (en-tête au premier bloc)."""
+    first = True
+    offset = 0
+    chunks = iter(chunks)
+    while True:
+        with metrics.span("parse"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            break
+        check_columns(chunk, model)
+        with metrics.span("compute"):
+            scored = score_frame(chunk, model, threshold)
+        scored.insert(0, "row", np.arange(offset, offset + len(scored)))
+        offset += len(scored)
+        with metrics.span("serialize"):
+            if output == "csv":
+                body = scored.to_csv(index=False, header=first).encode("utf-8")
+            else:
+                body = scored.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n").encode("utf-8") + b"\n"
+        if output == "csv" or len(scored):
+            yield body
+        first = False
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+from backend.services.rank_cache import PooledRanks
+from backend.services.utils.pool import STATS_WORKERS, SharedArrays, attach, get_pool
+
+# Nombre d'éléments (rééchantillons × observations) d'un bloc de poids : borne la mémoire
+CHUNK_ELEMENTS = 2_000_000
+# En dessous de ce volume total, le calcul reste dans le processus de l'API
+PARALLEL_MIN_ELEMENTS = 50_000_000
+# Blocs du jackknife groupé utilisé pour l'accélération du BCa
+JACKKNIFE_BLOCKS = 100
+CI_METHODS = ("percentile", "bca")
+MAX_RESAMPLES = 100_000
+
+# ===============================
+# Description des problèmes
+# ===============================
+# Les statistiques sont calculées à partir d'une matrice de poids W (rééchantillons × observations) :
+# W[b, i] = nombre de tirages de l'observation i dans le rééchantillon b. Les données restent
+# triées une fois pour toutes ; chaque rééchantillon coûte O(n), sans nouveau tri.
+
+def _tie_starts(sorted_values: np.ndarray) -> np.ndarray:
+    return np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+
+
+def groups_problem(pooled: PooledRanks, kind: str) -> dict:
+    """
+    Échantillons indépendants (rééchantillonnés séparément) : `kind` vaut "two_sample"
+    (U de Mann-Whitney, effet CLES, D de Kolmogorov-Smirnov) ou "kruskal" (H).
+    Les poids sont générés échantillon par échantillon, chacun dans son ordre trié.
+    """
+    labels = pooled.labels.astype(np.int64)
+    groups = [np.flatnonzero(labels == g) for g in range(len(pooled.sizes))]
+    problem = {
+        "kind": kind,
+        "n": pooled.n,
+        "labels": labels,
+        "groups": groups,
+        "starts": _tie_starts(pooled.values),
+        "blocks": [np.arange(len(g)) % JACKKNIFE_BLOCKS for g in groups],
+    }
+    if kind == "two_sample":
+        # Positions de chaque valeur dans les deux échantillons triés (fonctions de répartition)
+        xs, ys = pooled.values[groups[0]], pooled.values[groups[1]]
+        problem.update({
+            "y_below_x": np.searchsorted(ys, xs, "left"),
+            "y_upto_x": np.searchsorted(ys, xs, "right"),
+            "x_upto_x": np.searchsorted(xs, xs, "right"),
+            "x_upto_y": np.searchsorted(xs, ys, "right"),
+            "y_upto_y": np.searchsorted(ys, ys, "right"),
+        })
+    return problem
+
+
+def spearman_problem(order_x: np.ndarray, sorted_x: np.ndarray, order_y: np.ndarray, sorted_y: np.ndarray) -> dict:
+    """Couples (x, y) rééchantillonnés ligne par ligne ; ordres de tri issus du cache de rangs."""
+    n = len(order_x)
+    return {
+        "kind": "spearman",
+        "n": n,
+        "order_x": order_x,
+        "starts_x": _tie_starts(sorted_x),
+        "order_y": order_y,
+        "starts_y": _tie_starts(sorted_y),
+        "blocks": [np.arange(n) % JACKKNIFE_BLOCKS],
+    }
+
+
+# ===============================
+# Statistiques pondérées (vectorisées sur les rééchantillons)
+# ===============================
+
+def _tie_ranks(C: np.ndarray) -> np.ndarray:
+    """Rang moyen de chaque groupe d'ex-aequo, d'après le poids total C de chaque groupe."""
+    return np.cumsum(C, axis=1) - (C - 1) / 2.0
+
+
+def _cumsum0(W: np.ndarray) -> np.ndarray:
+    """Sommes cumulées des poids, précédées d'une colonne de zéros (F(t) avant la première valeur)."""
+    out = np.zeros((W.shape[0], W.shape[1] + 1), dtype=W.dtype)
+    np.cumsum(W, axis=1, out=out[:, 1:])
+    return out
+
+
+def _max_abs(diff: np.ndarray) -> np.ndarray:
+    return np.maximum(diff.max(axis=1), -diff.min(axis=1))
+
+
+def _two_sample_stats(problem: dict, weights: list[np.ndarray]) -> dict:
+    wx, wy = weights
+    n1, n2 = wx.sum(axis=1), wy.sum(axis=1)
+    CX, CY = _cumsum0(wx), _cumsum0(wy)
+    # U de l'échantillon 0 : couples (x > y), plus ½ par ex-aequo (calcul entier, exact)
+    upto = CY[:, problem["y_upto_x"]]
+    u = (np.einsum("ij,ij->i", wx, CY[:, problem["y_below_x"]]) + np.einsum("ij,ij->i", wx, upto)) / 2.0
+    # D : écart maximal des fonctions de répartition, évaluées en chaque valeur observée
+    at_x = _max_abs(CX[:, problem["x_upto_x"]] * n2[:, None] - upto * n1[:, None])
+    at_y = _max_abs(CX[:, problem["x_upto_y"]] * n2[:, None] - CY[:, problem["y_upto_y"]] * n1[:, None])
+    n12 = (n1 * n2).astype(float)
+    return {"u": u, "cles": u / n12, "d": np.maximum(at_x, at_y) / n12}
+
+
+def _pooled_weights(problem: dict, weights: list[np.ndarray]) -> np.ndarray:
+    W = np.empty((weights[0].shape[0], problem["n"]))
+    for positions, w in zip(problem["groups"], weights):
+        W[:, positions] = w
+    return W
+
+
+def _tie_totals(W: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Poids total de chaque groupe d'ex-aequo (W lui-même s'il n'y a aucun ex-aequo)."""
+    return W if len(starts) == W.shape[1] else np.add.reduceat(W, starts, axis=1)
+
+
+def _expand(values: np.ndarray, starts: np.ndarray, n: int) -> np.ndarray:
+    return values if len(starts) == n else np.repeat(values, np.diff(np.r_[starts, n]), axis=1)
+
+
+def _kruskal_stats(problem: dict, weights: list[np.ndarray]) -> dict:
+    starts, n = problem["starts"], problem["n"]
+    W = _pooled_weights(problem, weights)
+    C = _tie_totals(W, starts)
+    N = C.sum(axis=1)
+    ranks = _expand(_tie_ranks(C), starts, n)
+    onehot = np.zeros((n, len(problem["groups"])))
+    onehot[np.arange(n), problem["labels"]] = 1.0
+    rank_sums = (W * ranks) @ onehot
+    sizes = W @ onehot
+    h = 12.0 / (N * (N + 1)) * (rank_sums ** 2 / sizes).sum(axis=1) - 3 * (N + 1)
+    ties = 1 - (C ** 3 - C).sum(axis=1) / (N ** 3 - N)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return {"h": h / ties}
+
+
+def _weighted_ranks(W: np.ndarray, order: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    C = _tie_totals(W[:, order], starts)
+    ranks = np.empty_like(W)
+    ranks[:, order] = _expand(_tie_ranks(C), starts, len(order))
+    return ranks
+
+
+def _spearman_stats(problem: dict, weights: list[np.ndarray]) -> dict:
+    W = weights[0].astype(float)
+    rx = _weighted_ranks(W, problem["order_x"], problem["starts_x"])
+    ry = _weighted_ranks(W, problem["order_y"], problem["starts_y"])
+    N = W.sum(axis=1)[:, None]
+    rx -= (W * rx).sum(axis=1)[:, None] / N
+    ry -= (W * ry).sum(axis=1)[:, None] / N
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = (W * rx * ry).sum(axis=1) / np.sqrt((W * rx * rx).sum(axis=1) * (W * ry * ry).sum(axis=1))
+    return {"rho": rho}
+
+
+_STATISTICS = {"two_sample": _two_sample_stats, "kruskal": _kruskal_stats, "spearman": _spearman_stats}
+
+
+# ===============================
+# Poids : rééchantillons et jackknife
+# ===============================
+
+def _resample_counts(rng: np.random.Generator, size: int, n: int) -> np.ndarray:
+    """Matrice d'indices tirés avec remise (size × n), convertie en nombres de tirages par observation."""
+    idx = rng.integers(0, n, size=(size, n))
+    idx += (np.arange(size) * n)[:, None]
+    return np.bincount(idx.ravel(), minlength=size * n).reshape(size, n)
+
+
+def _run_chunk(problem: dict, task: tuple) -> dict:
+    """
+    Poids d'un bloc de rééchantillons (ou de jackknife), un tableau par échantillon :
+    le rééchantillonnage est stratifié, chaque échantillon garde son effectif.
+    """
+    kind, start, stop, seed = task
+    if kind == "boot":
+        rng = np.random.default_rng(seed)
+        weights = [_resample_counts(rng, stop - start, len(block)) for block in problem["blocks"]]
+    else:
+        removed = np.arange(start, stop)[:, None]
+        weights = [(block[None, :] != removed).astype(np.int64) for block in problem["blocks"]]
+    return _STATISTICS[problem["kind"]](problem, weights)
+
+
+def _pool_chunk(handle: tuple, task: tuple) -> dict:
+    return _run_chunk(attach(handle), task)
+
+
+def _tasks(kind: str, total: int, chunk: int, seeds: Optional[list] = None) -> list[tuple]:
+    tasks = []
+    for i, start in enumerate(range(0, total, chunk)):
+        tasks.append((kind, start, min(start + chunk, total), seeds[i] if seeds is not None else None))
+    return tasks
+
+
+def _interval(estimate: float, boot: np.ndarray, jack: Optional[np.ndarray], method: str, confidence: float) -> dict:
+    from scipy import special
+    boot = boot[np.isfinite(boot)]
+    alpha = (1 - confidence) / 2
+    levels = np.array([alpha, 1 - alpha])
+    if method == "bca" and len(boot) and jack is not None:
+        # Correction de biais z0 et accélération (jackknife groupé)
+        z0 = special.ndtri((np.count_nonzero(boot < estimate) + 0.5 * np.count_nonzero(boot == estimate)) / len(boot))
+        diff = np.nanmean(jack) - jack
+        denom = 6.0 * np.nansum(diff ** 2) ** 1.5
+        a = np.nansum(diff ** 3) / denom if denom > 0 else 0.0
+        z = special.ndtri(levels)
+        adjusted = special.ndtr(z0 + (z0 + z) / (1 - a * (z0 + z)))
+        if np.all(np.isfinite(adjusted)):
+            levels = adjusted
+    if len(boot) == 0:
+        low = high = float("nan")
+    else:
+        low, high = (float(v) for v in np.quantile(boot, levels))
+    return {
+        "estimate": float(estimate),
+        "low": None if np.isnan(low) else low,
+        "high": None if np.isnan(high) else high,
+        "se": float(np.std(boot, ddof=1)) if len(boot) > 1 else None,
+    }
+
+
+def bootstrap_intervals(
+    problem: dict,
+    n_resamples: int,
+    method: str = "percentile",
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+    workers: int = STATS_WORKERS,
+) -> dict:
+    """
+    Intervalles de confiance bootstrap (percentile ou BCa) des statistiques du problème.
+    Les rééchantillons sont générés par blocs de poids bornés en mémoire, chaque bloc ayant
+    sa propre graine dérivée de `seed` : le résultat ne dépend pas du nombre de processus.
+    """
+    if method not in CI_METHODS:
+        raise ValueError(f"Méthode d'intervalle inconnue : {method}")
+    n = problem["n"]
+    chunk = max(1, CHUNK_ELEMENTS // max(n, 1))
+    seed_seq = np.random.SeedSequence(seed)
+    n_chunks = -(-n_resamples // chunk)
+    tasks = _tasks("boot", n_resamples, chunk, seed_seq.spawn(n_chunks))
+    n_jack = max(int(block.max()) + 1 for block in problem["blocks"]) if n else 0
+    if method == "bca":
+        tasks += _tasks("jack", n_jack, chunk)
+
+    workers = max(1, min(workers, len(tasks)))
+    if n_resamples * n < PARALLEL_MIN_ELEMENTS:
+        workers = 1
+    if workers == 1:
+        results = [_run_chunk(problem, task) for task in tasks]
+    else:
+        # Problème écrit une fois en mémoire partagée, mappé par les processus du pool commun
+        with SharedArrays(problem) as shared:
+            pool = get_pool()
+            futures = [pool.submit(_pool_chunk, shared.handle, task) for task in tasks]
+            try:
+                results = [future.result() for future in futures]
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    observed = _STATISTICS[problem["kind"]](problem, [np.ones((1, len(b)), dtype=np.int64) for b in problem["blocks"]])
+    intervals = {}
+    for name, value in observed.items():
+        boot = np.concatenate([r[name] for r, t in zip(results, tasks) if t[0] == "boot"])
+        jack = [r[name] for r, t in zip(results, tasks) if t[0] == "jack"]
+        intervals[name] = _interval(float(value[0]), boot, np.concatenate(jack) if jack else None, method, confidence)
+    return {
+        "n_resamples": int(n_resamples),
+        "method": method,
+        "confidence": confidence,
+        "seed": seed_seq.entropy if seed is None else seed,
+        "intervals": intervals,
+    }
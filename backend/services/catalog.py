@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.services import snapshots
+
+# Catalogue des jeux partagés par les workers uvicorn d'une même machine, à côté des snapshots
+CATALOG_PATH = os.getenv("DATASTORE_CATALOG", os.path.join(snapshots.SNAPSHOT_DIR, "catalog.sqlite3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    session_id TEXT PRIMARY KEY,
+    generation TEXT,          -- NULL : cible choisie avant tout téléversement
+    target TEXT,
+    rows INTEGER,
+    cols INTEGER,
+    nbytes INTEGER,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    session_id: str
+    generation: Optional[str]
+    target: Optional[str]
+    rows: Optional[int]
+    cols: Optional[int]
+    nbytes: Optional[int]
+    updated_at: float
+
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def enabled() -> bool:
+    """Le partage repose sur les snapshots Arrow : sans eux, chaque worker garde ses propres jeux."""
+    return snapshots.available()
+
+
+def _connection() -> sqlite3.Connection:
+    """Une connexion par thread ; WAL : les lectures ne bloquent pas l'écriture d'un autre worker."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(CATALOG_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(CATALOG_PATH, timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if not _initialized:
+                conn.execute(_SCHEMA)
+                _initialized = True
+        _local.conn = conn
+    return conn
+
+
+def _memo(conn: sqlite3.Connection) -> dict:
+    """
+    Entrées déjà lues par ce thread, valables tant qu'aucune autre connexion n'a écrit :
+    `PRAGMA data_version` change à chaque écriture validée par un autre worker (ou un autre
+    thread), sans lire la table. Les écritures de ce thread vident elles-mêmes le mémo.
+    """
+    version = conn.execute("PRAGMA data_version").fetchone()[0]
+    if getattr(_local, "version", None) != version:
+        _local.version = version
+        _local.memo = {}
+    return _local.memo
+
+
+def _forget() -> None:
+    _local.memo = {}
+
+
+def lookup(session_id: str) -> Optional[CatalogEntry]:
+    if not enabled():
+        return None
+    conn = _connection()
+    memo = _memo(conn)
+    if session_id in memo:
+        return memo[session_id]
+    row = conn.execute(
+        "SELECT session_id, generation, target, rows, cols, nbytes, updated_at FROM datasets WHERE session_id = ?",
+        (session_id,),
+    ).fetchone()
+    entry = memo[session_id] = CatalogEntry(*row) if row is not None else None
+    return entry
+
+
+def publish(
+    session_id: str, generation: str, target: Optional[str], rows: int, cols: int, nbytes: int,
+    if_absent: bool = False,
+) -> Optional[str]:
+    """
+    Annonce une nouvelle génération du jeu (déjà écrite dans son propre fichier, voir
+    snapshots.snapshot_path) aux autres workers. Lecture de la génération remplacée et
+    écriture de la nouvelle dans une même transaction : deux publications concurrentes
+    sont ordonnées, et chacune retourne la génération qu'elle remplace (fichier à supprimer).
+    `if_absent` : rien n'est écrit si une génération est déjà publiée ; elle est retournée.
+    """
+    if not enabled():
+        return None
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT generation FROM datasets WHERE session_id = ?", (session_id,)).fetchone()
+        if if_absent and row is not None and row[0] is not None:
+            conn.execute("ROLLBACK")
+            return row[0]
+        conn.execute(
+            "INSERT INTO datasets (session_id, generation, target, rows, cols, nbytes, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET generation = excluded.generation, target = excluded.target, "
+            "rows = excluded.rows, cols = excluded.cols, nbytes = excluded.nbytes, updated_at = excluded.updated_at",
+            (session_id, generation, target, rows, cols, nbytes, time.time()),
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        _forget()
+    return row[0] if row is not None else None
+
+
+def set_target(session_id: str, target: Optional[str]) -> None:
+    """Cible du jeu de la session, ou cible en attente du prochain téléversement."""
+    if not enabled():
+        return
+    _connection().execute(
+        "INSERT INTO datasets (session_id, target, updated_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(session_id) DO UPDATE SET target = excluded.target, updated_at = excluded.updated_at",
+        (session_id, target, time.time()),
+    )
+    _forget()
+
+
+def remove(session_id: str) -> None:
+    if not enabled():
+        return
+    _connection().execute("DELETE FROM datasets WHERE session_id = ?", (session_id,))
+    _forget()
+
+
+def entries() -> list[CatalogEntry]:
+    """Jeux publiés (tous workers confondus), du plus récent au plus ancien."""
+    if not enabled():
+        return []
+    rows = _connection().execute(
+        "SELECT session_id, generation, target, rows, cols, nbytes, updated_at FROM datasets "
+        "WHERE generation IS NOT NULL ORDER BY updated_at DESC"
+    ).fetchall()
+    return [CatalogEntry(*row) for row in rows]
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+# Une colonne texte devient `category` si elle a peu de modalités par rapport au nombre de lignes
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_MAX_UNIQUE = 10000
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _compact_series(s: pd.Series, pyarrow_strings: bool) -> pd.Series:
+    """Version compacte d'une colonne, sans perte d'information."""
+    dtype = s.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return s
+    if pd.api.types.is_integer_dtype(dtype):
+        return pd.to_numeric(s, downcast="integer")
+    if pd.api.types.is_float_dtype(dtype):
+        if dtype == np.float32:
+            return s
+        s32 = s.astype(np.float32)
+        # float32 uniquement si toutes les valeurs sont représentées exactement
+        if np.array_equal(s32.to_numpy(dtype=np.float64), s.to_numpy(), equal_nan=True):
+            return s32
+        return s
+    if pd.api.types.is_object_dtype(dtype):
+        if pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"):
+            return s  # types mélangés : on ne touche à rien
+        n_unique = s.nunique(dropna=True)
+        if n_unique <= CATEGORY_MAX_UNIQUE and n_unique <= CATEGORY_MAX_RATIO * max(len(s), 1):
+            return s.astype("category")
+        if pyarrow_strings:
+            return s.astype("string[pyarrow]")
+    return s
+
+
+def compact_frame(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Réduit l'empreinte mémoire d'un DataFrame :
+    - entiers et flottants ramenés au plus petit type qui conserve toutes les valeurs ;
+    - colonnes texte à faible cardinalité converties en `category` ;
+    - autres colonnes texte stockées en chaînes pyarrow (si pyarrow est installé).
+    Retourne (DataFrame compacté, rapport mémoire par colonne).
+    """
+    pyarrow_strings = _has_pyarrow()
+    before = df.memory_usage(deep=True, index=False)
+    compacted = pd.DataFrame(
+        {col: _compact_series(df[col], pyarrow_strings) for col in df.columns},
+        index=df.index,
+    )
+    after = compacted.memory_usage(deep=True, index=False)
+
+    columns = [
+        {
+            "column": col,
+            "dtype_before": str(df[col].dtype),
+            "dtype_after": str(compacted[col].dtype),
+            "bytes_before": int(before[col]),
+            "bytes_after": int(after[col]),
+        }
+        for col in df.columns
+    ]
+    report = {
+        "total_bytes_before": int(before.sum()),
+        "total_bytes_after": int(after.sum()),
+        "columns": columns,
+    }
+    return compacted, report
+
+
+def memory_report(df: pd.DataFrame) -> dict:
+    """Rapport mémoire d'un DataFrame déjà stocké (sans historique de compaction)."""
+    usage = df.memory_usage(deep=True, index=False)
+    return {
+        "total_bytes": int(usage.sum()),
+        "columns": [
+            {"column": col, "dtype": str(df[col].dtype), "bytes": int(usage[col])}
+            for col in df.columns
+        ],
+    }
@@ -1,27 +1,292 @@
 from __future__ import annotations
+import hashlib
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
 import pandas as pd
-from typing import Optional
+
+from backend.services import catalog, metrics, snapshots
+from backend.services.utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION = "default"
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Budget mémoire total partagé par tous les jeux de données (en Mo)
+MAX_BYTES = int(float(os.getenv("DATASTORE_MAX_MB", "1024")) * 1024 * 1024)
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Taille réelle du DataFrame (chaînes comprises)."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """Empreinte du contenu (colonnes, types et valeurs) : deux jeux identiques ont la même."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+@dataclass
+class _Dataset:
+    df: pd.DataFrame
+    target: Optional[str] = None
+    nbytes: int = 0
+    created_at: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+    # Génération publiée dans le catalogue partagé ; None : jeu propre à ce worker
+    generation: Optional[str] = None
+    # Données dérivées du jeu (rapport mémoire, index...), supprimées avec lui
+    extras: dict[str, Any] = field(default_factory=dict)
+
+
+def _on_evict(session_id, dataset: _Dataset) -> None:
+    logger.info(
+        "DataStore : éviction du jeu '%s' (%.1f Mo) pour respecter le budget mémoire",
+        session_id, dataset.nbytes / 1e6,
+    )
+
 
 class DataStore:
     """
-    Stocke le DataFrame téléversé et la cible choisie.
-    (Simple, en mémoire. Pour la production, utiliser une base ou un cache persistant.)
+    Stocke les DataFrames téléversés et leur cible, par session (ou identifiant de jeu).
+    Les jeux sont conservés en mémoire dans un cache LRU dont le budget total est
+    `DATASTORE_MAX_MB` ; la taille de chaque jeu est mesurée avec
+    `memory_usage(deep=True)`. Le jeu le moins récemment utilisé est évincé en premier.
+    Chaque jeu est aussi écrit en snapshot Arrow sur disque : après un redémarrage ou
+    une éviction, il est rechargé par memory-mapping au lieu d'un nouveau téléversement.
+
+    Plusieurs workers (`uvicorn --workers N`) partagent les jeux : le snapshot est publié
+    dans un catalogue SQLite (voir catalog.py) et chaque worker mappe le même fichier,
+    sans copie (le worker qui reçoit le téléversement aussi). À chaque accès, la génération
+    du catalogue indique si le jeu a été remplacé ou supprimé par un autre worker.
     """
-    _df: Optional[pd.DataFrame] = None
-    _target: Optional[str] = None
+    _datasets: LRUCache = LRUCache(max_bytes=MAX_BYTES, on_evict=_on_evict)
+    # Cible choisie avant tout téléversement (appliquée au prochain jeu de la session)
+    _pending_targets: dict[str, Optional[str]] = {}
+    # Appelés avec (session_id, empreinte de l'ancien jeu) quand un jeu est remplacé ou supprimé
+    _listeners: list[Callable[[str, Optional[str]], None]] = []
+
+    @classmethod
+    def add_listener(cls, callback: Callable[[str, Optional[str]], None]) -> None:
+        if callback not in cls._listeners:
+            cls._listeners.append(callback)
+
+    @classmethod
+    def _notify(cls, session_id: str, previous: Optional[_Dataset]) -> None:
+        fingerprint = previous.extras.get("fingerprint") if previous is not None else None
+        for callback in cls._listeners:
+            try:
+                callback(session_id, fingerprint)
+            except Exception as e:
+                logger.warning("DataStore : écouteur en erreur pour '%s' : %s", session_id, e)
+
+    @classmethod
+    def set_df(cls, df: pd.DataFrame, session_id: str = DEFAULT_SESSION) -> None:
+        previous = cls._datasets.peek(session_id)
+        entry = catalog.lookup(session_id)
+        pending = cls._pending_targets.pop(session_id, None)
+        if entry is not None:
+            target = entry.target
+        else:
+            target = previous.target if previous is not None else pending
+        if target is not None and target not in df.columns:
+            target = None
+        generation = None
+        with metrics.span("snapshot"):
+            candidate = uuid.uuid4().hex
+            if snapshots.save_snapshot(session_id, df, candidate) is not None:
+                replaced = catalog.publish(session_id, candidate, target, len(df), df.shape[1], frame_nbytes(df))
+                generation = candidate
+                for old in {replaced, None}:
+                    snapshots.discard(session_id, old)
+                # Le DataFrame téléversé est remplacé par le snapshot mappé de sa propre génération :
+                # mêmes valeurs et mêmes types, mais des pages partagées avec les autres workers
+                mapped = snapshots.load_snapshot(session_id, generation)
+                if mapped is not None:
+                    df = mapped
+        nbytes = frame_nbytes(df)
+        cls._datasets.put(session_id, _Dataset(df=df, target=target, nbytes=nbytes, generation=generation), nbytes)
+        metrics.record_rows(len(df))
+        cls._notify(session_id, previous)
+
+    @classmethod
+    def _get(cls, session_id: str) -> Optional[_Dataset]:
+        """
+        Jeu en mémoire, ou rechargé depuis son snapshot en cas d'absence. Un jeu publié
+        remplacé ou supprimé entre-temps par un autre worker est d'abord oublié.
+        """
+        dataset = cls._datasets.get(session_id)
+        entry = catalog.lookup(session_id)
+        if dataset is not None and dataset.generation is not None and (
+            entry is None or entry.generation != dataset.generation
+        ):
+            cls._datasets.pop(session_id)
+            cls._notify(session_id, dataset)
+            dataset = None
+        if dataset is None:
+            dataset = cls._restore(session_id, entry)
+            if dataset is None:
+                return None
+        elif entry is not None:
+            dataset.target = entry.target
+        dataset.last_access = time.time()
+        return dataset
+
+    @classmethod
+    def _restore(cls, session_id: str, entry: Optional[catalog.CatalogEntry]) -> Optional[_Dataset]:
+        """
+        Recharge la génération publiée du jeu. Si son fichier vient d'être remplacé par un
+        autre worker, le catalogue est relu une fois pour suivre la nouvelle génération.
+        """
+        for _ in range(2):
+            if entry is not None and entry.generation is not None:
+                generation, target = entry.generation, entry.target
+                df = snapshots.load_snapshot(session_id, generation)
+            else:
+                # Snapshot antérieur au catalogue : renommé en génération puis publié
+                # pour que les autres workers le suivent
+                generation, df = uuid.uuid4().hex, None
+                target = entry.target if entry is not None else snapshots.legacy_target(session_id)
+                if snapshots.adopt_legacy(session_id, generation):
+                    df = snapshots.load_snapshot(session_id, generation)
+                    if df is not None:
+                        if target not in df.columns:
+                            target = None
+                        published = catalog.publish(
+                            session_id, generation, target, len(df), df.shape[1], frame_nbytes(df), if_absent=True,
+                        )
+                        if published is not None:
+                            # Un autre worker a publié un nouveau jeu entre-temps : c'est lui qui compte
+                            snapshots.discard(session_id, generation)
+                            df = None
+            if df is not None:
+                break
+            entry = catalog.lookup(session_id)
+        else:
+            return None
+        nbytes = frame_nbytes(df)
+        dataset = _Dataset(df=df, target=target, nbytes=nbytes, generation=generation)
+        cls._datasets.put(session_id, dataset, nbytes)
+        logger.info("DataStore : jeu '%s' rechargé depuis son snapshot", session_id)
+        return dataset
+
+    @classmethod
+    def get_df(cls, session_id: str = DEFAULT_SESSION) -> Optional[pd.DataFrame]:
+        dataset = cls._get(session_id)
+        if dataset is None:
+            return None
+        metrics.record_rows(len(dataset.df))
+        return dataset.df
+
+    @classmethod
+    def set_target(cls, target: Optional[str], session_id: str = DEFAULT_SESSION) -> None:
+        dataset = cls._get(session_id)
+        catalog.set_target(session_id, target)
+        if dataset is None:
+            cls._pending_targets[session_id] = target
+        else:
+            dataset.target = target
+
+    @classmethod
+    def get_target(cls, session_id: str = DEFAULT_SESSION) -> Optional[str]:
+        dataset = cls._get(session_id)
+        if dataset is None:
+            entry = catalog.lookup(session_id)
+            return entry.target if entry is not None else cls._pending_targets.get(session_id)
+        return dataset.target
+
+    @classmethod
+    def set_extra(cls, key: str, value: Any, session_id: str = DEFAULT_SESSION) -> None:
+        dataset = cls._get(session_id)
+        if dataset is not None:
+            dataset.extras[key] = value
+
+    @classmethod
+    def get_extra(
+        cls,
+        key: str,
+        session_id: str = DEFAULT_SESSION,
+        factory: Optional[Callable[[pd.DataFrame], Any]] = None,
+    ) -> Any:
+        """
+        Donnée dérivée attachée au jeu de la session. Si elle est absente et qu'une
+        `factory` est fournie, elle est calculée à partir du DataFrame puis conservée.
+        """
+        dataset = cls._get(session_id)
+        if dataset is None:
+            return None
+        if key not in dataset.extras and factory is not None:
+            dataset.extras[key] = factory(dataset.df)
+            cls.refresh_size(session_id)
+        return dataset.extras.get(key)
+
+    @classmethod
+    def fingerprint(cls, session_id: str = DEFAULT_SESSION) -> Optional[str]:
+        """Empreinte du contenu du jeu de la session (calculée une fois, puis conservée avec lui)."""
+        return cls.get_extra("fingerprint", session_id, factory=dataset_fingerprint)
+
+    @classmethod
+    def fingerprint_in_use(cls, fingerprint: str) -> bool:
+        """Un jeu en mémoire a-t-il déjà cette empreinte ? (sans la calculer ni toucher l'ordre LRU)"""
+        return any(dataset.extras.get("fingerprint") == fingerprint for _, dataset in cls._datasets.items())
 
     @classmethod
-    def set_df(cls, df: pd.DataFrame) -> None:
-        cls._df = df
+    def refresh_size(cls, session_id: str = DEFAULT_SESSION) -> None:
+        """
+        Recompte la mémoire du jeu dans le budget : DataFrame + données dérivées
+        exposant un attribut `nbytes` (profil de colonnes, caches...).
+        """
+        dataset = cls._datasets.peek(session_id)
+        if dataset is None:
+            return
+        extra = sum(int(getattr(v, "nbytes", 0) or 0) for v in dataset.extras.values())
+        cls._datasets.resize(session_id, dataset.nbytes + extra)
 
     @classmethod
-    def get_df(cls) -> Optional[pd.DataFrame]:
-        return cls._df
+    def drop(cls, session_id: str = DEFAULT_SESSION) -> bool:
+        cls._pending_targets.pop(session_id, None)
+        previous = cls._datasets.pop(session_id)
+        entry = catalog.lookup(session_id)
+        # Snapshot supprimé avant l'entrée du catalogue : aucun worker ne peut le republier
+        snapshots.delete_snapshot(session_id)
+        catalog.remove(session_id)
+        if previous is not None:
+            cls._notify(session_id, previous)
+        return previous is not None or (entry is not None and entry.generation is not None)
 
     @classmethod
-    def set_target(cls, target: Optional[str]) -> None:
-        cls._target = target
+    def sessions(cls) -> list[dict]:
+        """Résumé des jeux en mémoire, du plus ancien au plus récemment utilisé."""
+        return [
+            {
+                "session_id": sid,
+                "rows": int(ds.df.shape[0]),
+                "cols": int(ds.df.shape[1]),
+                "bytes": ds.nbytes,
+                "accounted_bytes": cls._datasets.sizeof(sid),
+                "target": ds.target,
+                "shared": ds.generation is not None,
+                "created_at": ds.created_at,
+                "last_access": ds.last_access,
+            }
+            for sid, ds in cls._datasets.items()
+        ]
 
     @classmethod
-    def get_target(cls) -> Optional[str]:
-        return cls._target
+    def usage(cls) -> dict:
+        return {
+            "datasets": len(cls._datasets),
+            "used_bytes": cls._datasets.total_bytes,
+            "max_bytes": cls._datasets.max_bytes,
+            # Jeux publiés pour tous les workers (catalogue partagé), chargés ici ou non
+            "shared_datasets": len(catalog.entries()),
+        }
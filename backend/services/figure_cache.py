@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from backend.services.data_store import DataStore
+from backend.services.utils.lru import LRUCache
+
+# Budget du cache des images rendues (en Mo) et nombre maximal d'images
+FIGURE_CACHE_MAX_BYTES = int(float(os.getenv("FIGURE_CACHE_MB", "128")) * 1024 * 1024)
+FIGURE_CACHE_MAX_ITEMS = int(os.getenv("FIGURE_CACHE_ITEMS", "2000"))
+
+_figures = LRUCache(max_bytes=FIGURE_CACHE_MAX_BYTES, max_items=FIGURE_CACHE_MAX_ITEMS)
+_counters = {"hits": 0, "misses": 0, "shared": 0, "not_modified": 0, "invalidated": 0}
+_counters_lock = threading.Lock()
+# Rendus en cours par clé : les demandes simultanées du même graphique attendent le premier
+_inflight: dict[tuple, Future] = {}
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += n
+
+
+def figure_key(fingerprint: str, chart: str, params: dict, fmt: str = "png") -> tuple:
+    """Clé : empreinte du jeu, type de graphique, format de sortie et paramètres triés."""
+    return (fingerprint, chart, fmt, json.dumps(params, sort_keys=True, default=str))
+
+
+def etag_for(key: tuple, representation: str = "") -> str:
+    """
+    ETag (faible) dérivé de la clé et de la représentation renvoyée : connu sans rendre
+    l'image. Il change avec le contenu du jeu, le type de graphique, ses paramètres ou le format.
+    """
+    digest = hashlib.blake2b(repr((key, representation)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparaison faible d'un en-tête If-None-Match (liste d'ETags ou `*`)."""
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == opaque:
+            return True
+    return False
+
+
+def lookup(session_id: str, chart: str, params: dict, fmt: str = "png") -> Optional[tuple]:
+    """Clé du graphique pour le contenu actuel du jeu (None sans jeu)."""
+    fingerprint = DataStore.fingerprint(session_id)
+    if fingerprint is None:
+        return None
+    return figure_key(fingerprint, chart, params, fmt)
+
+
+def is_cached(key: Optional[tuple]) -> bool:
+    return key is not None and key in _figures
+
+
+def not_modified() -> None:
+    _count("not_modified")
+
+
+def cached_figure(key: Optional[tuple], render: Callable[[], bytes]) -> bytes:
+    """
+    Image mémorisée pour la clé, ou rendue par `render()` puis conservée. Si le même
+    graphique est déjà en cours de rendu, on attend ce rendu au lieu d'en lancer un second.
+    """
+    if key is None:
+        return render()
+    image = _figures.get(key)
+    if image is not None:
+        _count("hits")
+        return image
+
+    with _counters_lock:
+        pending = _inflight.get(key)
+        owner = pending is None
+        if owner:
+            pending = _inflight[key] = Future()
+    if not owner:
+        _count("shared")
+        return pending.result()
+
+    _count("misses")
+    try:
+        image = render()
+        _figures.put(key, image, len(image))
+        pending.set_result(image)
+        return image
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        with _counters_lock:
+            _inflight.pop(key, None)
+
+
+def invalidate(fingerprint: Optional[str]) -> int:
+    """Supprime les images rendues pour un contenu donné. Retourne le nombre d'images supprimées."""
+    if fingerprint is None:
+        return 0
+    removed = 0
+    for key in [k for k in _figures.keys() if k[0] == fingerprint]:
+        if _figures.pop(key) is not None:
+            removed += 1
+    _count("invalidated", removed)
+    return removed
+
+
+def _on_dataset_replaced(session_id: str, fingerprint: Optional[str]) -> None:
+    # Images partagées par empreinte (voir result_cache) : gardées pour les autres sessions
+    if fingerprint is not None and not DataStore.fingerprint_in_use(fingerprint):
+        invalidate(fingerprint)
+
+
+def clear() -> None:
+    _figures.clear()
+
+
+def cache_stats() -> dict:
+    with _counters_lock:
+        counters = dict(_counters)
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        **counters,
+        "hit_ratio": counters["hits"] / lookups if lookups else None,
+        "entries": len(_figures),
+        "used_bytes": _figures.total_bytes,
+        "max_bytes": _figures.max_bytes,
+        "max_items": _figures.max_items,
+    }
+
+
+# Les images d'un jeu remplacé (DataStore.set_df) ou supprimé sont invalidées,
+# sauf si une autre session en mémoire a le même contenu
+DataStore.add_listener(_on_dataset_replaced)
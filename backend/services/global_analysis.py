@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services.profile import DatasetProfile
+from backend.services.rank_cache import PooledRanks, RankCache, average_ranks_sorted
+from backend.services.stats_services import (
+    _friedman_arrays,
+    _kruskal_from_pooled,
+    _ks_from_pooled,
+    _safe_p,
+    _spearman_from_groups,
+)
+from backend.services.utils.pool import STATS_WORKERS, SharedArrays, attach, get_pool
+
+logger = logging.getLogger(__name__)
+
+# En dessous de ce volume (lignes × paires), le coût de l'échange avec le pool dépasse le gain
+PARALLEL_MIN_CELLS = 2_000_000
+# Au-delà, une variable catégorielle (identifiant...) n'est pas analysée
+GLOBAL_MAX_LEVELS = 50
+
+@dataclass
+class Factor:
+    """Variable catégorielle factorisée une seule fois pour toute l'analyse."""
+    codes: np.ndarray   # code de modalité par ligne (-1 = manquant), entier le plus petit possible
+    levels: list        # modalités triées
+    rows: np.ndarray    # lignes regroupées par modalité, dans l'ordre d'origine
+    starts: np.ndarray  # début de chaque modalité dans `rows` (len(levels) + 1 bornes)
+    complete: bool      # aucune valeur manquante
+
+    def level_rows(self, i: int) -> np.ndarray:
+        return self.rows[self.starts[i]:self.starts[i + 1]]
+
+
+@dataclass
+class SortedColumn:
+    """
+    Seules données d'une colonne numérique lues par l'analyse (et copiées en mémoire partagée) :
+    ordre de tri et valeurs triées, sans les rangs par ligne du cache.
+    """
+    order: np.ndarray   # lignes renseignées, triées par valeur, entier le plus petit possible
+    values: np.ndarray  # valeurs triées (float64)
+
+    def row_values(self, n_rows: int) -> np.ndarray:
+        """Valeurs dans l'ordre des lignes (NaN si manquant), reconstruites à la demande."""
+        x = np.full(n_rows, np.nan)
+        x[self.order] = self.values
+        return x
+
+
+def factorize(series: pd.Series) -> Factor:
+    """
+    Codes entiers d'une variable catégorielle, modalités triées comme le faisait
+    `LabelEncoder` dans l'analyse globale (les manquants sont exclus des groupes).
+    """
+    try:
+        codes, uniques = pd.factorize(series, sort=True)
+    except TypeError:
+        # Types mélangés : on trie les libellés texte
+        codes, uniques = pd.factorize(series.where(series.isna(), series.astype(str)), sort=True)
+    codes = codes.astype(np.min_scalar_type(-max(len(uniques), 1)))
+    rows = np.argsort(codes, kind="stable").astype(np.min_scalar_type(max(len(codes), 1)))
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    missing = len(codes) - int(counts.sum())
+    starts = missing + np.r_[0, np.cumsum(counts)]
+    return Factor(codes, list(uniques), rows, starts, missing == 0)
+
+
+def _number(v: float) -> Optional[float]:
+    v = float(v)
+    return None if np.isnan(v) else v
+
+
+def _test(stat: float, p: float) -> dict:
+    return {"statistic": _number(stat), "p_value": None if np.isnan(p) else float(_safe_p(p))}
+
+
+def analyse_pair(state: dict, cat: str, num: str) -> dict:
+    """
+    Kruskal-Wallis, Spearman (codes des modalités), Kolmogorov-Smirnov (deux premiers groupes)
+    et Friedman (trois premiers groupes) pour une paire catégorielle × numérique.
+    Les valeurs sont lues dans l'ordre de tri en cache : aucun tri n'est refait.
+    """
+    factor: Factor = state["codes"][cat]
+    col: SortedColumn = state["ranks"][num]
+    levels = factor.levels
+    result = {"type": "pair", "categorical": cat, "numeric": num}
+
+    # Codes des lignes renseignées, dans l'ordre croissant des valeurs numériques
+    labels = factor.codes[col.order]
+    values = col.values
+    if not factor.complete:
+        keep = labels >= 0
+        values = values[keep]
+        labels = labels[keep]
+    ranks, tie_term = average_ranks_sorted(values)
+
+    # Groupes valides : au moins deux valeurs renseignées
+    sizes = np.bincount(labels, minlength=len(levels))
+    valid = np.flatnonzero(sizes > 1)
+    result["groups"] = [str(levels[g]) for g in valid]
+    result["n_per_group"] = [int(sizes[g]) for g in valid]
+    if len(valid) < 2:
+        result["error"] = "Pas assez de groupes valides"
+        return result
+
+    if len(valid) == len(levels):
+        pooled = PooledRanks(values, labels, ranks, tie_term, sizes)
+    else:
+        remap = np.full(len(levels), -1, dtype=labels.dtype)
+        remap[valid] = np.arange(len(valid))
+        group_labels = remap[labels]
+        in_group = group_labels >= 0
+        group_values = values[in_group]
+        group_ranks, group_ties = average_ranks_sorted(group_values)
+        pooled = PooledRanks(group_values, group_labels[in_group], group_ranks, group_ties, sizes[valid])
+
+    try:
+        result["kruskal"] = _test(*_kruskal_from_pooled(pooled))
+    except Exception as e:
+        result["kruskal"] = {"error": str(e)}
+
+    try:
+        if len(valid) > 2:
+            first_two = pooled.labels <= 1
+            two_values = pooled.values[first_two]
+            two_ranks, two_ties = average_ranks_sorted(two_values)
+            pooled = PooledRanks(two_values, pooled.labels[first_two], two_ranks, two_ties, pooled.sizes[:2])
+        result["ks"] = _test(*_ks_from_pooled(pooled))
+    except Exception as e:
+        result["ks"] = {"error": str(e)}
+
+    try:
+        # Les codes des modalités forment des blocs d'ex-aequo : les sommes de rangs par groupe suffisent
+        rank_sums = np.bincount(labels, weights=ranks, minlength=len(levels))
+        rs, p, n = _spearman_from_groups(rank_sums, sizes, tie_term)
+        result["spearman"] = {"correlation": _number(rs), "p_value": None if np.isnan(p) else float(_safe_p(p)), "n": int(n)}
+    except Exception as e:
+        result["spearman"] = {"error": str(e)}
+
+    if len(valid) >= 3:
+        try:
+            # Friedman apparie les trois premiers groupes ligne à ligne, tronqués à la même longueur
+            x = col.row_values(state["rows"])
+            arrays = [x[factor.level_rows(g)] for g in valid[:3]]
+            arrays = [a[~np.isnan(a)] for a in arrays]
+            min_len = min(len(a) for a in arrays)
+            if min_len < 3:
+                raise ValueError("Taille minimale des observations pour Friedman = 3.")
+            result["friedman"] = _test(*_friedman_arrays([a[:min_len] for a in arrays]))
+        except Exception as e:
+            result["friedman"] = {"error": str(e)}
+    return result
+
+
+def _analyse_batch(handle: tuple, pairs: list[tuple[str, str]]) -> list[dict]:
+    state = attach(handle)
+    return [analyse_pair(state, cat, num) for cat, num in pairs]
+
+
+def _line(obj: dict) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+
+def prepare_global(
+    df: pd.DataFrame,
+    profile: DatasetProfile,
+    ranks: RankCache,
+    target: Optional[str] = None,
+    max_levels: int = GLOBAL_MAX_LEVELS,
+) -> tuple[dict, dict]:
+    """
+    Sépare variables numériques / catégorielles (comme `analyse_globale`), factorise chaque
+    catégorielle une seule fois et remplit le cache de rangs des numériques.
+    Retourne (état de calcul, en-tête décrivant l'analyse).
+    """
+    numeric = [c for c in profile.numeric_columns() if c != target]
+    categorical, skipped = [], []
+    for name, col in profile.columns.items():
+        if col.is_numeric or name == target:
+            continue
+        (categorical if col.distinct_count <= max_levels else skipped).append(name)
+
+    row_type = np.min_scalar_type(max(profile.rows, 1))
+    sorted_columns = {}
+    for name in numeric:
+        col = ranks.column(name)
+        sorted_columns[name] = SortedColumn(col.order.astype(row_type, copy=False), col.values)
+    state = {
+        "codes": {name: factorize(df[name]) for name in categorical},
+        "ranks": sorted_columns,
+        "rows": profile.rows,
+    }
+    header = {
+        "type": "meta",
+        "rows": profile.rows,
+        "numeric": numeric,
+        "categorical": categorical,
+        "skipped_categorical": skipped,
+        "target": target,
+        "pairs": len(numeric) * len(categorical),
+    }
+    return state, header
+
+
+def _batches(pairs: list[tuple[str, str]], n_batches: int) -> list[list[tuple[str, str]]]:
+    size = max(1, -(-len(pairs) // n_batches))
+    return [pairs[i:i + size] for i in range(0, len(pairs), size)]
+
+
+def stream_global(state: dict, header: dict, workers: int = STATS_WORKERS) -> Iterator[str]:
+    """
+    Résultats NDJSON : une ligne d'en-tête, une ligne par paire dès qu'elle est calculée,
+    puis une ligne de fin. Les paires sont réparties sur un pool de processus ; si le
+    client se déconnecte, les paires non commencées sont annulées.
+    La préparation (écriture de l'état partagé) a lieu dès l'appel, avant toute réponse :
+    une erreur à ce stade est levée ici. Une erreur en cours de flux devient une ligne
+    `{"type": "error"}` au lieu d'une réponse tronquée.
+    """
+    lines = _stream_global(state, header, workers)
+    first = next(lines)
+
+    def stream() -> Iterator[str]:
+        try:
+            yield first
+            yield from lines
+        finally:
+            lines.close()
+
+    return stream()
+
+
+def _stream_global(state: dict, header: dict, workers: int) -> Iterator[str]:
+    started = time.perf_counter()
+    pairs = [(cat, num) for cat in header["categorical"] for num in header["numeric"]]
+    workers = max(1, min(workers, len(pairs)))
+    if workers > 1 and header["rows"] * len(pairs) < PARALLEL_MIN_CELLS:
+        workers = 1
+    # État de calcul écrit une fois en mémoire partagée, mappé par chaque processus du pool commun
+    shared = SharedArrays(state) if workers > 1 else None
+    try:
+        yield _line({**header, "workers": workers})
+
+        done = errors = 0
+        try:
+            if shared is None:
+                for cat, num in pairs:
+                    res = analyse_pair(state, cat, num)
+                    done += 1
+                    errors += "error" in res
+                    yield _line(res)
+            else:
+                # Petits lots (plusieurs par processus) : les résultats arrivent au fil de l'eau
+                pool = get_pool()
+                pending = {pool.submit(_analyse_batch, shared.handle, batch) for batch in _batches(pairs, workers * 8)}
+                try:
+                    while pending:
+                        finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            for res in future.result():
+                                done += 1
+                                errors += "error" in res
+                                yield _line(res)
+                finally:
+                    for future in pending:
+                        future.cancel()
+        except Exception as e:
+            logger.warning("Analyse globale interrompue après %d paires : %s", done, e)
+            yield _line({"type": "error", "detail": f"Analyse interrompue : {e}", "pairs_done": done})
+            return
+
+        yield _line({
+            "type": "done",
+            "pairs": len(pairs),
+            "errors": int(errors),
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        })
+    finally:
+        if shared is not None:
+            shared.__exit__(None, None, None)
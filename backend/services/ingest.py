@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import time
+from typing import BinaryIO, Optional, Union
+
+import pandas as pd
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from backend.services import metrics
+from backend.services.compaction import compact_frame
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024      # taille des blocs copiés sur disque
+SNIFF_BYTES = 10000           # premier bloc utilisé pour détecter le séparateur
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None
+INGEST_COMPACT = os.getenv("INGEST_COMPACT", "1") != "0"
+
+
+def detect_separator(sample: str) -> str:
+    """Détection du séparateur à partir d'un extrait du fichier."""
+    sep = ","
+    if sample.count(";") > sample.count(",") and sample.count(";") > sample.count("\t"):
+        sep = ";"
+    elif sample.count("\t") > sample.count(","):
+        sep = "\t"
+    return sep
+
+
+def buffered_upload(file: UploadFile) -> Optional[tuple[BinaryIO, int, bytes]]:
+    """
+    Fichier téléversé déjà mis en tampon par Starlette (`SpooledTemporaryFile`, écrit sur
+    disque au-delà de 1 Mo) : il est lu sur place, sans nouvelle copie.
+    Retourne (fichier rembobiné, taille en octets, premier bloc), ou None s'il n'est pas relisible.
+    """
+    f = file.file
+    try:
+        if not f.seekable():
+            return None
+        f.seek(0)
+        head = f.read(SNIFF_BYTES)
+        size = f.seek(0, os.SEEK_END)
+        f.seek(0)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return f, size, head
+
+
+async def spool_upload(file: UploadFile, chunk_size: int = CHUNK_SIZE) -> tuple[str, int, bytes]:
+    """
+    Repli de `buffered_upload` : copie le fichier téléversé par blocs dans un fichier
+    temporaire, sans jamais le charger entièrement en mémoire.
+    Retourne (chemin, taille en octets, premier bloc).
+    """
+    head = b""
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=UPLOAD_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, size, head
+
+
+def _rewind(source: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
+    """Fichier ouvert relu depuis le début (un chemin est rouvert par chaque lecteur)."""
+    if not isinstance(source, str):
+        source.seek(0)
+    return source
+
+
+def _convert_options(text_columns: list[str]):
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    # Cellules vides -> valeurs manquantes, comme avec pandas
+    return pacsv.ConvertOptions(strings_can_be_null=True, column_types={c: pa.string() for c in text_columns})
+
+
+def _temporal_columns(source: Union[str, BinaryIO], parse_options) -> list[str]:
+    """
+    Colonnes que pyarrow lirait comme dates ou horodatages, d'après le schéma du premier bloc
+    (lecteur en flux : un seul bloc est analysé). Elles sont gardées en texte, tels qu'écrites,
+    comme avec le lecteur C (sinon `date`/`datetime64` à la place des chaînes attendues).
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    reader = pacsv.open_csv(_rewind(source), parse_options=parse_options, convert_options=_convert_options([]))
+    try:
+        return [f.name for f in reader.schema if pa.types.is_temporal(f.type)]
+    finally:
+        reader.close()
+
+
+def read_csv_file(source: Union[str, BinaryIO], sep: str) -> tuple[pd.DataFrame, str]:
+    """
+    Lit le CSV (chemin ou fichier binaire ouvert) avec le lecteur multi-thread de pyarrow
+    s'il est disponible, sinon avec le lecteur C de pandas (qui lit aussi le fichier par blocs).
+    Retourne (DataFrame, moteur utilisé).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:
+        pass
+    else:
+        try:
+            parse_options = pacsv.ParseOptions(delimiter=sep)
+            temporal = _temporal_columns(source, parse_options)
+            table = pacsv.read_csv(_rewind(source), parse_options=parse_options, convert_options=_convert_options(temporal))
+            # Dates détectées seulement après le premier bloc (colonne vide au début) : relecture
+            late = [f.name for f in table.schema if pa.types.is_temporal(f.type)]
+            if late:
+                temporal += late
+                table = pacsv.read_csv(_rewind(source), parse_options=parse_options, convert_options=_convert_options(temporal))
+            # Colonnes binaires = UTF-8 invalide : le lecteur C saura ignorer ces octets
+            if not any(pa.types.is_binary(t) for t in table.schema.types):
+                # self_destruct libère les buffers Arrow au fil de la conversion
+                return table.to_pandas(split_blocks=True, self_destruct=True), "pyarrow"
+        except Exception as e:
+            # Lignes irrégulières, guillemets mal fermés... : le lecteur C est plus tolérant
+            logger.info("Lecture pyarrow impossible (%s), repli sur le moteur C", e)
+
+    return pd.read_csv(_rewind(source), sep=sep, encoding="utf-8", encoding_errors="ignore"), "c"
+
+
+async def ingest_csv(file: UploadFile) -> tuple[pd.DataFrame, dict]:
+    """
+    Chaîne d'ingestion complète : copie sur disque, détection du séparateur, lecture,
+    puis compaction des types. Le pic mémoire reste proche de la taille du DataFrame final.
+    Le rapport mémoire par colonne est renvoyé dans `info["compaction"]`.
+    """
+    buffered = buffered_upload(file)
+    if buffered is not None:
+        path = None
+        source, size, head = buffered
+    else:
+        path, size, head = await spool_upload(file)
+        source = path
+    try:
+        sep = detect_separator(head.decode("utf-8", errors="ignore"))
+        start = time.perf_counter()
+        # Lecture et compaction dans le pool de threads : la boucle d'événements reste libre
+        with metrics.span("parse"):
+            df, engine = await run_in_threadpool(read_csv_file, source, sep)
+        elapsed = time.perf_counter() - start
+    finally:
+        if path is not None:
+            os.remove(path)
+
+    size_mb = size / (1024 * 1024)
+    info = {
+        "sep": sep,
+        "engine": engine,
+        "size_mb": round(size_mb, 3),
+        "parse_seconds": round(elapsed, 4),
+        "throughput_mb_s": round(size_mb / elapsed, 2) if elapsed > 0 else None,
+    }
+    if INGEST_COMPACT:
+        with metrics.span("coerce"):
+            df, info["compaction"] = await run_in_threadpool(compact_frame, df)
+    return df, info
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tâches exécutées en parallèle (les autres attendent leur tour)
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "2")))
+# Tâches terminées conservées (les plus anciennes sont oubliées)
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))
+# Durée de conservation d'une tâche terminée et de son résultat (secondes)
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "3600"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Levée par `JobContext.check()` quand l'annulation a été demandée."""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: dict = field(default_factory=dict)
+    session_id: Optional[str] = None
+    # Type MIME d'un résultat binaire (image, NDJSON) ; None : résultat JSON
+    media_type: Optional[str] = None
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _future: Optional[Future] = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def expired(self, now: float, ttl: float) -> bool:
+        return self.finished and self.finished_at is not None and now - self.finished_at > ttl
+
+    def to_dict(self, with_result: bool = True) -> dict:
+        out = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "progress": round(self.progress, 4),
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "cancel_requested": self._cancel.is_set(),
+        }
+        if self.media_type is not None:
+            out["media_type"] = self.media_type
+        elif with_result:
+            out["result"] = self.result
+        return out
+
+
+class JobContext:
+    """Passé à la fonction de la tâche : avancement et annulation coopérative."""
+
+    def __init__(self, job: Job):
+        self._job = job
+
+    @property
+    def cancelled(self) -> bool:
+        return self._job._cancel.is_set()
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, fraction: float, message: Optional[str] = None) -> None:
+        """Met à jour l'avancement (0 à 1) et vérifie au passage l'annulation."""
+        self._job.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self._job.message = message
+        self.check()
+
+
+class JobManager:
+    """
+    Tâches de fond exécutées par un pool de threads local : la requête qui les soumet
+    répond immédiatement avec l'identifiant, puis le client suit l'avancement.
+    L'annulation est coopérative (la tâche appelle `ctx.check()` / `ctx.progress()`).
+    Les tâches terminées et leurs résultats restent en mémoire `ttl` secondes.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY, ttl: float = JOB_RESULT_TTL_S):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._history = history
+        self._ttl = ttl
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[[JobContext], Any], params: Optional[dict] = None,
+               session_id: Optional[str] = None, media_type: Optional[str] = None) -> Job:
+        job = Job(id=uuid.uuid4().hex, kind=kind, params=params or {}, session_id=session_id, media_type=media_type)
+        with self._lock:
+            self._forget_locked()
+            self._jobs[job.id] = job
+        job._future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[JobContext], Any]) -> None:
+        if job._cancel.is_set():
+            job.status, job.finished_at = CANCELLED, time.time()
+            return
+        job.status, job.started_at = RUNNING, time.time()
+        try:
+            job.result = fn(JobContext(job))
+            job.progress, job.status = 1.0, SUCCEEDED
+        except JobCancelled:
+            job.status, job.message = CANCELLED, "Annulée."
+        except Exception as e:
+            logger.exception("Tâche %s (%s) en échec", job.id, job.kind)
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def _forget_locked(self) -> None:
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values() if j.expired(now, self._ttl)]:
+            del self._jobs[job_id]
+        finished = [j.id for j in self._jobs.values() if j.finished]
+        for job_id in finished[: max(0, len(finished) - self._history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and job.expired(time.time(), self._ttl):
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            return None
+        return job
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Attend la fin de la tâche au plus `timeout` secondes ; la renvoie dans son état du moment."""
+        job = self.get(job_id)
+        if job is not None and job._future is not None:
+            wait([job._future], timeout=timeout)
+        return job
+
+    def list(self, kind: Optional[str] = None, session_id: Optional[str] = None) -> list[Job]:
+        with self._lock:
+            self._forget_locked()
+            jobs = list(self._jobs.values())
+        return [
+            j for j in jobs
+            if (kind is None or j.kind == kind) and (session_id is None or j.session_id == session_id)
+        ]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Demande l'annulation : immédiate si la tâche attend encore, sinon au prochain point de contrôle."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+        job._cancel.set()
+        if job._future is not None and job._future.cancel():
+            job.status, job.finished_at = CANCELLED, time.time()
+        return job
+
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [j.status for j in self._jobs.values()]
+        return {
+            "workers": self._executor._max_workers,
+            "ttl_s": self._ttl,
+            "total": len(statuses),
+            **{status: statuses.count(status) for status in (QUEUED, RUNNING, *FINISHED)},
+        }
+
+    def shutdown(self) -> None:
+        for job in self.list():
+            if not job.finished:
+                job._cancel.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+jobs = JobManager()
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from starlette.routing import Match
+
+# Instrumentation des requêtes (middleware + spans) ; 0 la désactive entièrement
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+# Étapes mesurées renvoyées au client dans l'en-tête Server-Timing
+SERVER_TIMING = os.getenv("METRICS_SERVER_TIMING", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(float(10 ** k) for k in range(2, 10))     # 100 o … 1 Go
+ROW_BUCKETS = tuple(float(10 ** k) for k in range(1, 9))       # 10 … 100 millions de lignes
+# Étapes usuelles des spans (d'autres noms sont acceptés)
+STAGES = ("parse", "coerce", "rank", "compute", "build", "render", "serialize")
+# Routes non déclarées regroupées sous un seul libellé (pas d'explosion du nombre de séries)
+UNMATCHED = "unmatched"
+BACKGROUND = "background"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Histogram:
+    """Histogramme Prometheus (compteurs par borne, somme, total) par combinaison d'étiquettes."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        # étiquettes -> [compteurs par borne (+Inf en dernier)..., somme]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Jauge Prometheus par combinaison d'étiquettes."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...]):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple, amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            snapshot = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in sorted(snapshot.items())]
+        return lines
+
+
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP (jusqu'au dernier octet de la réponse).",
+    ("method", "route", "status"), LATENCY_BUCKETS,
+)
+requests_in_flight = Gauge("http_requests_in_flight", "Requêtes HTTP en cours.", ("method", "route"))
+request_bytes = Histogram(
+    "http_request_size_bytes", "Taille du corps des requêtes (Content-Length).", ("route",), SIZE_BUCKETS,
+)
+response_bytes = Histogram("http_response_size_bytes", "Taille du corps des réponses.", ("route",), SIZE_BUCKETS)
+dataset_rows = Histogram(
+    "dataset_rows", "Lignes du jeu de données traité par la requête.", ("route",), ROW_BUCKETS,
+)
+stage_seconds = Histogram(
+    "stage_duration_seconds", "Durée des étapes mesurées par les services (parse, coerce, compute, render...).",
+    ("route", "stage"), LATENCY_BUCKETS,
+)
+startup_seconds = Gauge(
+    "startup_duration_seconds", "Durée des étapes du démarrage (import de l'application, modèles, préchauffage).",
+    ("step",),
+)
+METRICS = (
+    request_seconds, requests_in_flight, request_bytes, response_bytes, dataset_rows, stage_seconds, startup_seconds,
+)
+
+
+@dataclass
+class RequestMetrics:
+    """
+    État de la requête en cours. L'objet est partagé (et non copié) avec les threads
+    des routes synchrones : les spans qui y sont mesurés restent visibles du middleware.
+    """
+    route: str
+    rows: Optional[int] = None
+    spans: list = field(default_factory=list)   # (étape, secondes)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Mesure une étape d'un service (`with span("render"): ...`). La durée alimente
+    l'histogramme par route et par étape, et l'en-tête Server-Timing de la réponse.
+    Hors requête (tâche de fond), la route vaut "background". Les spans peuvent s'imbriquer.
+    """
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        state = _current.get()
+        stage_seconds.observe((state.route if state is not None else BACKGROUND, stage), elapsed)
+        if state is not None:
+            state.spans.append((stage, elapsed))
+
+
+def record_rows(n: int) -> None:
+    """Taille du jeu traité par la requête en cours (observée une fois, à la fin de la requête)."""
+    state = _current.get()
+    if state is not None:
+        state.rows = int(n)
+
+
+def server_timing(spans: list) -> str:
+    """Valeur de l'en-tête Server-Timing : durée cumulée par étape, en millisecondes."""
+    totals: dict[str, float] = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items())
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (sans BaseHTTPMiddleware : la réponse n'est pas remise en mémoire,
+    les flux restent des flux). Mesure durée, requêtes en cours et tailles par route
+    déclarée (`/visualisation/kde`, `/jobs/{job_id}`...), pas par URL.
+    """
+
+    # (méthode, chemin) -> route déclarée : la résolution n'est faite qu'une fois par URL
+    ROUTE_CACHE_SIZE = 4096
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: dict[tuple[str, str], str] = {}
+
+    def _route(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        route = self._routes.get(key)
+        if route is not None:
+            return route
+        route = UNMATCHED
+        app = scope.get("app")
+        for candidate in getattr(getattr(app, "router", None), "routes", ()):
+            match, _ = candidate.matches(scope)
+            if match == Match.FULL:
+                route = getattr(candidate, "path", UNMATCHED)
+                break
+            if match == Match.PARTIAL and route == UNMATCHED:
+                route = getattr(candidate, "path", UNMATCHED)
+        if len(self._routes) < self.ROUTE_CACHE_SIZE:
+            self._routes[key] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        state = RequestMetrics(self._route(scope))
+        token = _current.set(state)
+        requests_in_flight.inc((method, state.route))
+        started = time.perf_counter()
+        status, sent = 500, 0
+
+        async def send_with_metrics(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING and state.spans:
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [
+                        (b"server-timing", server_timing(state.spans).encode("latin-1"))
+                    ]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            requests_in_flight.dec((method, state.route))
+            request_seconds.observe((method, state.route, str(status)), elapsed)
+            response_bytes.observe((state.route,), sent)
+            for name, value in scope.get("headers", ()):
+                if name == b"content-length":
+                    request_bytes.observe((state.route,), float(value))
+                    break
+            if state.rows is not None:
+                dataset_rows.observe((state.route,), state.rows)
+
+
+def render() -> str:
+    """Toutes les métriques au format texte de Prometheus (version 0.0.4)."""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+# Dossier des modèles : chaque fichier `<nom>.pkl` est une version sélectionnable par son nom
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(BACKEND_DIR, "models"))
+MODEL_EXTENSION = ".pkl"
+# Modèle utilisé quand la requête n'en précise pas
+DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "diabetes_model")
+# Fréquence de vérification des fichiers (secondes) ; 0 désactive le rechargement à chaud
+MODEL_RELOAD_INTERVAL_S = float(os.getenv("MODEL_RELOAD_INTERVAL_S", "5"))
+
+
+@dataclass
+class ModelEntry:
+    """Modèle chargé en mémoire, avec l'état du fichier dont il provient."""
+    name: str
+    path: str
+    model: Any
+    mtime: float
+    file_size: int
+    loaded_at: float = field(default_factory=time.time)
+    load_time_s: float = 0.0
+    nbytes: int = 0
+    version: int = 1   # incrémentée à chaque rechargement
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "class": type(self.model).__name__,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "load_time_s": round(self.load_time_s, 4),
+            "memory_bytes": self.nbytes,
+            "file_bytes": self.file_size,
+            "file_mtime": self.mtime,
+            # Pipelines entraînés par /prediction/train : cible, variables, métriques
+            "training": getattr(self.model, "training_info_", None),
+        }
+
+
+def _footprint(obj: Any, seen: Optional[set] = None) -> int:
+    """
+    Mémoire approximative d'un objet et de ce qu'il référence (attributs, conteneurs,
+    tableaux NumPy comptés par leurs données) : suffisant pour un estimateur scikit-learn.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes) + sys.getsizeof(obj) if obj.base is None else sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_footprint(k, seen) + _footprint(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_footprint(v, seen) for v in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += _footprint(vars(obj), seen)
+    return size
+
+
+def _stat(path: str) -> Optional[tuple[float, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size
+
+
+class ModelRegistry:
+    """
+    Modèles chargés une fois puis gardés en mémoire. Un thread surveille le dossier :
+    un fichier modifié est rechargé à côté de l'ancien modèle, qui reste servi jusqu'au
+    remplacement (une simple affectation : les requêtes voient l'un ou l'autre, jamais
+    un modèle à moitié chargé). Un chargement en échec garde la version précédente.
+    """
+
+    def __init__(self, directory: str = MODELS_DIR, default: str = DEFAULT_MODEL):
+        self.directory = directory
+        self.default = default
+        self._models: dict[str, ModelEntry] = {}
+        self._errors: dict[str, str] = {}
+        # État (mtime, taille) des fichiers en échec : on ne retente que s'ils changent
+        self._failed: dict[str, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def _files(self) -> dict[str, str]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return {}
+        return {
+            name[: -len(MODEL_EXTENSION)]: os.path.join(self.directory, name)
+            for name in names
+            if name.endswith(MODEL_EXTENSION)
+        }
+
+    def _load(self, name: str, path: str, state: tuple[float, int]) -> None:
+        started = time.perf_counter()
+        try:
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+        except Exception as e:
+            with self._lock:
+                self._errors[name] = str(e)
+                self._failed[name] = state
+            logger.error("Modèles : échec du chargement de '%s' : %s", name, e)
+            return
+        previous = self._models.get(name)
+        entry = ModelEntry(
+            name=name,
+            path=path,
+            model=model,
+            mtime=state[0],
+            file_size=state[1],
+            load_time_s=time.perf_counter() - started,
+            nbytes=_footprint(model),
+            version=previous.version + 1 if previous is not None else 1,
+        )
+        with self._lock:
+            self._models[name] = entry
+            self._errors.pop(name, None)
+            self._failed.pop(name, None)
+        logger.info("Modèles : '%s' v%d chargé en %.3f s", name, entry.version, entry.load_time_s)
+
+    def refresh(self) -> None:
+        """Charge les nouveaux fichiers, recharge les fichiers modifiés, retire les fichiers supprimés."""
+        with self._refresh_lock:
+            self._refresh()
+
+    def _refresh(self) -> None:
+        files = self._files()
+        for name, path in files.items():
+            state = _stat(path)
+            if state is None:
+                continue
+            current = self._models.get(name)
+            if current is not None and (current.mtime, current.file_size) == state:
+                continue
+            if self._failed.get(name) == state:
+                continue
+            self._load(name, path, state)
+        with self._lock:
+            for name in [n for n in self._errors if n not in files]:
+                self._errors.pop(name)
+                self._failed.pop(name, None)
+            for name in [n for n in self._models if n not in files]:
+                del self._models[name]
+                logger.info("Modèles : '%s' retiré (fichier supprimé)", name)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(MODEL_RELOAD_INTERVAL_S):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Modèles : erreur de surveillance : %s", e)
+
+    def start(self) -> None:
+        self.refresh()
+        if MODEL_RELOAD_INTERVAL_S > 0 and self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._watcher = None
+
+    def get(self, name: Optional[str] = None) -> Optional[ModelEntry]:
+        """Modèle demandé (ou par défaut) ; None s'il n'est pas chargé."""
+        return self._models.get(name or self.default)
+
+    def names(self) -> list[str]:
+        return sorted(self._models)
+
+    def describe(self) -> dict:
+        with self._lock:
+            models = [e.to_dict() for e in sorted(self._models.values(), key=lambda e: e.name)]
+            errors = dict(self._errors)
+        return {
+            "directory": self.directory,
+            "default": self.default,
+            "reload_interval_s": MODEL_RELOAD_INTERVAL_S,
+            "models": models,
+            "total_memory_bytes": sum(m["memory_bytes"] for m in models),
+            "errors": errors,
+        }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,365 @@
+from __future__ import annotations
+
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Threads de calcul des lots (les opérations NumPy sur les lots libèrent le GIL)
+PERMUTATION_WORKERS = int(os.getenv("PERMUTATION_WORKERS", str(os.cpu_count() or 1)))
+# Taille d'un lot : nombre d'éléments (permutations × observations) traités d'un coup
+BATCH_ELEMENTS = 2_000_000
+# ... et au plus ce nombre de permutations, pour tester l'arrêt anticipé assez souvent
+BATCH_MAX_PERMUTATIONS = 2000
+# Nombre minimal de permutations avant d'autoriser l'arrêt anticipé
+MIN_PERMUTATIONS = 1000
+DEFAULT_PERMUTATIONS = 10000
+DEFAULT_TOLERANCE = 0.005
+CONFIDENCE = 0.99
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, PERMUTATION_WORKERS), thread_name_prefix="permutation")
+        return _executor
+
+
+# Tirage par sous-ensembles (masques de bits) jusqu'à ce nombre de groupes, et au plus un groupe
+# par SUBSET_N_PER_GROUP observations (petits jeux : le mélange complet coûte moins) ; sinon mélange
+SUBSET_MAX_GROUPS = 8
+SUBSET_N_PER_GROUP = 128
+# ... et jusqu'à ce nombre d'observations (table de 256 sommes par octet de masque)
+SUBSET_MAX_N = 1 << 17
+
+# Corrections tirées par rejet parmi les n observations si l'ensemble où tirer en contient au
+# moins 1/MIN_POOL_FRACTION ; sinon (petits groupes) par clés aléatoires sur ses observations
+MIN_POOL_FRACTION = 16
+
+_ONES = ~np.uint64(0)
+# _BITS[v, j] : bit de l'élément j (0 = bit de poids fort) dans l'octet v, comme np.packbits
+_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1)
+# Constantes du comptage de bits d'un mot de 64 bits octet par octet (SWAR) ; × _H : somme des octets
+_M1, _M2, _M4, _H = (np.uint64(v) for v in (0x5555555555555555, 0x3333333333333333, 0x0F0F0F0F0F0F0F0F, 0x0101010101010101))
+_BIT_MASKS = (np.uint8(0x80) >> np.arange(8, dtype=np.uint8)).astype(np.uint8)
+
+
+def _centered(sums: np.ndarray, sizes: np.ndarray, n: int, total: int) -> np.ndarray:
+    """
+    Écart de chaque groupe à sa somme de rangs attendue, en entiers exacts :
+    E_g = N·T_g − n_g·T (T_g : somme des rangs doublés du groupe, T : somme totale).
+    """
+    return n * sums - sizes * total
+
+
+def _statistic(centered: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """
+    Statistique centrée (dernier axe = groupes). Deux groupes : |E_1|, entier, proportionnel
+    à |U − n1·n2/2| (Mann-Whitney bilatéral). Sinon Σ E_g²/n_g, proportionnel au H de
+    Kruskal-Wallis (Σ n_g·(R̄_g − R̄)²) : nulle sous l'hypothèse nulle parfaite, sans la
+    grande constante de Σ R²/n qui noyait les écarts dans les arrondis.
+    """
+    if centered.shape[-1] == 2:
+        return np.abs(centered[..., 0])
+    return (centered.astype(float) ** 2 / sizes).sum(axis=-1)
+
+
+class _Subsets:
+    """
+    Tirage exact de groupes aléatoires sous forme de masques de bits (un octet = 8 observations).
+    Un groupe de taille m parmi les c observations disponibles est tiré en deux temps :
+    chaque observation est retenue avec une probabilité proche de m/c (bits aléatoires), puis
+    l'écart à m (de l'ordre de √c) est corrigé en retirant ou ajoutant des observations tirées
+    uniformément. Les deux étapes traitent toutes les observations de la même façon : le groupe
+    est un sous-ensemble uniforme de taille m, comme la tête d'une permutation aléatoire, mais
+    sans mélanger les n rangs. Les sommes de rangs se lisent par octet dans une table.
+    """
+
+    def __init__(self, doubled: np.ndarray):
+        n = len(doubled)
+        self.n = n
+        self.nbytes = -(-n // 64) * 8   # masques lus aussi en uint64
+        values = np.zeros(self.nbytes * 8, dtype=np.int64)
+        values[:n] = doubled
+        self.values = values
+        # Somme des rangs doublés des bits à 1 de chaque valeur d'octet, position par position
+        self.sums = (values.reshape(self.nbytes, 8) @ _BITS.T.astype(np.int64)).astype(np.int32).ravel()
+        self.offsets = np.arange(self.nbytes, dtype=np.intp) * 256   # indices intp : np.take sans conversion
+        self.full = np.packbits(np.arange(self.nbytes * 8) < n)
+
+    def total(self, mask: np.ndarray) -> np.ndarray:
+        return np.take(self.sums, self.offsets + mask).sum(axis=1, dtype=np.int64)
+
+    def _bernoulli(self, rng: np.random.Generator, size: int, p: float, c: int) -> np.ndarray:
+        """
+        Masque aléatoire : chaque bit vaut 1 avec une probabilité t/2**bits proche de p, par
+        comparaison bit à bit (poids fort d'abord) d'un entier aléatoire au seuil t. Résolution
+        choisie pour que l'écart ajouté reste de l'ordre de √c ; seuls les bits utiles sont tirés.
+        """
+        bits = int(min(12, max(4, np.ceil(np.log2(max(c, 2)) / 2) + 1)))
+        t = int(round(p * (1 << bits)))
+        shape = (size, self.nbytes // 8)
+        if t <= 0:
+            return np.zeros(shape, dtype=np.uint64).view(np.uint8)
+        if t >= 1 << bits:
+            return np.full(shape, _ONES).view(np.uint8)
+        below = np.zeros(shape, dtype=np.uint64)
+        equal = np.full(shape, _ONES)
+        planes = bits - (t & -t).bit_length() + 1
+        for q in range(planes):
+            u = rng.integers(0, 2 ** 64, size=shape, dtype=np.uint64)
+            if (t >> (bits - 1 - q)) & 1:
+                np.invert(u, out=u)
+                below |= equal & u
+                equal &= ~u
+            else:
+                equal &= ~u
+        return below.view(np.uint8)
+
+    def _bit(self, mask: np.ndarray, rows: np.ndarray, elements: np.ndarray) -> np.ndarray:
+        return mask.ravel()[rows * self.nbytes + (elements >> 3)] & _BIT_MASKS[elements & 7] != 0
+
+    def _draw_elements(
+        self, rng: np.random.Generator, base: np.ndarray, over: np.ndarray, available: Optional[np.ndarray],
+        k: np.ndarray, pool_count: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        k[i] observations distinctes parmi les pool_count[i] de base[i] si over[i], sinon parmi
+        celles de available[i] hors de base[i] (None : toutes les observations) ; k[i] au plus
+        la moitié d'entre elles. Indices tirés uniformément parmi les n, ceux hors de cet ensemble
+        ou en double étant tirés à nouveau : la procédure ne distingue aucune observation de
+        l'ensemble, chaque sous-ensemble reste équiprobable. Ensemble trop petit devant n (trop
+        de rejets) : clés aléatoires sur ses observations. Retourne (lignes, observations).
+        """
+
+        def outside(rows: np.ndarray, elements: np.ndarray) -> np.ndarray:
+            inside = self._bit(base, rows, elements) == over[rows]
+            if available is not None:
+                inside &= self._bit(available, rows, elements)
+            return ~inside
+
+        rejection = pool_count * MIN_POOL_FRACTION >= self.n
+        keys = np.empty(0, dtype=np.int64)
+        missing = np.repeat(np.arange(len(k)), np.where(rejection, k, 0))
+        while len(missing):
+            drawn = rng.integers(0, self.n, size=len(missing))
+            redraw = np.flatnonzero(outside(missing, drawn))
+            while len(redraw):
+                # Tirages hors de l'ensemble recommencés seuls ; ensemble occupant une faible
+                # fraction d des n : environ 1/d candidats par place, le premier dedans est retenu
+                tries = -(-self.n // int(pool_count[missing[redraw]].min()))
+                if tries <= 4:
+                    drawn[redraw] = rng.integers(0, self.n, size=len(redraw))
+                    redraw = redraw[outside(missing[redraw], drawn[redraw])]
+                    continue
+                candidates = rng.integers(0, self.n, size=(len(redraw), tries))
+                rejected = outside(np.repeat(missing[redraw], tries), candidates.ravel()).reshape(-1, tries)
+                first = rejected.argmin(axis=1)
+                found = ~rejected[np.arange(len(redraw)), first]
+                drawn[redraw[found]] = candidates[found, first[found]]
+                redraw = redraw[~found]
+            # Clé = ligne·n + observation : les doublons d'une même ligne sont voisins une fois
+            # triés ; les nouvelles clés sont aussi cherchées parmi celles déjà retenues
+            new = np.sort(missing * self.n + drawn)
+            duplicated = np.zeros(len(new), dtype=bool)
+            duplicated[1:] = new[1:] == new[:-1]
+            if len(keys):
+                duplicated |= keys[np.minimum(np.searchsorted(keys, new), len(keys) - 1)] == new
+            keys = np.concatenate([keys, new[~duplicated]]) if len(keys) else new[~duplicated]
+            keys.sort(kind="stable")   # deux suites déjà triées : simple fusion
+            missing = new[duplicated] // self.n
+        row_ids, elements = keys // self.n, keys % self.n
+
+        dense = np.flatnonzero(~rejection & (k > 0))
+        if len(dense):
+            pool = self._pool(base[dense], over[dense], None if available is None else available[dense])
+            scores = np.where(np.unpackbits(pool, axis=1).astype(bool), rng.random((len(dense), self.nbytes * 8)), 2.0)
+            kth = np.sort(scores, axis=1)[np.arange(len(dense)), k[dense] - 1]
+            ri, dense_elements = np.nonzero(scores <= kth[:, None])
+            row_ids = np.concatenate([row_ids, dense[ri]])
+            elements = np.concatenate([elements, dense_elements])
+        return row_ids, elements
+
+    def draw(
+        self, rng: np.random.Generator, size: int, available: Optional[np.ndarray], c: int, m: int,
+        keep_mask: bool = True,
+    ) -> tuple[Optional[np.ndarray], np.ndarray]:
+        """
+        `size` groupes uniformes de m observations parmi les c de `available` (même nombre sur
+        chaque ligne ; None : les n observations, pour le premier groupe). Retourne (masques, ou
+        None sans `keep_mask`, sommes des rangs doublés).
+        """
+        if m * MIN_POOL_FRACTION < self.n:
+            # Petit groupe : tiré directement, observation par observation
+            base = np.zeros((size, self.nbytes), dtype=np.uint8)
+        else:
+            base = self._bernoulli(rng, size, m / max(c, 1), c)
+            base &= self.full if available is None else available
+        count = _counts(base)
+        excess = count - m
+        # Trop d'observations : on en retire parmi celles retenues ; pas assez : on en ajoute parmi les autres
+        over = excess > 0
+        pool_count = np.where(over, count, c - count)
+        k = np.abs(excess)
+        # Plus de la moitié de l'ensemble : on tire plutôt les observations écartées
+        flip = 2 * k > pool_count
+        k = np.where(flip, pool_count - k, k)
+        row_ids, elements = self._draw_elements(rng, base, over, available, k, pool_count)
+        picked_sums = np.rint(np.bincount(row_ids, weights=self.values[elements], minlength=size)).astype(np.int64)
+        if flip.any():
+            pool = self._pool(base[flip], over[flip], None if available is None else available[flip])
+            picked_sums[flip] = self.total(pool) - picked_sums[flip]
+        sums = self.total(base) + np.where(over, -picked_sums, picked_sums)
+        if not keep_mask:
+            return None, sums
+        picked = np.zeros_like(base)
+        np.bitwise_or.at(picked, (row_ids, elements >> 3), _BIT_MASKS[elements & 7])
+        if flip.any():
+            picked[flip] = pool & ~picked[flip]
+        return base ^ picked, sums
+
+    def _pool(self, base: np.ndarray, over: np.ndarray, available: Optional[np.ndarray]) -> np.ndarray:
+        """Ensemble où sont tirées les corrections : base si over, sinon le reste des disponibles."""
+        rest = (self.full if available is None else available) & ~base
+        return np.where(over[:, None], base, rest)
+
+
+def _counts(mask: np.ndarray) -> np.ndarray:
+    """Bits à 1 de chaque ligne d'un masque (lignes × octets), comptés par octet dans des mots de 64 bits."""
+    x = mask.view(np.uint64)
+    x = x - ((x >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return ((x * _H) >> np.uint64(56)).sum(axis=1, dtype=np.int64)
+
+
+def _batch_subsets(subsets: _Subsets, sizes: np.ndarray, size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Sommes des rangs doublés par groupe pour `size` permutations (groupes tirés l'un après l'autre)."""
+    rng = np.random.default_rng(seed)
+    available = None
+    c = subsets.n
+    sums = np.empty((size, len(sizes)), dtype=np.int64)
+    # Du plus petit groupe au plus grand, qui reçoit le reste : chaque groupe est tiré parmi
+    # au moins autant d'observations qu'il en reste pour le plus grand
+    order = np.argsort(sizes, kind="stable")
+    for g in order[:-1]:
+        m = int(sizes[g])
+        # Le dernier groupe tiré n'a pas besoin de son masque
+        last = g == order[-2]
+        group, sums[:, g] = subsets.draw(rng, size, available, c, m, keep_mask=not last)
+        if not last:
+            available = (subsets.full if available is None else available) & ~group
+        c -= m
+    sums[:, order[-1]] = subsets.values.sum() - sums[:, order[:-1]].sum(axis=1)
+    return sums
+
+
+def _batch_shuffle(doubled: np.ndarray, starts: np.ndarray, size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Sommes des rangs doublés par groupe pour `size` permutations complètes (tableau size × n)."""
+    rng = np.random.default_rng(seed)
+    permuted = rng.permuted(np.broadcast_to(doubled, (size, len(doubled))), axis=1)
+    return np.add.reduceat(permuted, starts, axis=1)
+
+
+def _clopper_pearson(k: int, n: int, confidence: float) -> tuple[float, float]:
+    from scipy import stats
+    alpha = 1 - confidence
+    lo = 0.0 if k == 0 else float(stats.beta.ppf(alpha / 2, k, n - k + 1))
+    hi = 1.0 if k == n else float(stats.beta.ppf(1 - alpha / 2, k + 1, n - k))
+    return lo, hi
+
+
+def _exact_statistic(centered: np.ndarray, sizes: np.ndarray) -> int:
+    """Σ E_g²/n_g multipliée par le PPCM des effectifs : comparaison exacte (entiers Python)."""
+    lcm = math.lcm(*(int(s) for s in sizes))
+    return sum(int(e) * int(e) * (lcm // int(s)) for e, s in zip(centered, sizes))
+
+
+def rank_permutation_test(
+    ranks: np.ndarray,
+    sizes: Sequence[int],
+    n_permutations: int = DEFAULT_PERMUTATIONS,
+    seed: Optional[int] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    confidence: float = CONFIDENCE,
+) -> dict:
+    """
+    P-value par permutation d'un test de rangs à k groupes (Mann-Whitney si k = 2,
+    Kruskal-Wallis sinon). `ranks` contient les rangs moyens groupe par groupe, dans
+    l'ordre de `sizes`. Les permutations sont tirées par lots (tableaux 2D), chaque lot
+    ayant sa propre graine dérivée de `seed` : le résultat ne dépend pas du nombre de threads.
+    Le calcul s'arrête dès que l'intervalle de confiance de la p-value a une demi-largeur
+    inférieure à `tolerance` (0 = toutes les permutations demandées).
+    """
+    # Rangs moyens doublés : des entiers, les sommes et la statistique à deux groupes sont exactes
+    doubled = np.rint(2 * np.asarray(ranks, dtype=float)).astype(np.int64)
+    sizes = np.asarray(sizes, dtype=np.int64)
+    n, total = len(doubled), int(doubled.sum())
+    starts = np.r_[0, np.cumsum(sizes)[:-1]].astype(np.intp)
+    observed_centered = _centered(np.add.reduceat(doubled, starts), sizes, n, total)
+    observed = _statistic(observed_centered, sizes)
+    exact_observed = _exact_statistic(observed_centered, sizes)
+    # Plusieurs groupes : les valeurs à quelques ulps de l'observée sont départagées en entiers
+    margin = 8 * len(sizes) * np.finfo(float).eps * max(float(observed), 1.0)
+
+    if len(sizes) <= min(SUBSET_MAX_GROUPS, max(2, n // SUBSET_N_PER_GROUP)) and n <= SUBSET_MAX_N:
+        subsets = _Subsets(doubled)
+        batch = partial(_batch_subsets, subsets, sizes)
+        row_elements = subsets.nbytes   # un octet de masque pour 8 observations
+    else:
+        batch = partial(_batch_shuffle, doubled, starts)
+        row_elements = n
+
+    batch_size = int(max(1, min(n_permutations, BATCH_MAX_PERMUTATIONS, BATCH_ELEMENTS // max(row_elements, 1))))
+    n_batches = -(-n_permutations // batch_size)
+    seed_seq = np.random.SeedSequence(seed)
+    batch_seeds = seed_seq.spawn(n_batches)
+    executor = _get_executor()
+    workers = max(1, PERMUTATION_WORKERS)
+
+    done = extreme = 0
+    stopped_early = False
+    next_batch = 0
+    while next_batch < n_batches and not stopped_early:
+        # Un tour = un lot par thread ; les lots sont ensuite consommés dans l'ordre
+        round_ids = range(next_batch, min(next_batch + workers, n_batches))
+        sizes_round = [min(batch_size, n_permutations - i * batch_size) for i in round_ids]
+        futures = [executor.submit(batch, size, batch_seeds[i]) for i, size in zip(round_ids, sizes_round)]
+        for future in futures:
+            if stopped_early:
+                future.cancel()
+                continue
+            centered = _centered(future.result(), sizes, n, total)
+            values = _statistic(centered, sizes)
+            done += len(values)
+            if len(sizes) == 2:
+                extreme += int(np.count_nonzero(values >= observed))
+            else:
+                extreme += int(np.count_nonzero(values > observed + margin))
+                for row in np.flatnonzero(np.abs(values - observed) <= margin):
+                    extreme += _exact_statistic(centered[row], sizes) >= exact_observed
+            if tolerance > 0 and done >= MIN_PERMUTATIONS and done < n_permutations:
+                lo, hi = _clopper_pearson(extreme, done, confidence)
+                stopped_early = (hi - lo) / 2 <= tolerance
+        next_batch += len(futures)
+
+    lo, hi = _clopper_pearson(extreme, done, confidence)
+    return {
+        "method": "permutation",
+        # Jamais nulle : la permutation observée fait partie de la loi de référence
+        "p_value": (extreme + 1) / (done + 1),
+        "n_permutations": int(done),
+        "requested_permutations": int(n_permutations),
+        "stopped_early": stopped_early,
+        "confidence": confidence,
+        "ci": [lo, hi],
+        "seed": seed_seq.entropy if seed is None else seed,
+    }
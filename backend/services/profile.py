@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services import metrics
+from backend.services.data_store import DEFAULT_SESSION, DataStore
+
+TOP_K = 10
+CATEGORICAL_MAX_UNIQUE = 30
+
+
+def _scalar(v: Any) -> Any:
+    """Valeur numpy -> type Python natif (sérialisable en JSON)."""
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    return v
+
+
+def _coerce_numeric(s: pd.Series) -> Optional[pd.Series]:
+    """
+    Vue numérique d'une colonne : la colonne elle-même si elle est déjà numérique
+    (pas de copie), sinon sa conversion `to_numeric(errors="coerce")`.
+    None si aucune valeur n'est convertible.
+    """
+    if pd.api.types.is_bool_dtype(s.dtype):
+        return s.astype(np.int8)
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # On ne convertit que les modalités, puis on réindexe par les codes
+        cats = pd.to_numeric(pd.Series(s.cat.categories), errors="coerce").to_numpy(dtype=float)
+        if np.isnan(cats).all():
+            return None
+        codes = s.cat.codes.to_numpy()
+        values = np.where(codes >= 0, cats[codes], np.nan)
+        return pd.Series(values, index=s.index, name=s.name)
+    coerced = pd.to_numeric(s, errors="coerce")
+    if coerced.isna().all():
+        return None
+    return coerced.astype(float)
+
+
+@dataclass
+class ColumnProfile:
+    name: str
+    dtype: str
+    is_numeric: bool
+    null_count: int
+    distinct_count: int
+    numeric: Optional[pd.Series] = field(default=None, repr=False)
+    min: Any = None
+    max: Any = None
+    top_categories: list[dict] = field(default_factory=list)
+
+    def numeric_values(self) -> pd.Series:
+        """Valeurs numériques non manquantes (vue sans copie si la colonne est complète)."""
+        if self.numeric is None:
+            return pd.Series(dtype=float)
+        if self.numeric.hasnans:
+            return self.numeric.dropna()
+        return self.numeric
+
+    @property
+    def owned_nbytes(self) -> int:
+        """Mémoire propre au profil (la vue numérique n'est une copie que pour les colonnes converties)."""
+        if self.numeric is None or self.is_numeric:
+            return 0
+        return int(self.numeric.memory_usage(index=False))
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "dtype": self.dtype,
+            "is_numeric": self.is_numeric,
+            "coercible_numeric": self.numeric is not None,
+            "null_count": self.null_count,
+            "distinct_count": self.distinct_count,
+            "min": self.min,
+            "max": self.max,
+            "top_categories": self.top_categories,
+        }
+
+
+@dataclass
+class DatasetProfile:
+    rows: int
+    columns: dict[str, ColumnProfile]
+
+    def __getitem__(self, name: str) -> ColumnProfile:
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.owned_nbytes for c in self.columns.values())
+
+    def numeric_columns(self) -> list[str]:
+        return [c.name for c in self.columns.values() if c.is_numeric]
+
+    def categorical_columns(self, max_unique: int = CATEGORICAL_MAX_UNIQUE) -> list[str]:
+        return [c.name for c in self.columns.values() if not c.is_numeric or c.distinct_count <= max_unique]
+
+
+def profile_column(s: pd.Series) -> ColumnProfile:
+    is_numeric = pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype)
+    distinct = int(s.nunique(dropna=True))
+    prof = ColumnProfile(
+        name=str(s.name),
+        dtype=str(s.dtype),
+        is_numeric=is_numeric,
+        null_count=int(s.isna().sum()),
+        distinct_count=distinct,
+        numeric=_coerce_numeric(s),
+    )
+    if prof.numeric is not None:
+        prof.min = _scalar(prof.numeric.min())
+        prof.max = _scalar(prof.numeric.max())
+    if not is_numeric or distinct <= CATEGORICAL_MAX_UNIQUE:
+        counts = s.value_counts(dropna=True).head(TOP_K)
+        prof.top_categories = [{"value": _scalar(k), "count": int(v)} for k, v in counts.items()]
+    return prof
+
+
+def build_profile(df: pd.DataFrame) -> DatasetProfile:
+    """Profil de toutes les colonnes, calculé une seule fois par téléversement."""
+    # Conversion numérique (`to_numeric`) de chaque colonne : l'étape "coerce"
+    with metrics.span("coerce"):
+        return DatasetProfile(
+            rows=int(len(df)),
+            columns={str(col): profile_column(df[col]) for col in df.columns},
+        )
+
+
+def get_profile(session_id: str = DEFAULT_SESSION) -> Optional[DatasetProfile]:
+    """Profil du jeu de la session (construit au premier appel, puis conservé avec le jeu)."""
+    return DataStore.get_extra("profile", session_id, factory=build_profile)
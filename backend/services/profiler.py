@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import hmac
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+from urllib.parse import parse_qsl
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+# Jeton d'administration : sans lui, le profilage est désactivé (middleware non installé, /debug en 404)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Dossier des profils (partagé par les workers uvicorn : un profil se télécharge depuis n'importe lequel)
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(BACKEND_DIR, "profiles"))
+# Intervalle d'échantillonnage (millisecondes)
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "2"))
+# Durée maximale échantillonnée par requête (secondes) : au-delà, la requête continue sans profil
+PROFILING_MAX_S = float(os.getenv("PROFILING_MAX_S", "120"))
+# Nombre de profils conservés sur disque (les plus anciens sont supprimés)
+PROFILES_KEPT = int(os.getenv("PROFILES_KEPT", "50"))
+
+PROFILING_ENABLED = bool(ADMIN_TOKEN)
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Threads qui exécutent les requêtes, en plus de la boucle asyncio : pool des routes synchrones,
+# rendus kaleido, permutations. Les tâches de fond (job), la surveillance des modèles, etc. sont exclues.
+REQUEST_THREADS = ("AnyIO worker thread", "kaleido_", "permutation_")
+# Fonctions où un thread attend sans travailler (pool au repos, boucle asyncio sans événement) :
+# ces échantillons sont ignorés
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return PROFILING_ENABLED and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+class Sampler:
+    """
+    Profileur par échantillonnage : un thread relève la pile Python de tous les autres
+    threads toutes les `interval` secondes (sys._current_frames). Rien n'est instrumenté :
+    le code profilé s'exécute normalement, le coût est celui du relevé, hors de la requête.
+
+    Seuls la boucle asyncio (middlewares, routes async) et les threads de REQUEST_THREADS
+    sont relevés, et seulement quand ils travaillent. Une requête concurrente apparaîtrait
+    aussi dans le profil, dans son propre thread.
+    """
+
+    def __init__(self, loop_thread: Optional[int] = None, interval: float = PROFILING_INTERVAL_MS / 1000,
+                 max_duration: float = PROFILING_MAX_S):
+        self.loop_thread = loop_thread
+        self.interval = interval
+        self.max_duration = max_duration
+        self.frames: list[dict] = []
+        self._frame_index: dict = {}
+        # thread -> piles échantillonnées (indices de frames, racine en premier) et poids (secondes)
+        self.samples: dict[int, list[list[int]]] = defaultdict(list)
+        self.weights: dict[int, list[float]] = defaultdict(list)
+        self.thread_names: dict[int, str] = {}
+        self._ignored: set[int] = set()
+        self.started = self.stopped = 0.0
+        self.truncated = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _index(self, code) -> int:
+        index = self._frame_index.get(code)
+        if index is None:
+            index = self._frame_index[code] = len(self.frames)
+            self.frames.append({
+                "name": getattr(code, "co_qualname", code.co_name),
+                "file": code.co_filename,
+                "line": code.co_firstlineno,
+            })
+        return index
+
+    def _sampled(self, ident: int) -> bool:
+        if ident in self.thread_names:
+            return True
+        if ident in self._ignored:
+            return False
+        names = {t.ident: t.name for t in threading.enumerate()}
+        name = names.get(ident, "")
+        if ident == self.loop_thread:
+            self.thread_names[ident] = f"event loop ({name})"
+        elif name.startswith(REQUEST_THREADS):
+            self.thread_names[ident] = name
+        else:
+            self._ignored.add(ident)
+            return False
+        return True
+
+    def _stack(self, frame) -> Optional[list[int]]:
+        code = frame.f_code
+        if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+            return None
+        stack = []
+        while frame is not None:
+            stack.append(self._index(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        last = self.started
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == me or not self._sampled(ident):
+                    continue
+                stack = self._stack(frame)
+                if stack is None:
+                    continue
+                self.samples[ident].append(stack)
+                self.weights[ident].append(elapsed)
+            if now - self.started > self.max_duration:
+                self.truncated = True
+                break
+        self.stopped = time.perf_counter()
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def speedscope(self, name: str) -> dict:
+        """Profil au format speedscope (un profil « sampled » par thread, le plus chargé en premier)."""
+        threads = sorted(self.samples, key=lambda t: -len(self.samples[t]))
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "ttk-stattestia",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": self.thread_names.get(t, str(t)),
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": round(sum(self.weights[t]), 6),
+                    "samples": self.samples[t],
+                    "weights": [round(w, 6) for w in self.weights[t]],
+                }
+                for t in threads
+            ],
+        }
+
+
+def collapsed(profile: dict) -> str:
+    """
+    Piles repliées (« thread;racine;...;feuille nombre ») : l'entrée de flamegraph.pl,
+    d'inferno ou de speedscope, un nombre d'échantillons par pile distincte.
+    """
+    names = [f"{f['name']} ({os.path.basename(f['file'])}:{f['line']})" for f in profile["shared"]["frames"]]
+    counts: dict[str, int] = defaultdict(int)
+    for p in profile["profiles"]:
+        for stack in p["samples"]:
+            counts[";".join([p["name"].replace(";", ":")] + [names[i] for i in stack])] += 1
+    return "".join(f"{stack} {n}\n" for stack, n in counts.items())
+
+
+# ===========================
+#     STOCKAGE
+# ===========================
+
+def _path(profile_id: str) -> str:
+    return os.path.join(PROFILES_DIR, f"{profile_id}.speedscope.json")
+
+
+def _meta_path(profile_id: str) -> str:
+    return os.path.join(PROFILES_DIR, f"{profile_id}.json")
+
+
+def save(profile_id: str, profile: dict, meta: dict) -> None:
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    for path, content in ((_path(profile_id), profile), (_meta_path(profile_id), meta)):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(content, f, separators=(",", ":"))
+        os.replace(tmp, path)
+    for old in list_profiles()[PROFILES_KEPT:]:
+        delete(old["id"])
+
+
+def list_profiles() -> list[dict]:
+    """Métadonnées des profils enregistrés, du plus récent au plus ancien."""
+    try:
+        names = os.listdir(PROFILES_DIR)
+    except OSError:
+        return []
+    out = []
+    for name in names:
+        profile_id, ext = os.path.splitext(name)
+        if ext != ".json" or not PROFILE_ID_PATTERN.match(profile_id):
+            continue
+        try:
+            with open(os.path.join(PROFILES_DIR, name), encoding="utf-8") as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(out, key=lambda m: m.get("created_at", 0), reverse=True)
+
+
+def load(profile_id: str) -> Optional[dict]:
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    try:
+        with open(_path(profile_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def delete(profile_id: str) -> bool:
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return False
+    found = False
+    for path in (_path(profile_id), _meta_path(profile_id)):
+        try:
+            os.remove(path)
+            found = True
+        except OSError:
+            pass
+    return found
+
+
+# ===========================
+#     MIDDLEWARE
+# ===========================
+
+def _requested(scope) -> bool:
+    """Requête marquée (`X-Profile: 1` ou `?profile=1`) et envoyée avec le jeton d'administration."""
+    headers = dict(scope.get("headers", ()))
+    flag = headers.get(b"x-profile", b"").decode("latin-1")
+    if not flag:
+        flag = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))).get("profile", "")
+    if flag.lower() not in ("1", "true"):
+        return False
+    return is_admin(headers.get(b"x-admin-token", b"").decode("latin-1") or None)
+
+
+class ProfilingMiddleware:
+    """
+    Profil d'une requête à la demande. Installé seulement si ADMIN_TOKEN est défini ;
+    une requête non marquée ne coûte qu'une lecture de ses en-têtes. Un seul profil à la fois :
+    une requête marquée pendant un autre profil est servie normalement, sans profil.
+    La réponse porte `X-Profile-Id`, à télécharger sur /debug/profiles/{id}.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = Sampler(loop_thread=threading.get_ident())
+        created_at = time.time()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            self._busy.release()
+            query = scope.get("query_string", b"").decode("latin-1")
+            name = f"{scope['method']} {scope['path']}" + (f"?{query}" if query else "")
+            meta = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": query,
+                "status": status,
+                "created_at": created_at,
+                "duration_s": round(sampler.stopped - sampler.started, 6),
+                "samples": sum(len(s) for s in sampler.samples.values()),
+                "interval_ms": sampler.interval * 1000,
+                "truncated": sampler.truncated,
+                "download_url": f"/debug/profiles/{profile_id}",
+            }
+            try:
+                await run_in_threadpool(save, profile_id, sampler.speedscope(name), meta)
+            except Exception as e:
+                logger.warning("Profil %s non enregistré : %s", profile_id, e)
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from backend.services import metrics
+from backend.services.data_store import DEFAULT_SESSION, DataStore
+from backend.services.profile import DatasetProfile, get_profile
+
+
+def average_ranks_sorted(sorted_values: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    Rangs moyens (base 1) d'un tableau déjà trié et terme de correction des ex-aequo
+    Σ(t³ − t). Coût O(n) : aucun tri n'est refait.
+    """
+    n = len(sorted_values)
+    if n == 0:
+        return np.empty(0, dtype=float), 0.0
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    if len(starts) == n:
+        return np.arange(1, n + 1, dtype=float), 0.0
+    counts = np.diff(np.r_[starts, n])
+    group_ranks = starts + (counts + 1) / 2.0
+    tie_term = float((counts.astype(float) ** 3 - counts).sum())
+    return np.repeat(group_ranks, counts), tie_term
+
+
+@dataclass
+class ColumnRanks:
+    """Ordre de tri, valeurs triées et rangs moyens d'une colonne numérique."""
+    order: np.ndarray   # positions des valeurs non manquantes, triées par valeur
+    values: np.ndarray  # valeurs triées (float64)
+    ranks: np.ndarray   # rang moyen de chaque ligne (NaN si valeur manquante)
+    tie_term: float
+
+    @property
+    def n(self) -> int:
+        return len(self.order)
+
+    @property
+    def complete(self) -> bool:
+        return self.n == len(self.ranks)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.order.nbytes + self.values.nbytes + self.ranks.nbytes)
+
+
+@dataclass
+class PooledRanks:
+    """Échantillon regroupé (plusieurs colonnes ou groupes), trié et classé."""
+    values: np.ndarray  # valeurs triées
+    labels: np.ndarray  # indice d'échantillon de chaque valeur triée
+    ranks: np.ndarray   # rangs moyens, dans l'ordre trié
+    tie_term: float
+    sizes: np.ndarray   # effectif de chaque échantillon
+
+    @property
+    def n(self) -> int:
+        return len(self.values)
+
+    def rank_sums(self) -> np.ndarray:
+        return np.bincount(self.labels, weights=self.ranks, minlength=len(self.sizes))
+
+    def sample(self, i: int) -> np.ndarray:
+        """Valeurs (triées) de l'échantillon i."""
+        return self.values[self.labels == i]
+
+
+def pool_sorted(samples: list[np.ndarray]) -> PooledRanks:
+    """
+    Regroupe des échantillons déjà triés. Le tri stable (timsort) détecte les suites
+    déjà ordonnées : la fusion coûte O(n) au lieu d'un tri complet.
+    """
+    values = np.concatenate(samples)
+    labels = np.repeat(np.arange(len(samples)), [len(s) for s in samples])
+    order = np.argsort(values, kind="stable")
+    values = values[order]
+    labels = labels[order]
+    ranks, tie_term = average_ranks_sorted(values)
+    return PooledRanks(values, labels, ranks, tie_term, np.array([len(s) for s in samples]))
+
+
+class RankCache:
+    """
+    Cache des rangs par colonne numérique d'un jeu de données, rempli à la demande.
+    Il est stocké avec le jeu dans le DataStore (donc évincé avec lui) et sa taille
+    est comptée dans le budget mémoire.
+    """
+
+    def __init__(self, profile: DatasetProfile, session_id: str = DEFAULT_SESSION):
+        self._profile = profile
+        self._session_id = session_id
+        self._columns: dict[str, ColumnRanks] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self._columns.values())
+
+    def column(self, name: str) -> ColumnRanks:
+        cached = self._columns.get(name)
+        if cached is not None:
+            return cached
+        numeric = self._profile[name].numeric
+        if numeric is None:
+            raise ValueError(f"La colonne '{name}' n'est pas numérique.")
+
+        with metrics.span("rank"):
+            arr = numeric.to_numpy(dtype=float)
+            valid = np.flatnonzero(~np.isnan(arr))
+            order = valid[np.argsort(arr[valid])]
+            values = arr[order]
+            sorted_ranks, tie_term = average_ranks_sorted(values)
+            ranks = np.full(len(arr), np.nan)
+            ranks[order] = sorted_ranks
+            entry = ColumnRanks(order, values, ranks, tie_term)
+
+        with self._lock:
+            self._columns.setdefault(name, entry)
+        DataStore.refresh_size(self._session_id)
+        return self._columns[name]
+
+    def _ranks_on(self, name: str, mask: np.ndarray) -> np.ndarray:
+        """Rangs de la colonne restreinte aux lignes de `mask`, recalculés en O(n) depuis l'ordre en cache."""
+        col = self.column(name)
+        keep = mask[col.order]
+        sub_ranks, _ = average_ranks_sorted(col.values[keep])
+        ranks = np.empty(len(mask))
+        ranks[col.order[keep]] = sub_ranks
+        return ranks[mask]
+
+    def paired_ranks(self, a: str, b: str) -> tuple[np.ndarray, np.ndarray]:
+        """Rangs des deux colonnes sur les lignes où les deux sont renseignées."""
+        ca, cb = self.column(a), self.column(b)
+        if ca.complete and cb.complete:
+            return ca.ranks, cb.ranks
+        mask = ~np.isnan(ca.ranks) & ~np.isnan(cb.ranks)
+        return self._ranks_on(a, mask), self._ranks_on(b, mask)
+
+    def paired_orders(self, a: str, b: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Ordres de tri et valeurs triées des deux colonnes, restreints aux lignes où les deux
+        sont renseignées (positions renumérotées de 0 à m − 1) : (ordre_a, valeurs_a, ordre_b, valeurs_b).
+        """
+        ca, cb = self.column(a), self.column(b)
+        if ca.complete and cb.complete:
+            return ca.order, ca.values, cb.order, cb.values
+        mask = ~np.isnan(ca.ranks) & ~np.isnan(cb.ranks)
+        position = np.cumsum(mask) - 1
+        keep_a, keep_b = mask[ca.order], mask[cb.order]
+        return position[ca.order[keep_a]], ca.values[keep_a], position[cb.order[keep_b]], cb.values[keep_b]
+
+    def pooled(self, names: list[str]) -> PooledRanks:
+        """Les colonnes traitées comme des échantillons indépendants."""
+        return pool_sorted([self.column(n).values for n in names])
+
+    def grouped(self, name: str, codes: np.ndarray, n_groups: int) -> PooledRanks:
+        """
+        Valeurs de la colonne réparties selon `codes` (code de groupe par ligne, -1 = exclu).
+        Les valeurs restent triées : seuls les rangs du sous-ensemble sont recalculés.
+        """
+        col = self.column(name)
+        labels = codes[col.order]
+        keep = labels >= 0
+        values = col.values[keep]
+        labels = labels[keep]
+        ranks, tie_term = average_ranks_sorted(values)
+        sizes = np.bincount(labels, minlength=n_groups)
+        return PooledRanks(values, labels, ranks, tie_term, sizes)
+
+
+def get_rank_cache(session_id: str = DEFAULT_SESSION) -> Optional[RankCache]:
+    """Cache de rangs du jeu de la session (créé vide, rempli colonne par colonne)."""
+    profile = get_profile(session_id)
+    if profile is None:
+        return None
+    return DataStore.get_extra("ranks", session_id, factory=lambda df: RankCache(profile, session_id))
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Nombre de processus kaleido (Chromium) démarrés et gardés chauds
+KALEIDO_RENDERERS = max(1, int(os.getenv("KALEIDO_RENDERERS", "2")))
+# Rendus en attente au-delà desquels les nouvelles demandes sont refusées (503)
+KALEIDO_MAX_QUEUE = max(0, int(os.getenv("KALEIDO_MAX_QUEUE", "32")))
+# Délai maximal d'un rendu, attente comprise (secondes)
+KALEIDO_TIMEOUT_S = float(os.getenv("KALEIDO_TIMEOUT_S", "20"))
+# Durées conservées pour les percentiles de latence
+LATENCY_WINDOW = 1000
+
+
+class RendererBusy(Exception):
+    """File de rendu pleine : la demande est refusée sans attendre."""
+
+
+class RenderTimeout(Exception):
+    """Rendu non terminé dans le délai imparti."""
+
+
+def _plotlyjs_path() -> Optional[str]:
+    """plotly.js embarqué avec plotly (comme `fig.to_image`), pour ne pas dépendre d'un CDN."""
+    import plotly
+    path = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+    return path if os.path.exists(path) else None
+
+
+def _descendants(pid: int) -> list[int]:
+    """Descendants d'un processus, lus dans /proc (liste vide hors Linux)."""
+    children: dict[int, list[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                # Le nom du processus (entre parenthèses) peut contenir des espaces
+                ppid = int(f.read().rsplit(b")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+class RendererPool:
+    """
+    Pool de processus kaleido. Chaque thread de rendu possède son propre scope
+    (donc son propre processus Chromium) : les rendus ne se sérialisent plus sur
+    un processus unique. Les demandes au-delà de `renderers + max_queue` sont
+    refusées ; un rendu qui dépasse `timeout` est interrompu en tuant son
+    processus, relancé au rendu suivant.
+    """
+
+    def __init__(self, renderers: int = KALEIDO_RENDERERS, max_queue: int = KALEIDO_MAX_QUEUE,
+                 timeout: float = KALEIDO_TIMEOUT_S):
+        self.renderers = renderers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=renderers, thread_name_prefix="kaleido")
+        self._local = threading.local()
+        self._scopes: list = []
+        self._lock = threading.Lock()
+        self._pending = 0      # demandes acceptées et non terminées (en file + en cours)
+        self._running = 0
+        self._max_depth = 0
+        self._counters = {"rendered": 0, "errors": 0, "timeouts": 0, "rejected": 0, "restarts": 0}
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self._waits: deque = deque(maxlen=LATENCY_WINDOW)
+        self._warm = False
+
+    # --- Processus kaleido -------------------------------------------------
+
+    def _scope(self):
+        scope = getattr(self._local, "scope", None)
+        if scope is None:
+            from kaleido.scopes.plotly import PlotlyScope
+            scope = PlotlyScope(plotlyjs=_plotlyjs_path())
+            self._local.scope = scope
+            with self._lock:
+                self._scopes.append(scope)
+        return scope
+
+    def _transform(self, job: dict, figure: dict, options: dict) -> bytes:
+        job["started"] = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            if job.get("abandoned"):
+                raise RenderTimeout("Rendu abandonné avant son début.")
+            scope = self._scope()
+            job["scope"] = scope
+            return scope.transform(figure, **options)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _kill(self, scope) -> None:
+        """
+        Tue le processus et ses descendants, sans prendre le verrou du scope (tenu par le
+        rendu bloqué). Le lanceur kaleido est un script : tant que Chromium vit, il garde
+        le tube de sortie ouvert et la lecture du rendu ne se termine pas.
+        """
+        proc = getattr(scope, "_proc", None)
+        if proc is None or proc.poll() is not None:
+            return
+        for pid in _descendants(proc.pid):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        proc.kill()
+
+    # --- API -----------------------------------------------------------------
+
+    def render(self, fig, format: str = "png", width: Optional[int] = None, height: Optional[int] = None,
+               scale: Optional[float] = None, timeout: Optional[float] = None) -> bytes:
+        """Image de la figure Plotly (octets), rendue par un processus du pool."""
+        timeout = self.timeout if timeout is None else timeout
+        figure = fig.to_dict() if hasattr(fig, "to_dict") else fig
+        options = {"format": format, "width": width, "height": height, "scale": scale}
+
+        with self._lock:
+            if self._pending >= self.renderers + self.max_queue:
+                self._counters["rejected"] += 1
+                raise RendererBusy(f"File de rendu pleine ({self._pending} rendus en cours ou en attente).")
+            self._pending += 1
+            self._max_depth = max(self._max_depth, self._pending - self.renderers)
+
+        submitted = time.perf_counter()
+        job: dict = {}
+        try:
+            future = self._executor.submit(self._transform, job, figure, options)
+            try:
+                image = future.result(timeout=timeout)
+            except FutureTimeout:
+                job["abandoned"] = True
+                killed = not future.cancel() and "scope" in job
+                if killed:
+                    self._kill(job["scope"])
+                with self._lock:
+                    self._counters["timeouts"] += 1
+                    self._counters["restarts"] += killed
+                raise RenderTimeout(f"Rendu non terminé en {timeout:g} s.")
+            except Exception:
+                with self._lock:
+                    self._counters["errors"] += 1
+                raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        with self._lock:
+            self._counters["rendered"] += 1
+            self._latencies.append(time.perf_counter() - submitted)
+            self._waits.append(job["started"] - submitted)
+        return image
+
+    def warm(self) -> None:
+        """
+        Démarre tous les processus kaleido avec un rendu minimal. Une barrière garantit
+        que chaque thread du pool prend une tâche, donc démarre son propre processus.
+        """
+        import plotly.graph_objects as go
+        figure = go.Figure(go.Scatter(x=[0, 1], y=[0, 1])).to_dict()
+        barrier = threading.Barrier(self.renderers)
+
+        def _warm_one():
+            try:
+                barrier.wait(timeout=self.timeout)
+            except threading.BrokenBarrierError:
+                pass
+            self._scope().transform(figure, format="png", width=10, height=10)
+
+        started = time.perf_counter()
+        futures = [self._executor.submit(_warm_one) for _ in range(self.renderers)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning("Renderer : échec du préchauffage kaleido : %s", e)
+                return
+        self._warm = True
+        logger.info("Renderer : %d processus kaleido prêts en %.1f s", self.renderers, time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = np.array(self._latencies)
+            waits = np.array(self._waits)
+            out = {
+                "renderers": self.renderers,
+                "max_queue": self.max_queue,
+                "timeout_s": self.timeout,
+                "warm": self._warm,
+                "processes": sum(1 for s in self._scopes if s._proc is not None and s._proc.poll() is None),
+                "running": self._running,
+                "queue_depth": max(0, self._pending - self._running),
+                "max_queue_depth": self._max_depth,
+                **self._counters,
+            }
+        for name, values in (("latency_s", latencies), ("wait_s", waits)):
+            out[name] = (
+                {f"p{q}": float(np.percentile(values, q)) for q in (50, 95, 99)} if len(values) else None
+            )
+        return out
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            scopes, self._scopes = self._scopes, []
+        for scope in scopes:
+            self._kill(scope)
+
+
+_pool: Optional[RendererPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> RendererPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RendererPool()
+        return _pool
+
+
+def render(fig, format: str = "png", **options) -> bytes:
+    return get_pool().render(fig, format=format, **options)
+
+
+def renderer_stats() -> dict:
+    return get_pool().stats()
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Any, Callable, Optional
+
+from backend.services.data_store import DataStore
+from backend.services.utils.lru import LRUCache
+
+# Budget du cache de résultats (en Mo) et nombre maximal d'entrées
+RESULT_CACHE_MAX_BYTES = int(float(os.getenv("RESULT_CACHE_MB", "64")) * 1024 * 1024)
+RESULT_CACHE_MAX_ITEMS = int(os.getenv("RESULT_CACHE_ITEMS", "10000"))
+
+_MISSING = object()
+_results = LRUCache(max_bytes=RESULT_CACHE_MAX_BYTES, max_items=RESULT_CACHE_MAX_ITEMS)
+_counters = {"hits": 0, "misses": 0, "invalidated": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str, n: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += n
+
+
+def result_key(fingerprint: str, test: str, columns: list[str], options: Optional[dict] = None) -> tuple:
+    """Clé : empreinte du jeu, nom du test, colonnes (dans l'ordre) et options triées."""
+    return (fingerprint, test, tuple(columns), json.dumps(options or {}, sort_keys=True, default=str))
+
+
+def cached_result(
+    session_id: str,
+    test: str,
+    columns: list[str],
+    options: Optional[dict],
+    compute: Callable[[], Any],
+) -> Any:
+    """
+    Résultat mémorisé du test pour le contenu actuel du jeu de la session, ou calculé
+    par `compute()` puis conservé. Le résultat renvoyé est partagé : il ne doit pas être modifié.
+    """
+    fingerprint = DataStore.fingerprint(session_id)
+    if fingerprint is None:
+        return compute()
+    key = result_key(fingerprint, test, columns, options)
+    result = _results.get(key, _MISSING)
+    if result is not _MISSING:
+        _count("hits")
+        return result
+    _count("misses")
+    result = compute()
+    _results.put(key, result, len(json.dumps(result, default=str)))
+    return result
+
+
+def is_cached(session_id: str, test: str, columns: list[str], options: Optional[dict] = None) -> bool:
+    """Le résultat est-il déjà connu pour le contenu actuel du jeu (sans le lire ni compter d'accès) ?"""
+    fingerprint = DataStore.fingerprint(session_id)
+    return fingerprint is not None and result_key(fingerprint, test, columns, options) in _results
+
+
+def invalidate(fingerprint: Optional[str]) -> int:
+    """Supprime les résultats calculés sur un contenu donné. Retourne le nombre d'entrées supprimées."""
+    if fingerprint is None:
+        return 0
+    removed = 0
+    for key in [k for k in _results.keys() if k[0] == fingerprint]:
+        if _results.pop(key, _MISSING) is not _MISSING:
+            removed += 1
+    _count("invalidated", removed)
+    return removed
+
+
+def _on_dataset_replaced(session_id: str, fingerprint: Optional[str]) -> None:
+    """
+    Les résultats sont partagés par empreinte : ceux de l'ancien contenu ne sont supprimés
+    que si aucune autre session en mémoire n'a la même empreinte.
+    """
+    if fingerprint is not None and not DataStore.fingerprint_in_use(fingerprint):
+        invalidate(fingerprint)
+
+
+def clear() -> None:
+    _results.clear()
+
+
+def cache_stats() -> dict:
+    with _counters_lock:
+        counters = dict(_counters)
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        **counters,
+        "hit_ratio": counters["hits"] / lookups if lookups else None,
+        "entries": len(_results),
+        "used_bytes": _results.total_bytes,
+        "max_bytes": _results.max_bytes,
+        "max_items": _results.max_items,
+    }
+
+
+# Les résultats d'un jeu remplacé (DataStore.set_df) ou supprimé sont invalidés,
+# sauf si une autre session en mémoire a le même contenu
+DataStore.add_listener(_on_dataset_replaced)
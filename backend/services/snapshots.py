@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import tempfile
+from typing import Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+SNAPSHOT_DIR = os.getenv("DATASTORE_SNAPSHOT_DIR", os.path.join(BACKEND_DIR, "snapshots"))
+SNAPSHOTS_ENABLED = os.getenv("DATASTORE_SNAPSHOTS", "1") != "0"
+
+
+def available() -> bool:
+    if not SNAPSHOTS_ENABLED:
+        return False
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def snapshot_path(session_id: str, generation: Optional[str] = None) -> str:
+    """
+    Fichier d'une génération du jeu (`<session>.<génération>.arrow`) : chaque publication
+    écrit un nouveau fichier, jamais celui qu'un autre worker est en train de lire.
+    Sans génération : snapshot antérieur au catalogue (`<session>.arrow`).
+    """
+    name = f"{session_id}.{generation}.arrow" if generation else f"{session_id}.arrow"
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def _meta_path(session_id: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{session_id}.json")
+
+
+def _to_table(df: pd.DataFrame):
+    """
+    Conversion pandas -> Arrow en gardant les NaN des colonnes flottantes comme valeurs
+    (et non comme nulls) : au rechargement, ces colonnes restent lisibles sans copie.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df)
+    for i, name in enumerate(table.column_names):
+        if name in df.columns and pd.api.types.is_float_dtype(df[name].dtype) and df[name].hasnans:
+            table = table.set_column(i, name, pa.array(df[name].to_numpy(), from_pandas=False))
+    return table
+
+
+def save_snapshot(session_id: str, df: pd.DataFrame, generation: str) -> Optional[str]:
+    """
+    Écrit le DataFrame au format Arrow IPC non compressé (mappable en mémoire),
+    de façon atomique : fichier temporaire propre à cet appel, puis renommage.
+    """
+    if not available():
+        return None
+    import pyarrow as pa
+
+    path = snapshot_path(session_id, generation)
+    tmp = None
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix=f".{session_id}.", suffix=".tmp")
+        os.close(fd)
+        table = _to_table(df)
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+        return path
+    except Exception as e:
+        logger.warning("Snapshot impossible pour la session '%s' : %s", session_id, e)
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+
+
+def load_snapshot(session_id: str, generation: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Recharge un snapshot par memory-mapping. Les colonnes numériques sans null sont
+    exposées sans copie : seules les pages réellement lues sont chargées en mémoire.
+    None si le fichier n'existe pas (génération remplacée entre-temps) ou est illisible.
+    """
+    path = snapshot_path(session_id, generation)
+    if not available() or not os.path.exists(path):
+        return None
+    import pyarrow as pa
+
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+        # Les chaînes restent adossées à Arrow (comme après la compaction à l'ingestion)
+        string_dtype = pd.StringDtype("pyarrow")
+        return table.to_pandas(
+            split_blocks=True,
+            types_mapper={pa.string(): string_dtype, pa.large_string(): string_dtype}.get,
+        )
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning("Snapshot illisible pour la session '%s' : %s", session_id, e)
+        return None
+
+
+def legacy_target(session_id: str) -> Optional[str]:
+    """Cible d'un snapshot antérieur au catalogue (stockée à côté, en JSON)."""
+    try:
+        with open(_meta_path(session_id), encoding="utf-8") as f:
+            return json.load(f).get("target")
+    except (OSError, ValueError):
+        return None
+
+
+def adopt_legacy(session_id: str, generation: str) -> bool:
+    """
+    Renomme un snapshot antérieur au catalogue en génération, avant sa publication.
+    Le renommage est atomique : si plusieurs workers essaient, un seul réussit.
+    """
+    if not available():
+        return False
+    try:
+        os.rename(snapshot_path(session_id), snapshot_path(session_id, generation))
+    except OSError:
+        return False
+    discard(session_id, None)
+    return True
+
+
+def discard(session_id: str, generation: Optional[str]) -> None:
+    """
+    Supprime le fichier d'une génération remplacée. Les workers qui l'ont déjà mappé
+    continuent de le lire (le fichier disparaît quand le dernier mapping est fermé).
+    """
+    paths = [snapshot_path(session_id, generation)]
+    if generation is None:
+        paths.append(_meta_path(session_id))
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def delete_snapshot(session_id: str) -> None:
+    """Supprime toutes les générations de la session (et un éventuel snapshot antérieur)."""
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, f"{session_id}.*.arrow")):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    discard(session_id, None)
@@ -1,8 +1,14 @@
+from __future__ import annotations
+
 import numpy as np
 import pandas as pd
-from scipy import stats
+from typing import Optional
 import warnings
 
+from backend.services.bootstrap import bootstrap_intervals, groups_problem, spearman_problem
+from backend.services.permutation import DEFAULT_PERMUTATIONS, DEFAULT_TOLERANCE, rank_permutation_test
+from backend.services.rank_cache import PooledRanks, RankCache, pool_sorted
+
 warnings.filterwarnings('ignore')
 
 
@@ -33,85 +39,322 @@ def interpret_pvalue(p):
         return "Aucune différence statistiquement significative"
 
 
+# ===============================
+# 🟨 STATISTIQUES À PARTIR DES RANGS EN CACHE
+# ===============================
+# Mêmes formules (et mêmes p-values asymptotiques) que scipy.stats, mais calculées
+# en O(n) à partir des rangs/tris conservés dans le RankCache du jeu de données.
+
+def _spearman_from_ranks(rx: np.ndarray, ry: np.ndarray):
+    from scipy import special
+    n = len(rx)
+    if n < 3:
+        return float("nan"), float("nan"), n
+    dx = rx - rx.mean()
+    dy = ry - ry.mean()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.clip(np.dot(dx, dy) / np.sqrt(np.dot(dx, dx) * np.dot(dy, dy)), -1.0, 1.0)
+        dof = n - 2
+        t = rs * np.sqrt(np.clip(dof / ((rs + 1.0) * (1.0 - rs)), 0, None))
+    p = float(special.stdtr(dof, -abs(t)) * 2)
+    return float(rs), p, n
+
+
+def _mann_whitney_from_pooled(pooled: PooledRanks):
+    """U de l'échantillon 0 et p-value bilatérale (normale, correction de continuité et d'ex-aequo)."""
+    from scipy import stats
+    n1, n2 = (int(v) for v in pooled.sizes[:2])
+    if n1 <= 8 or n2 <= 8:
+        if pooled.tie_term == 0:
+            # Petits effectifs sans ex-aequo : scipy calcule la loi exacte
+            return stats.mannwhitneyu(pooled.sample(0), pooled.sample(1), alternative='two-sided')
+    r1 = pooled.rank_sums()[0]
+    u1 = r1 - n1 * (n1 + 1) / 2
+    u = max(u1, n1 * n2 - u1)
+    n = n1 + n2
+    s = np.sqrt(n1 * n2 / 12 * ((n + 1) - pooled.tie_term / (n * (n - 1))))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (u - n1 * n2 / 2 - 0.5) / s
+    p = float(np.clip(2 * stats.norm.sf(z), 0, 1))
+    return float(u1), p
+
+
+def _kruskal_from_pooled(pooled: PooledRanks):
+    from scipy import stats
+    n = float(pooled.n)
+    ties = 1 - pooled.tie_term / (n ** 3 - n)
+    if ties == 0:
+        raise ValueError("All numbers are identical in kruskal")
+    sums = pooled.rank_sums()
+    h = 12.0 / (n * (n + 1)) * np.sum(sums ** 2 / pooled.sizes) - 3 * (n + 1)
+    h /= ties
+    return float(h), float(stats.chi2.sf(h, len(pooled.sizes) - 1))
+
+
+def _ks_from_pooled(pooled: PooledRanks):
+    """D de Kolmogorov–Smirnov à partir de l'échantillon regroupé déjà trié."""
+    from scipy import stats
+    n1, n2 = (int(v) for v in pooled.sizes[:2])
+    if max(n1, n2) <= 10000:
+        # scipy choisit la loi exacte pour ces tailles : on lui délègue (échantillons déjà triés)
+        return stats.ks_2samp(pooled.sample(0), pooled.sample(1), alternative='two-sided')
+    # Fonctions de répartition évaluées à la fin de chaque groupe d'ex-aequo
+    last = np.r_[pooled.values[1:] != pooled.values[:-1], True]
+    cdf1 = np.cumsum(pooled.labels == 0)[last] / n1
+    cdf2 = np.cumsum(pooled.labels == 1)[last] / n2
+    d = float(np.max(np.abs(cdf1 - cdf2)))
+    m, n = sorted([float(n1), float(n2)], reverse=True)
+    p = float(np.clip(stats.kstwo.sf(d, np.round(m * n / (m + n))), 0, 1))
+    return d, p
+
+
+def _group_codes(series: pd.Series, groups) -> np.ndarray:
+    """Code de groupe par ligne (-1 si la ligne n'appartient à aucun groupe)."""
+    return pd.Categorical(series, categories=groups).codes.astype(np.int64)
+
+
+def _friedman_arrays(arrays: list[np.ndarray]):
+    """
+    Friedman vectorisé : les sommes de rangs intra-ligne sont obtenues en comparant les
+    colonnes deux à deux sur toutes les lignes à la fois, sans boucle Python par ligne
+    ni tableau n × k × k.
+    """
+    from scipy import stats
+    cols = [np.asarray(a, dtype=float) for a in arrays]
+    k, n = len(cols), len(cols[0])
+    if k < 3:
+        return stats.friedmanchisquare(*arrays)
+    # Rang de la colonne i sur une ligne = 1 + #(colonnes plus petites) + #(ex-aequo) / 2
+    rank_sums = np.full(k, float(n))
+    equal = None  # nombre d'éléments égaux (lui compris) par colonne, si des ex-aequo existent
+    for i in range(k):
+        for j in range(i + 1, k):
+            lt = np.count_nonzero(cols[i] < cols[j])
+            eq_mask = cols[i] == cols[j]
+            eq = np.count_nonzero(eq_mask)
+            rank_sums[j] += lt + eq / 2.0
+            rank_sums[i] += (n - lt - eq) + eq / 2.0
+            if eq:
+                if equal is None:
+                    equal = np.ones((k, n))
+                equal[i] += eq_mask
+                equal[j] += eq_mask
+    # Σ t(t² − 1) sur les groupes d'ex-aequo = Σ (c² − 1) sur les éléments
+    ties = 0.0 if equal is None else float((equal ** 2 - 1).sum())
+    c = 1 - ties / (k * (k * k - 1) * n)
+    ssbn = np.sum(rank_sums ** 2)
+    chisq = (12.0 / (k * n * (k + 1)) * ssbn - 3 * n * (k + 1)) / c
+    return float(chisq), float(stats.chi2.sf(chisq, k - 1))
+
+
+def _spearman_from_groups(rank_sums: np.ndarray, sizes: np.ndarray, tie_term: float):
+    """
+    Spearman entre une variable classée et un code de groupe ordonné (chaque groupe formant
+    un bloc d'ex-aequo), à partir des sommes de rangs par groupe : O(nombre de groupes).
+    """
+    sizes = sizes.astype(float)
+    n = float(sizes.sum())
+    if n < 3:
+        return float("nan"), float("nan"), int(n)
+    mean = (n + 1) / 2.0
+    code_ranks = np.cumsum(sizes) - sizes + (sizes + 1) / 2.0
+    cov = np.sum((code_ranks - mean) * (rank_sums - sizes * mean))
+    var_x = (n ** 3 - n - tie_term) / 12.0
+    var_y = np.sum(sizes * (code_ranks - mean) ** 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = float(np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0))
+    p = float(_spearman_pvalues(np.array(rs), np.array(n)))
+    return rs, p, int(n)
+
+
+def _bootstrap_from_problem(problem: dict, labels: dict, n_resamples: int, ci_method: str, confidence: float, seed: Optional[int]) -> dict:
+    """Intervalles bootstrap des statistiques du problème, renommées comme dans le résultat du test."""
+    res = bootstrap_intervals(problem, n_resamples, method=ci_method, confidence=confidence, seed=seed)
+    res["intervals"] = {label: res["intervals"][key] for key, label in labels.items()}
+    return res
+
+
+def _sorted_orders(x: np.ndarray, y: np.ndarray):
+    ox, oy = np.argsort(x, kind="stable"), np.argsort(y, kind="stable")
+    return ox, x[ox], oy, y[oy]
+
+
+def _permutation_from_pooled(pooled: PooledRanks, n_permutations: int, seed: Optional[int], tolerance: float) -> dict:
+    """P-value par permutation des rangs déjà calculés (regroupés échantillon par échantillon)."""
+    by_group = pooled.ranks[np.argsort(pooled.labels, kind="stable")]
+    return rank_permutation_test(by_group, pooled.sizes, n_permutations=n_permutations, seed=seed, tolerance=tolerance)
+
+
 # ===============================
 # 🟩 TESTS STATISTIQUES
 # ===============================
 
 
-def spearman_test(df: pd.DataFrame, col1: str, col2: str):
+def spearman_test(
+    df: pd.DataFrame,
+    col1: str,
+    col2: str,
+    ranks: Optional[RankCache] = None,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+):
+    from scipy import stats
     if col1 not in df.columns or col2 not in df.columns:
         return {"error": "Colonnes non trouvées."}
 
-    if not np.issubdtype(df[col1].dtype, np.number) or not np.issubdtype(df[col2].dtype, np.number):
+    if not _is_numeric(df[col1]) or not _is_numeric(df[col2]):
         return {"error": "Les deux variables doivent être numériques pour Spearman."}
 
-    x = _clean_array(df[col1])
-    y = _clean_array(df[col2])
+    if ranks is not None:
+        corr, p, n = _spearman_from_ranks(*ranks.paired_ranks(col1, col2))
+    else:
+        x = np.asarray(df[col1], dtype=float)
+        y = np.asarray(df[col2], dtype=float)
 
-    valid_mask = (~np.isnan(x)) & (~np.isnan(y))
-    x_clean = x[valid_mask]
-    y_clean = y[valid_mask]
+        valid_mask = (~np.isnan(x)) & (~np.isnan(y))
+        x_clean = x[valid_mask]
+        y_clean = y[valid_mask]
 
-    corr, p = stats.spearmanr(x_clean, y_clean)
+        corr, p = stats.spearmanr(x_clean, y_clean)
+        n = len(x_clean)
 
-    return {
+    res = {
         "test": "Spearman",
         "correlation": float(corr),
-        "n": int(len(x_clean)),
+        "n": int(n),
         "p_value": float(_safe_p(p)),
         "interpretation": interpret_pvalue(p),
         "suggestion": f"Testez la corrélation monotone entre {col1} et {col2}."
     }
-
-
-def mann_whitney_test(df: pd.DataFrame, qual_col: str, quant_col: str):
+    if bootstrap > 0:
+        orders = ranks.paired_orders(col1, col2) if ranks is not None else _sorted_orders(x_clean, y_clean)
+        res["bootstrap"] = _bootstrap_from_problem(spearman_problem(*orders), {"rho": "correlation"}, bootstrap, ci_method, confidence, seed)
+    return res
+
+
+def mann_whitney_test(
+    df: pd.DataFrame,
+    qual_col: str,
+    quant_col: str,
+    ranks: Optional[RankCache] = None,
+    method: str = "asymptotic",
+    n_permutations: int = DEFAULT_PERMUTATIONS,
+    seed: Optional[int] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+):
+    from scipy import stats
     groups = df[qual_col].dropna().unique()
     if len(groups) != 2:
         return {"error": "Variable qualitative doit avoir exactement 2 groupes."}
-    if not np.issubdtype(df[quant_col].dtype, np.number):
+    if not _is_numeric(df[quant_col]):
         return {"error": "Variable quantitative doit être numérique."}
 
-    x = df[df[qual_col] == groups[0]][quant_col].dropna()
-    y = df[df[qual_col] == groups[1]][quant_col].dropna()
-    if len(x) < 2 or len(y) < 2:
+    if ranks is not None:
+        pooled = ranks.grouped(quant_col, _group_codes(df[qual_col], groups), 2)
+        n1, n2 = (int(v) for v in pooled.sizes)
+    else:
+        x = df[df[qual_col] == groups[0]][quant_col].dropna()
+        y = df[df[qual_col] == groups[1]][quant_col].dropna()
+        n1, n2 = len(x), len(y)
+    if n1 < 2 or n2 < 2:
         return {"error": "Chaque groupe doit avoir au moins 2 observations."}
 
-    stat, p = stats.mannwhitneyu(x, y, alternative='two-sided')
+    if ranks is not None:
+        stat, p = _mann_whitney_from_pooled(pooled)
+    else:
+        stat, p = stats.mannwhitneyu(x, y, alternative='two-sided')
 
-    return {
+    if ranks is None and (method == "permutation" or bootstrap > 0):
+        pooled = pool_sorted([np.sort(_clean_array(x)), np.sort(_clean_array(y))])
+    permutation = None
+    if method == "permutation":
+        permutation = _permutation_from_pooled(pooled, n_permutations, seed, tolerance)
+        p = permutation["p_value"]
+
+    res = {
         "test": "Mann–Whitney U",
         "groups": list(groups),
-        "n1": int(len(x)),
-        "n2": int(len(y)),
+        "n1": int(n1),
+        "n2": int(n2),
         "statistic": float(stat),
         "p_value": float(_safe_p(p)),
+        "method": method,
         "interpretation": interpret_pvalue(p),
         "suggestion": f"Variable qualitative: {qual_col}, Variable quantitative: {quant_col}"
     }
-
-
-def kruskal_wallis_test(df: pd.DataFrame, qual_col: str, quant_col: str):
+    if permutation is not None:
+        res["permutation"] = permutation
+    if bootstrap > 0:
+        res["bootstrap"] = _bootstrap_from_problem(
+            groups_problem(pooled, "two_sample"), {"u": "statistic", "cles": "cles"}, bootstrap, ci_method, confidence, seed
+        )
+    return res
+
+
+def kruskal_wallis_test(
+    df: pd.DataFrame,
+    qual_col: str,
+    quant_col: str,
+    ranks: Optional[RankCache] = None,
+    method: str = "asymptotic",
+    n_permutations: int = DEFAULT_PERMUTATIONS,
+    seed: Optional[int] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+):
+    from scipy import stats
     groups_list = df[qual_col].dropna().unique()
     if len(groups_list) < 3:
         return {"error": "Variable qualitative doit avoir au moins 3 groupes."}
-    if not np.issubdtype(df[quant_col].dtype, np.number):
+    if not _is_numeric(df[quant_col]):
         return {"error": "Variable quantitative doit être numérique."}
 
-    samples = [df[df[qual_col] == g][quant_col].dropna() for g in groups_list]
-    for i, s in enumerate(samples):
-        if len(s) < 2:
+    if ranks is not None:
+        pooled = ranks.grouped(quant_col, _group_codes(df[qual_col], groups_list), len(groups_list))
+        sizes = [int(v) for v in pooled.sizes]
+    else:
+        samples = [df[df[qual_col] == g][quant_col].dropna() for g in groups_list]
+        sizes = [len(s) for s in samples]
+    for i, size in enumerate(sizes):
+        if size < 2:
             return {"error": f"Groupe {groups_list[i]} a moins de 2 observations."}
 
-    stat, p = stats.kruskal(*samples)
-    return {
+    if ranks is not None:
+        stat, p = _kruskal_from_pooled(pooled)
+    else:
+        stat, p = stats.kruskal(*samples)
+
+    if ranks is None and (method == "permutation" or bootstrap > 0):
+        pooled = pool_sorted([np.sort(_clean_array(s)) for s in samples])
+    permutation = None
+    if method == "permutation":
+        permutation = _permutation_from_pooled(pooled, n_permutations, seed, tolerance)
+        p = permutation["p_value"]
+
+    res = {
         "test": "Kruskal–Wallis H",
         "groups": list(groups_list),
-        "n_per_group": [int(len(s)) for s in samples],
+        "n_per_group": [int(size) for size in sizes],
         "statistic": float(stat),
         "p_value": float(_safe_p(p)),
+        "method": method,
         "interpretation": interpret_pvalue(p),
         "suggestion": f"Variable qualitative: {qual_col} (≥3 groupes), Variable quantitative: {quant_col}"
     }
+    if permutation is not None:
+        res["permutation"] = permutation
+    if bootstrap > 0:
+        res["bootstrap"] = _bootstrap_from_problem(
+            groups_problem(pooled, "kruskal"), {"h": "statistic"}, bootstrap, ci_method, confidence, seed
+        )
+    return res
 
 
 def friedman_test(df: pd.DataFrame, group_cols: list[str]):
@@ -124,7 +367,7 @@ def friedman_test(df: pd.DataFrame, group_cols: list[str]):
         return {"error": "Taille minimale des observations pour Friedman = 3."}
 
     arrays_equal = [a[:min_len] for a in arrays]
-    stat, p = stats.friedmanchisquare(*arrays_equal)
+    stat, p = _friedman_arrays(arrays_equal)
     return {
         "test": "Friedman",
         "k": len(arrays_equal),
@@ -136,26 +379,67 @@ def friedman_test(df: pd.DataFrame, group_cols: list[str]):
     }
 
 
-def ks_two_samples_test(df: pd.DataFrame, col1: str, col2: str):
-    x = _clean_array(df[col1].dropna())
-    y = _clean_array(df[col2].dropna())
-    if len(x) < 2 or len(y) < 2:
+def ks_two_samples_test(
+    df: pd.DataFrame,
+    col1: str,
+    col2: str,
+    ranks: Optional[RankCache] = None,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+):
+    from scipy import stats
+    if ranks is not None:
+        pooled = ranks.pooled([col1, col2])
+        n1, n2 = (int(v) for v in pooled.sizes)
+    else:
+        x = _clean_array(df[col1].dropna())
+        y = _clean_array(df[col2].dropna())
+        n1, n2 = len(x), len(y)
+    if n1 < 2 or n2 < 2:
         return {"error": "Chaque échantillon doit avoir au moins 2 observations."}
 
-    stat, p = stats.ks_2samp(x, y, alternative='two-sided')
-    return {
+    if ranks is not None:
+        stat, p = _ks_from_pooled(pooled)
+    else:
+        stat, p = stats.ks_2samp(x, y, alternative='two-sided')
+    res = {
         "test": "Kolmogorov–Smirnov",
-        "n1": int(len(x)),
-        "n2": int(len(y)),
+        "n1": int(n1),
+        "n2": int(n2),
         "statistic": float(stat),
         "p_value": float(_safe_p(p)),
         "interpretation": interpret_pvalue(p),
         "suggestion": f"Comparaison des distributions entre {col1} et {col2}"
     }
+    if bootstrap > 0:
+        if ranks is None:
+            pooled = pool_sorted([np.sort(x), np.sort(y)])
+        res["bootstrap"] = _bootstrap_from_problem(
+            groups_problem(pooled, "two_sample"), {"d": "statistic"}, bootstrap, ci_method, confidence, seed
+        )
+    return res
+
+
+def _is_numeric(series: pd.Series) -> bool:
+    """
+    Nombres (hors booléens). `np.issubdtype` lève une erreur sur les types compactés
+    (`category`, chaînes pyarrow) : on passe par les tests de types de pandas.
+    """
+    dtype = series.dtype
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _is_categorical(series: pd.Series) -> bool:
+    """Texte (objet ou chaînes pyarrow) ou catégorie."""
+    dtype = series.dtype
+    return dtype in [object, "category"] or pd.api.types.is_string_dtype(dtype)
 
 
 def chi2_test(df: pd.DataFrame, col1: str, col2: str):
-    if df[col1].dtype not in [object, "category"] or df[col2].dtype not in [object, "category"]:
+    from scipy import stats
+    if not _is_categorical(df[col1]) or not _is_categorical(df[col2]):
         return {"error": "Chi² nécessite 2 variables catégorielles."}
 
     contingency = pd.crosstab(df[col1], df[col2])
@@ -177,6 +461,7 @@ def chi2_test(df: pd.DataFrame, col1: str, col2: str):
 # === Compatibilité avec les anciens noms importés par les routes ===
 def spearman_corr(df_or_x, col1=None, col2=None):
     # Original routes passed series; maintain compatibility: allow (series_x, series_y) or (df, col1, col2)
+    from scipy import stats
     if isinstance(df_or_x, pd.DataFrame):
         return spearman_test(df_or_x, col1, col2)
     else:
@@ -189,6 +474,7 @@ def spearman_corr(df_or_x, col1=None, col2=None):
 
 def mann_whitney(df_or_x, col2=None):
     # If first arg is DataFrame, call new function; otherwise assume two arrays
+    from scipy import stats
     if isinstance(df_or_x, pd.DataFrame):
         return mann_whitney_test(df_or_x, col2, None)
     else:
@@ -200,6 +486,7 @@ def mann_whitney(df_or_x, col2=None):
 
 def kruskal_test(groups):
     # if groups is (df, col1, col2) this wrapper won't be used; keep simple wrapper for previous interface
+    from scipy import stats
     try:
         groups_clean = [np.array(g[~np.isnan(g)]) for g in groups if len(g) > 0]
         stat, p = stats.kruskal(*groups_clean)
@@ -209,7 +496,240 @@ def kruskal_test(groups):
 
 
 def ks_two_samples(x, y):
+    from scipy import stats
     x = _clean_array(x)
     y = _clean_array(y)
     stat, p = stats.ks_2samp(x, y, alternative='two-sided')
     return {"test": "kolmogorov_smirnov", "statistic": float(stat), "p_value": float(_safe_p(p)), "n1": int(len(x)), "n2": int(len(y))}
+
+
+def friedman(arrays):
+    """Friedman sur des tableaux appariés de même longueur (interface utilisée par les routes)."""
+    stat, p = _friedman_arrays([_clean_array(a) for a in arrays])
+    return {"test": "friedman", "statistic": float(stat), "p_value": float(_safe_p(p)), "k": len(arrays), "n": int(len(arrays[0]))}
+
+
+# === Versions adossées au cache de rangs, pour des colonnes traitées comme échantillons ===
+def spearman_columns(
+    ranks: RankCache,
+    col1: str,
+    col2: str,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+):
+    corr, p, n = _spearman_from_ranks(*ranks.paired_ranks(col1, col2))
+    res = {"test": "spearman", "correlation": float(corr), "p_value": float(_safe_p(p)), "n": int(n)}
+    if bootstrap > 0:
+        problem = spearman_problem(*ranks.paired_orders(col1, col2))
+        res["bootstrap"] = _bootstrap_from_problem(problem, {"rho": "correlation"}, bootstrap, ci_method, confidence, seed)
+    return res
+
+
+def mann_whitney_columns(
+    ranks: RankCache,
+    col1: str,
+    col2: str,
+    method: str = "asymptotic",
+    n_permutations: int = DEFAULT_PERMUTATIONS,
+    seed: Optional[int] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+):
+    pooled = ranks.pooled([col1, col2])
+    stat, p = _mann_whitney_from_pooled(pooled)
+    res = {"test": "mann_whitney", "statistic": float(stat), "p_value": float(_safe_p(p)), "n1": int(pooled.sizes[0]), "n2": int(pooled.sizes[1]), "method": method}
+    if method == "permutation":
+        res["permutation"] = _permutation_from_pooled(pooled, n_permutations, seed, tolerance)
+        res["p_value"] = float(_safe_p(res["permutation"]["p_value"]))
+    if bootstrap > 0:
+        res["bootstrap"] = _bootstrap_from_problem(
+            groups_problem(pooled, "two_sample"), {"u": "statistic", "cles": "cles"}, bootstrap, ci_method, confidence, seed
+        )
+    return res
+
+
+def kruskal_columns(
+    ranks: RankCache,
+    cols: list[str],
+    method: str = "asymptotic",
+    n_permutations: int = DEFAULT_PERMUTATIONS,
+    seed: Optional[int] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+):
+    try:
+        pooled = ranks.pooled(cols)
+        stat, p = _kruskal_from_pooled(pooled)
+        res = {"test": "kruskal_wallis", "statistic": float(stat), "p_value": float(_safe_p(p)), "method": method}
+        if method == "permutation":
+            res["permutation"] = _permutation_from_pooled(pooled, n_permutations, seed, tolerance)
+            res["p_value"] = float(_safe_p(res["permutation"]["p_value"]))
+        if bootstrap > 0:
+            res["bootstrap"] = _bootstrap_from_problem(
+                groups_problem(pooled, "kruskal"), {"h": "statistic"}, bootstrap, ci_method, confidence, seed
+            )
+        return res
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def ks_columns(
+    ranks: RankCache,
+    col1: str,
+    col2: str,
+    bootstrap: int = 0,
+    ci_method: str = "percentile",
+    confidence: float = 0.95,
+    seed: Optional[int] = None,
+):
+    pooled = ranks.pooled([col1, col2])
+    stat, p = _ks_from_pooled(pooled)
+    res = {"test": "kolmogorov_smirnov", "statistic": float(stat), "p_value": float(_safe_p(p)), "n1": int(pooled.sizes[0]), "n2": int(pooled.sizes[1])}
+    if bootstrap > 0:
+        res["bootstrap"] = _bootstrap_from_problem(
+            groups_problem(pooled, "two_sample"), {"d": "statistic"}, bootstrap, ci_method, confidence, seed
+        )
+    return res
+
+
+def _spearman_pvalues(rho: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """P-values bilatérales de Spearman (loi de Student, comme scipy.stats.spearmanr), vectorisées."""
+    from scipy import special
+    dof = n - 2.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = rho * np.sqrt((dof / ((rho + 1.0) * (1.0 - rho))).clip(0))
+        p = special.stdtr(dof, -np.abs(t)) * 2
+    return np.where(n < 3, np.nan, p)
+
+
+def _standardized_ranks(ranks: RankCache, cols: list[str]) -> np.ndarray:
+    """Rangs centrés et normés (colonnes sans valeur manquante) : corrélation = produit scalaire."""
+    block = np.empty((len(ranks.column(cols[0]).ranks), len(cols)))
+    for j, name in enumerate(cols):
+        r = ranks.column(name).ranks
+        d = r - r.mean()
+        norm = np.sqrt(np.dot(d, d))
+        block[:, j] = d / norm if norm > 0 else np.nan
+    return block
+
+
+def _masked_ranks(ranks: RankCache, cols: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Rangs centrés (0 si valeur manquante), leurs carrés et le masque des valeurs renseignées."""
+    n_rows = len(ranks.column(cols[0]).ranks)
+    values, mask = np.empty((n_rows, len(cols))), np.empty((n_rows, len(cols)))
+    for j, name in enumerate(cols):
+        col = ranks.column(name)
+        present = ~np.isnan(col.ranks)
+        mask[:, j] = present
+        values[:, j] = np.where(present, col.ranks - (col.n + 1) / 2.0, 0.0)
+    return values, values * values, mask
+
+
+def _masked_correlations(a: tuple, b: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Corrélations de Pearson des rangs sur les lignes renseignées des deux colonnes de chaque
+    paire : effectifs Mᵀ·M, puis sommes, sommes des carrés et produits sous le masque de la paire.
+    """
+    ra, qa, ma = a
+    rb, qb, mb = b
+    n = ma.T @ mb
+    sx, sy = ra.T @ mb, ma.T @ rb
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = ra.T @ rb - sx * sy / n
+        sxx, syy = qa.T @ mb, ma.T @ qb
+        vx, vy = sxx - sx * sx / n, syy - sy * sy / n
+        rho = np.clip(cov / np.sqrt(vx * vy), -1.0, 1.0)
+    # Colonne constante sur les lignes de la paire : variance nulle aux arrondis près
+    constant = (vx <= 1e-12 * sxx) | (vy <= 1e-12 * syy)
+    return np.where((n >= 3) & ~constant, rho, np.nan), np.rint(n).astype(np.int64)
+
+
+def spearman_matrix(ranks: RankCache, columns: list[str], max_memory_mb: float = 256, exact: bool = True):
+    """
+    Matrice de corrélation de Spearman (et des p-values) entre toutes les paires de colonnes.
+    Chaque colonne est classée une seule fois (cache de rangs), puis les corrélations sont
+    calculées par produits matriciels, par tuiles de colonnes dont la taille respecte
+    `max_memory_mb`. Paires complètes : résultat identique à la route /stats/spearman.
+    Paires avec valeurs manquantes : rangs recalculés sur les lignes communes à la paire,
+    résultat identique à /stats/spearman.
+    `exact=False` (sur demande) : ces paires sont calculées par produits sous le masque de
+    la paire, avec les rangs de chaque colonne entière. Plus rapide, mais approché (léger
+    écart avec /stats/spearman) : la réponse l'indique par `"approximate": true`.
+    """
+    k = len(columns)
+    col_ranks = [ranks.column(c) for c in columns]
+    n_rows = len(col_ranks[0].ranks) if k else 0
+    rho = np.full((k, k), np.nan)
+    n_obs = np.zeros((k, k), dtype=np.int64)
+
+    complete = [i for i, c in enumerate(col_ranks) if c.complete]
+    incomplete = [i for i, c in enumerate(col_ranks) if not c.complete]
+    # Deux tuiles (n lignes × t colonnes, float64) en mémoire à la fois ; trois tableaux par
+    # tuile (rangs, carrés, masque) si des valeurs manquent
+    per_column = 2 * 8 * max(n_rows, 1) * (3 if incomplete and not exact else 1)
+    tile = max(1, int(max_memory_mb * 1024 * 1024 // per_column))
+
+    def fill(idx_a, idx_b, block, n):
+        rho[np.ix_(idx_a, idx_b)] = block
+        rho[np.ix_(idx_b, idx_a)] = block.T
+        n_obs[np.ix_(idx_a, idx_b)] = n
+        n_obs[np.ix_(idx_b, idx_a)] = np.transpose(n)
+
+    for a in range(0, len(complete), tile):
+        idx_a = complete[a:a + tile]
+        za = _standardized_ranks(ranks, [columns[i] for i in idx_a])
+        for b in range(a, len(complete), tile):
+            idx_b = complete[b:b + tile]
+            zb = za if b == a else _standardized_ranks(ranks, [columns[i] for i in idx_b])
+            block = np.clip(za.T @ zb, -1.0, 1.0)
+            if b == a:
+                # Diagonale exacte (évite 0.9999999999999994 dû aux arrondis)
+                np.fill_diagonal(block, np.where(np.isnan(np.diag(block)), np.nan, 1.0))
+            fill(idx_a, idx_b, block, n_rows)
+
+    if exact:
+        for i in incomplete:
+            for j in range(k):
+                if j in incomplete and j < i:
+                    continue
+                r, _, n = _spearman_from_ranks(*ranks.paired_ranks(columns[i], columns[j]))
+                rho[i, j] = rho[j, i] = r
+                n_obs[i, j] = n_obs[j, i] = n
+    else:
+        # Colonnes incomplètes contre toutes les colonnes
+        order = incomplete + complete
+        for a in range(0, len(incomplete), tile):
+            idx_a = incomplete[a:a + tile]
+            ma = _masked_ranks(ranks, [columns[i] for i in idx_a])
+            for b in range(a, len(order), tile):
+                idx_b = order[b:b + tile]
+                mb = ma if idx_b == idx_a else _masked_ranks(ranks, [columns[i] for i in idx_b])
+                block, n = _masked_correlations(ma, mb)
+                if b == a:
+                    # Les colonnes de la tuile a sont en tête de la tuile b
+                    diagonal = np.arange(len(idx_a))
+                    block[diagonal, diagonal] = np.where(np.isnan(block[diagonal, diagonal]), np.nan, 1.0)
+                fill(idx_a, idx_b, block, n)
+
+    p = np.maximum(_spearman_pvalues(rho, n_obs.astype(float)), 1e-16)
+
+    def _json(m):
+        return [[None if np.isnan(v) else float(v) for v in row] for row in m]
+
+    return {
+        "test": "spearman_matrix",
+        "columns": list(columns),
+        "correlation": _json(rho),
+        "p_value": _json(p),
+        "n": n_obs.tolist(),
+        "exact": exact,
+        # Corrélations des paires incomplètes approchées (rangs non recalculés sur la paire)
+        "approximate": not exact and bool(incomplete),
+        "tile_size": tile,
+    }
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import os
+import pickle
+import re
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from backend.services.data_store import DataStore
+from backend.services.jobs import Job, JobContext, jobs
+from backend.services.model_registry import registry
+from backend.services.profile import DatasetProfile, get_profile
+
+TRAINING_ALGORITHMS = ("logistic_regression", "random_forest")
+# Cœurs utilisés par la forêt aléatoire (1 : la tâche n'affame pas les requêtes)
+TRAINING_N_JOBS = int(os.getenv("TRAINING_N_JOBS", "1"))
+# Au-delà, une variable catégorielle (identifiant...) n'est pas utilisée
+MAX_CATEGORY_LEVELS = 50
+# Arbres ajoutés entre deux points de contrôle (avancement, annulation)
+FOREST_STEP = 10
+MISSING = "__missing__"
+MODEL_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def _as_text(X) -> np.ndarray:
+    """Catégories en texte, manquants remplacés par une modalité dédiée (fonction picklable du pipeline)."""
+    X = pd.DataFrame(X)
+    return np.where(X.isna(), MISSING, X.astype(str)).astype(object)
+
+
+def select_features(profile: DatasetProfile, target: str) -> tuple[list[str], list[str], list[str]]:
+    """(numériques, catégorielles, ignorées) : comme dans l'analyse globale, hors cible."""
+    numeric, categorical, ignored = [], [], []
+    for name, col in profile.columns.items():
+        if name == target:
+            continue
+        if col.is_numeric:
+            numeric.append(name)
+        elif col.distinct_count <= MAX_CATEGORY_LEVELS:
+            categorical.append(name)
+        else:
+            ignored.append(name)
+    return numeric, categorical, ignored
+
+
+def build_pipeline(algorithm: str, numeric: list[str], categorical: list[str], n_estimators: int = 100):
+    """Prétraitement (imputation, mise à l'échelle, encodage) + estimateur, dans un seul Pipeline."""
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.impute import SimpleImputer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler
+
+    if algorithm == "logistic_regression":
+        num = Pipeline([("impute", SimpleImputer(strategy="median")), ("scale", StandardScaler())])
+        cat = Pipeline([("text", FunctionTransformer(_as_text)), ("encode", OneHotEncoder(handle_unknown="ignore"))])
+        model = LogisticRegression(max_iter=1000)
+    elif algorithm == "random_forest":
+        num = SimpleImputer(strategy="median")
+        cat = Pipeline([
+            ("text", FunctionTransformer(_as_text)),
+            ("encode", OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1)),
+        ])
+        # warm_start : les arbres sont ajoutés par paquets entre deux points de contrôle
+        model = RandomForestClassifier(
+            n_estimators=n_estimators, random_state=42, n_jobs=TRAINING_N_JOBS, warm_start=True,
+        )
+    else:
+        raise ValueError(f"Algorithme inconnu : {algorithm}. Disponibles : {TRAINING_ALGORITHMS}.")
+
+    transformers = []
+    if numeric:
+        transformers.append(("num", num, numeric))
+    if categorical:
+        transformers.append(("cat", cat, categorical))
+    return ColumnTransformer(transformers), model
+
+
+def _save(pipeline, name: str) -> str:
+    """Écrit l'artefact sous un nom temporaire puis le renomme : le registre ne lit jamais un fichier partiel."""
+    os.makedirs(registry.directory, exist_ok=True)
+    path = os.path.join(registry.directory, f"{name}.pkl")
+    fd, tmp = tempfile.mkstemp(dir=registry.directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(pipeline, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except Exception:
+        os.remove(tmp)
+        raise
+    return path
+
+
+def train_model(
+    ctx: JobContext,
+    df: pd.DataFrame,
+    profile: DatasetProfile,
+    target: str,
+    algorithm: str,
+    name: str,
+    test_size: float = 0.25,
+    n_estimators: int = 100,
+) -> dict:
+    """
+    Ajuste le modèle sur le jeu et sa cible (25 % gardés pour l'évaluation, comme
+    `analyse_globale`), enregistre le pipeline complet et le publie dans le registre.
+    """
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    from sklearn.model_selection import train_test_split
+    from sklearn.pipeline import Pipeline
+
+    started = time.perf_counter()
+    ctx.progress(0.02, "Préparation des données")
+    data = df[df[target].notna()]
+    y = data[target].to_numpy()
+    classes = np.sort(pd.unique(y))
+    if len(classes) != 2:
+        raise ValueError(f"La cible '{target}' doit avoir exactement deux modalités ({len(classes)} trouvées).")
+    numeric, categorical, ignored = select_features(profile, target)
+    if not numeric and not categorical:
+        raise ValueError("Aucune variable explicative utilisable.")
+    X = data[numeric + categorical]
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42, stratify=y)
+
+    ctx.progress(0.1, "Prétraitement")
+    preprocess, model = build_pipeline(algorithm, numeric, categorical, n_estimators)
+    Xt_train = preprocess.fit_transform(X_train)
+
+    if algorithm == "random_forest":
+        for trees in range(FOREST_STEP, n_estimators + FOREST_STEP, FOREST_STEP):
+            model.n_estimators = min(trees, n_estimators)
+            model.fit(Xt_train, y_train)
+            ctx.progress(0.1 + 0.8 * model.n_estimators / n_estimators, f"{model.n_estimators}/{n_estimators} arbres")
+    else:
+        ctx.progress(0.2, "Ajustement")
+        model.fit(Xt_train, y_train)
+    ctx.progress(0.92, "Évaluation")
+
+    pipeline = Pipeline([("preprocess", preprocess), ("model", model)])
+    proba = pipeline.predict_proba(X_test)[:, 1]
+    metrics = {
+        "accuracy": float(accuracy_score(y_test, classes[(proba >= 0.5).astype(int)])),
+        "roc_auc": float(roc_auc_score(y_test == classes[1], proba)),
+    }
+    info = {
+        "algorithm": algorithm,
+        "target": target,
+        "classes": [c.item() if isinstance(c, np.generic) else c for c in classes],
+        "positive_class": classes[1].item() if isinstance(classes[1], np.generic) else classes[1],
+        "numeric_features": numeric,
+        "categorical_features": categorical,
+        "ignored_features": ignored,
+        "n_train": int(len(X_train)),
+        "n_test": int(len(X_test)),
+        "metrics": metrics,
+        "fit_seconds": round(time.perf_counter() - started, 3),
+        "trained_at": time.time(),
+    }
+    # Métadonnées sauvegardées avec le pipeline (exposées par /prediction/models)
+    pipeline.training_info_ = info
+
+    ctx.progress(0.96, "Enregistrement")
+    path = _save(pipeline, name)
+    registry.refresh()
+    entry = registry.get(name)
+    return {**info, "model": name, "version": entry.version if entry else None, "path": path}
+
+
+def submit_training(
+    session_id: str,
+    target: Optional[str] = None,
+    algorithm: str = "random_forest",
+    name: Optional[str] = None,
+    n_estimators: int = 100,
+) -> Job:
+    """
+    Lance l'entraînement en tâche de fond sur le jeu de la session et sa cible (celle
+    choisie par /data/set-target si `target` est omis). Vérifie les paramètres avant.
+    """
+    df = DataStore.get_df(session_id)
+    if df is None:
+        raise ValueError("Aucune donnée téléversée.")
+    target = target or DataStore.get_target(session_id)
+    if not target:
+        raise ValueError("Aucune cible choisie (voir /data/set-target).")
+    if target not in df.columns:
+        raise ValueError(f"Colonne cible '{target}' introuvable.")
+    if algorithm not in TRAINING_ALGORITHMS:
+        raise ValueError(f"Algorithme inconnu : {algorithm}. Disponibles : {TRAINING_ALGORITHMS}.")
+    name = name or re.sub(r"[^A-Za-z0-9_-]", "_", f"{target}_{algorithm}")[:64]
+    if not MODEL_NAME_PATTERN.match(name):
+        raise ValueError("Nom de modèle invalide (lettres, chiffres, _ et -, 64 caractères au plus).")
+
+    # Le DataFrame n'est jamais modifié en place (un nouveau téléversement le remplace) :
+    # la tâche garde sa référence, sans copie.
+    profile = get_profile(session_id)
+    params = {"target": target, "algorithm": algorithm, "name": name, "n_estimators": n_estimators}
+    return jobs.submit(
+        "training",
+        lambda ctx: train_model(ctx, df, profile, target, algorithm, name, n_estimators=n_estimators),
+        params=params,
+        session_id=session_id,
+    )
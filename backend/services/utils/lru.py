@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, Optional
+
+
+class LRUCache:
+    """
+    Cache LRU thread-safe borné en nombre d'éléments et/ou en octets.
+
+    La taille de chaque valeur est fournie à `put` (ou calculée via `sizeof`).
+    L'élément le plus récemment inséré n'est jamais évincé, même s'il dépasse
+    à lui seul le budget : on évite ainsi de refuser un jeu de données trop gros.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_items: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self._sizeof = sizeof
+        self._on_evict = on_evict
+        self._data: "OrderedDict[Hashable, tuple[Any, int]]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            self._data.move_to_end(key)
+            return item[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Comme `get`, sans modifier l'ordre LRU."""
+        with self._lock:
+            item = self._data.get(key)
+            return default if item is None else item[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: Optional[int] = None) -> None:
+        if nbytes is None:
+            nbytes = self._sizeof(value) if self._sizeof else 0
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._total -= old[1]
+            self._data[key] = (value, int(nbytes))
+            self._total += int(nbytes)
+            evicted = self._evict_locked()
+        self._notify(evicted)
+
+    def resize(self, key: Hashable, nbytes: int) -> None:
+        """Met à jour la taille comptabilisée d'un élément (ex : caches dérivés ajoutés)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return
+            self._total += int(nbytes) - item[1]
+            self._data[key] = (item[0], int(nbytes))
+            evicted = self._evict_locked(protect=key)
+        self._notify(evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            if item is None:
+                return default
+            self._total -= item[1]
+            return item[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._total = 0
+
+    def sizeof(self, key: Hashable) -> int:
+        with self._lock:
+            item = self._data.get(key)
+            return 0 if item is None else item[1]
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data.keys())
+
+    def items(self) -> list[tuple[Hashable, Any]]:
+        """Éléments du moins au plus récemment utilisé."""
+        with self._lock:
+            return [(k, v[0]) for k, v in self._data.items()]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.keys())
+
+    def _over_budget(self) -> bool:
+        if self.max_items is not None and len(self._data) > self.max_items:
+            return True
+        if self.max_bytes is not None and self._total > self.max_bytes:
+            return True
+        return False
+
+    def _evict_locked(self, protect: Optional[Hashable] = None) -> list[tuple[Hashable, Any]]:
+        evicted = []
+        newest = next(reversed(self._data)) if self._data else None
+        while self._over_budget():
+            victim = next((k for k in self._data if k not in (newest, protect)), None)
+            if victim is None:
+                break
+            value, size = self._data.pop(victim)
+            self._total -= size
+            evicted.append((victim, value))
+        return evicted
+
+    def _notify(self, evicted: list[tuple[Hashable, Any]]) -> None:
+        if self._on_evict is None:
+            return
+        for key, value in evicted:
+            self._on_evict(key, value)
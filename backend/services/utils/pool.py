@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Nombre de processus de calcul (1 = tout est calculé dans le processus de l'API)
+STATS_WORKERS = int(os.getenv("STATS_WORKERS", str(os.cpu_count() or 1)))
+# Fichiers d'échange des tableaux avec les processus de calcul : en mémoire (/dev/shm) si possible
+SHARED_DIR = os.getenv("STATS_SHARED_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+# Modules importés une fois par le serveur de processus : chaque processus de calcul en hérite
+PRELOAD = ["backend.services.global_analysis", "backend.services.bootstrap"]
+# Jeux de tableaux gardés mappés par processus de calcul (requêtes récentes)
+ATTACHED_MAX = 4
+ALIGNMENT = 64
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _context():
+    """
+    `forkserver` (ou `spawn`), jamais `fork` : l'API fait tourner de nombreux threads (pool
+    AnyIO, tâches, kaleido, SQLite...) et un fork copierait les verrous qu'ils détiennent.
+    Le serveur de processus est lui-même démarré sans fork et reste mono-thread.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        ctx.set_forkserver_preload(PRELOAD)
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def _noop() -> None:
+    return None
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Pool de processus de calcul partagé par toutes les requêtes, créé au premier usage."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max(1, STATS_WORKERS), mp_context=_context())
+        return _pool
+
+
+def start() -> None:
+    """Démarre les processus dès le lancement de l'API : la première requête ne les attend pas."""
+    if STATS_WORKERS <= 1:
+        return
+    pool = get_pool()
+    for _ in range(STATS_WORKERS):
+        pool.submit(_noop)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ===========================
+#  TABLEAUX PARTAGÉS
+# ===========================
+
+@dataclasses.dataclass(frozen=True)
+class _ArrayRef:
+    offset: int
+    dtype: str
+    shape: tuple
+
+
+def _pack(obj: Any, arrays: list) -> Any:
+    """Remplace chaque tableau NumPy (numérique) de la structure par une référence dans le fichier."""
+    if isinstance(obj, np.ndarray) and obj.dtype != object:
+        arrays.append(obj)
+        return _ArrayRef(-len(arrays), obj.dtype.str, obj.shape)
+    if isinstance(obj, dict):
+        return {k: _pack(v, arrays) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_pack(v, arrays) for v in obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.replace(obj, **{f.name: _pack(getattr(obj, f.name), arrays) for f in dataclasses.fields(obj)})
+    return obj
+
+
+def _unpack(obj: Any, buffer) -> Any:
+    if isinstance(obj, _ArrayRef):
+        count = int(np.prod(obj.shape, dtype=np.int64))
+        return np.frombuffer(buffer, dtype=np.dtype(obj.dtype), count=count, offset=obj.offset).reshape(obj.shape)
+    if isinstance(obj, dict):
+        return {k: _unpack(v, buffer) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_unpack(v, buffer) for v in obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.replace(obj, **{f.name: _unpack(getattr(obj, f.name), buffer) for f in dataclasses.fields(obj)})
+    return obj
+
+
+def _resolve(obj: Any, offsets: list[int]) -> Any:
+    """Références provisoires (-i) -> positions réelles dans le fichier."""
+    if isinstance(obj, _ArrayRef):
+        return _ArrayRef(offsets[-obj.offset - 1], obj.dtype, obj.shape)
+    if isinstance(obj, dict):
+        return {k: _resolve(v, offsets) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_resolve(v, offsets) for v in obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.replace(obj, **{f.name: _resolve(getattr(obj, f.name), offsets) for f in dataclasses.fields(obj)})
+    return obj
+
+
+def _free_bytes(directory: str) -> int:
+    stat = os.statvfs(directory)
+    return stat.f_bavail * stat.f_frsize
+
+
+def _write(arrays: list[np.ndarray], directory: str) -> tuple[str, list[int]]:
+    """Écrit les tableaux (alignés) dans un nouveau fichier du dossier. Retourne (chemin, positions)."""
+    fd, path = tempfile.mkstemp(prefix="stats-", suffix=".bin", dir=directory)
+    offsets, position = [], 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for arr in arrays:
+                padding = -position % ALIGNMENT
+                f.write(b"\0" * padding)
+                position += padding
+                offsets.append(position)
+                data = np.ascontiguousarray(arr).tobytes()
+                f.write(data)
+                position += len(data)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, offsets
+
+
+class SharedArrays:
+    """
+    Données d'une requête transmises aux processus de calcul sans sérialisation des tableaux :
+    ils sont écrits une fois dans un fichier de SHARED_DIR (ou du dossier temporaire si
+    SHARED_DIR manque de place), que chaque processus mappe en lecture seule (`attach`).
+    Seul `handle` (chemin et structure) passe par pickle. Le fichier est supprimé à la
+    sortie du bloc `with`.
+    """
+
+    def __init__(self, state: Any):
+        arrays: list[np.ndarray] = []
+        tree = _pack(state, arrays)
+        size = sum(arr.nbytes + ALIGNMENT for arr in arrays)
+        fallback = tempfile.gettempdir()
+        try:
+            # /dev/shm est souvent petit (64 Mo par défaut sous Docker) : disque si la place manque
+            if SHARED_DIR != fallback and _free_bytes(SHARED_DIR) < size:
+                raise OSError(f"{SHARED_DIR} : espace insuffisant")
+            self.path, offsets = _write(arrays, SHARED_DIR)
+        except OSError as e:
+            if SHARED_DIR == fallback:
+                raise
+            logger.info("Tableaux partagés écrits dans %s (%s)", fallback, e)
+            self.path, offsets = _write(arrays, fallback)
+        self.handle = (self.path, _resolve(tree, offsets))
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+# Côté processus de calcul : fichier -> (mmap, structure reconstruite)
+_attached: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def attach(handle: tuple) -> Any:
+    """Structure d'origine, ses tableaux adossés au fichier mappé (gardé pour les tâches suivantes)."""
+    path, tree = handle
+    cached = _attached.get(path)
+    if cached is not None:
+        _attached.move_to_end(path)
+        return cached[1]
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        buffer = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else b""
+    state = _unpack(tree, buffer)
+    _attached[path] = (buffer, state)
+    while len(_attached) > ATTACHED_MAX:
+        _attached.popitem(last=False)
+    return state
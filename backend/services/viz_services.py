@@ -1,112 +1,295 @@
 from __future__ import annotations
 
-from typing import Optional
+import os
+from typing import TYPE_CHECKING, Optional
 
 import numpy as np
 import pandas as pd
-import plotly.express as px
-from scipy import stats
 
-from backend.services.data_store import DataStore
+from backend.services import kde_engine, metrics, renderer
+from backend.services.data_store import DEFAULT_SESSION, DataStore
+from backend.services.profile import ColumnProfile, DatasetProfile, get_profile
+from backend.services.rank_cache import get_rank_cache
 
+# plotly est importé dans les fonctions qui tracent : les processus qui ne servent que /data
+# ou /stats ne le chargent jamais (voir backend/services/warmup.py)
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
-def _get_df_or_raise() -> pd.DataFrame:
-    df = DataStore.get_df()
+
+def _get_df_or_raise(session_id: str = DEFAULT_SESSION) -> pd.DataFrame:
+    df = DataStore.get_df(session_id)
     if df is None:
         raise ValueError("Aucune donnée téléversée.")
     return df
 
 
-def _fig_to_png_bytes(fig) -> bytes:
-    """Render a Plotly figure to PNG bytes using kaleido."""
-    # Using Plotly's built-in renderer (kaleido) to produce PNG bytes
-    return fig.to_image(format="png")
+def _get_profile_or_raise(session_id: str = DEFAULT_SESSION) -> tuple[pd.DataFrame, DatasetProfile]:
+    """Jeu de la session et son profil (vues numériques, effectifs), construit une fois par téléversement."""
+    df = _get_df_or_raise(session_id)
+    return df, get_profile(session_id)
+
+
+def _plot_values(df: pd.DataFrame, prof: ColumnProfile) -> pd.Series:
+    """
+    Valeurs tracées d'une colonne : vue numérique du profil pour une colonne numérique
+    (ni copie ni conversion), colonne d'origine sinon (libellés, booléens...).
+    """
+    return prof.numeric if prof.is_numeric else df[prof.name]
+
+
+def _category_counts(df: pd.DataFrame, prof: ColumnProfile, topk: Optional[int] = None) -> pd.DataFrame:
+    """
+    Effectifs par modalité, manquants compris, les plus fréquentes d'abord. Lus dans le profil
+    quand ses modalités les plus fréquentes suffisent, sinon comptés sur toute la colonne.
+    """
+    known = prof.top_categories
+    if known and (len(known) == prof.distinct_count or (topk is not None and topk <= len(known))):
+        counts = pd.Series([c["count"] for c in known], index=[c["value"] for c in known])
+        if prof.null_count:
+            counts = pd.concat([counts, pd.Series([prof.null_count], index=[np.nan])])
+        counts = counts.sort_values(ascending=False, kind="stable")
+    else:
+        counts = df[prof.name].value_counts(dropna=False)
+    if topk is not None:
+        counts = counts.head(topk)
+    counts = counts.reset_index()
+    counts.columns = [prof.name, "count"]
+    return counts
 
 
-def histogram(var: str, bins: int = 30) -> bytes:
-    df = _get_df_or_raise()
-    if var not in df.columns:
+# Formats de sortie : images rendues par kaleido, ou spécification Plotly pour un rendu côté client
+FIGURE_FORMATS = ("png", "svg", "spec")
+
+
+def figure_bytes(fig: go.Figure, fmt: str = "png") -> bytes:
+    """
+    Sérialise une figure Plotly : PNG ou SVG via le pool de processus kaleido,
+    ou spécification JSON compacte (`spec`) sans aucun rendu.
+    """
+    if fmt == "spec":
+        with metrics.span("serialize"):
+            return fig.to_json(pretty=False).encode("utf-8")
+    if fmt not in FIGURE_FORMATS:
+        raise ValueError(f"Format de figure inconnu : {fmt}")
+    with metrics.span("render"):
+        return renderer.render(fig, format=fmt)
+
+
+def histogram(var: str, bins: int = 30, session_id: str = DEFAULT_SESSION) -> go.Figure:
+    import plotly.express as px
+    df, profile = _get_profile_or_raise(session_id)
+    if var not in profile:
         raise ValueError(f"Colonne '{var}' introuvable dans le DataFrame.")
 
-    df_plot = df[[var]].dropna()
-    if df_plot.empty:
+    prof = profile[var]
+    values = prof.numeric_values() if prof.is_numeric else df[var].dropna()
+    if values.empty:
         raise ValueError(f"Pas de données pour la colonne {var}.")
 
-    fig = px.histogram(df_plot, x=var, nbins=bins, title=f"Histogramme de {var}")
-    return _fig_to_png_bytes(fig)
+    fig = px.histogram(x=values, nbins=bins, labels={"x": var}, title=f"Histogramme de {var}")
+    return fig
 
 
-def boxplot(y: str, x: Optional[str] = None) -> bytes:
-    df = _get_df_or_raise()
-    if y not in df.columns:
+def boxplot(y: str, x: Optional[str] = None, session_id: str = DEFAULT_SESSION) -> go.Figure:
+    import plotly.express as px
+    df, profile = _get_profile_or_raise(session_id)
+    if y not in profile:
         raise ValueError(f"Colonne '{y}' introuvable dans le DataFrame.")
 
+    values = _plot_values(df, profile[y])
     if x is None:
-        fig = px.box(df, y=y, title=f"Boxplot de {y}")
+        fig = px.box(y=values, labels={"y": y}, title=f"Boxplot de {y}")
     else:
-        if x not in df.columns:
+        if x not in profile:
             raise ValueError(f"Colonne '{x}' introuvable dans le DataFrame.")
-        fig = px.box(df, x=x, y=y, title=f"{y} par {x}")
+        fig = px.box(x=df[x], y=values, labels={"x": x, "y": y}, title=f"{y} par {x}")
+
+    return fig
 
-    return _fig_to_png_bytes(fig)
 
+# Au-delà de ce nombre de points, le nuage est agrégé (mode "auto")
+SCATTER_MAX_POINTS = int(os.getenv("SCATTER_MAX_POINTS", "20000"))
+# Résolution de la carte de densité (cases par axe)
+SCATTER_BINS = int(os.getenv("SCATTER_BINS", "200"))
+# Points gardés au minimum par groupe de couleur lors de l'échantillonnage stratifié
+SCATTER_MIN_PER_GROUP = 50
+SCATTER_MODES = ("auto", "points", "density", "sample")
 
-def scatter(x: str, y: str, hue: Optional[str] = None) -> bytes:
-    df = _get_df_or_raise()
-    if x not in df.columns or y not in df.columns:
+
+def _stratified_sample(groups: pd.Series, n_points: int, seed: int = 0) -> np.ndarray:
+    """
+    Positions d'un échantillon d'environ `n_points` lignes, réparti proportionnellement
+    entre les groupes (au moins SCATTER_MIN_PER_GROUP par groupe) : les groupes rares
+    restent visibles. Graine fixe : la même requête donne la même image (cache, ETag).
+    """
+    codes, _ = pd.factorize(groups)
+    sizes = np.bincount(codes)
+    quotas = np.minimum(sizes, np.maximum(np.round(sizes * n_points / len(codes)), SCATTER_MIN_PER_GROUP)).astype(int)
+    # Clé aléatoire par ligne : dans chaque groupe, on garde les `quota` plus petites
+    keys = np.random.default_rng(seed).random(len(codes))
+    order = np.lexsort((keys, codes))
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    rank_in_group = np.arange(len(codes)) - np.repeat(starts, sizes)
+    return np.sort(order[rank_in_group < np.repeat(quotas, sizes)])
+
+
+def _density_figure(xv: np.ndarray, yv: np.ndarray, x: str, y: str) -> go.Figure:
+    """Carte de densité 2D : nombre de points par case, échelle de couleur logarithmique."""
+    import plotly.graph_objects as go
+    counts, x_edges, y_edges = np.histogram2d(xv, yv, bins=SCATTER_BINS)
+    with np.errstate(divide="ignore"):
+        z = np.where(counts > 0, np.log10(counts), np.nan).T
+    top = int(np.ceil(np.nanmax(z))) if np.isfinite(np.nanmax(z)) else 0
+    ticks = list(range(0, max(top, 1) + 1))
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=z,
+        colorscale="Viridis",
+        colorbar={"title": "Points", "tickvals": ticks, "ticktext": [f"{10 ** t:,}".replace(",", " ") for t in ticks]},
+        hovertemplate=f"{x}=%{{x}}<br>{y}=%{{y}}<extra></extra>",
+    ))
+    fig.update_layout(
+        title=f"{x} vs {y} (densité de {len(xv):,} points)".replace(",", " "),
+        xaxis_title=x,
+        yaxis_title=y,
+    )
+    return fig
+
+
+def scatter(
+    x: str,
+    y: str,
+    hue: Optional[str] = None,
+    session_id: str = DEFAULT_SESSION,
+    mode: str = "auto",
+) -> go.Figure:
+    """
+    Nuage de points. Au-delà de SCATTER_MAX_POINTS (mode "auto"), les points sont agrégés :
+    échantillon stratifié par groupe de couleur si `hue` est fourni (ou si les axes ne sont
+    pas numériques), sinon carte de densité 2D. Le coût du tracé ne dépend plus de n.
+    """
+    import plotly.express as px
+    df, profile = _get_profile_or_raise(session_id)
+    if x not in profile or y not in profile:
         raise ValueError("Colonnes invalides.")
+    if mode not in SCATTER_MODES:
+        raise ValueError(f"Mode inconnu : {mode}")
 
-    cols = [x, y] + ([hue] if hue else [])
-    df_plot = df[cols].dropna()
-    if df_plot.empty:
+    cols = list(dict.fromkeys([x, y] + ([hue] if hue else [])))
+    values = {c: _plot_values(df, profile[c]) if c in profile else df[c] for c in cols}
+    # Lignes complètes repérées sur les vues du profil : seules les lignes tracées sont copiées
+    complete = np.ones(len(df), dtype=bool)
+    for v in values.values():
+        complete &= v.notna().to_numpy()
+    rows = np.flatnonzero(complete)
+    if len(rows) == 0:
         raise ValueError(f"Pas assez de données pour tracer le scatter entre {x} et {y}.")
 
+    n = len(rows)
+    numeric_axes = profile[x].is_numeric and profile[y].is_numeric
+    if mode == "auto":
+        if n <= SCATTER_MAX_POINTS:
+            mode = "points"
+        else:
+            mode = "density" if numeric_axes and not hue else "sample"
+    if mode == "density":
+        if not numeric_axes:
+            raise ValueError("La carte de densité demande deux variables numériques.")
+        return _density_figure(values[x].to_numpy(dtype=float)[rows], values[y].to_numpy(dtype=float)[rows], x, y)
+
+    title = f"{x} vs {y}"
+    if mode == "sample" and n > SCATTER_MAX_POINTS:
+        groups = values[hue].iloc[rows] if hue else pd.Series(np.zeros(n, dtype=np.int8))
+        rows = rows[_stratified_sample(groups, SCATTER_MAX_POINTS)]
+        title += f" (échantillon de {len(rows):,} points sur {n:,})".replace(",", " ")
+    df_plot = pd.DataFrame({c: v.iloc[rows] for c, v in values.items()})
+
     if hue and hue in df_plot.columns:
-        fig = px.scatter(df_plot, x=x, y=y, color=hue, title=f"{x} vs {y}")
+        fig = px.scatter(df_plot, x=x, y=y, color=hue, title=title)
     else:
-        fig = px.scatter(df_plot, x=x, y=y, title=f"{x} vs {y}")
+        fig = px.scatter(df_plot, x=x, y=y, title=title)
 
-    return _fig_to_png_bytes(fig)
+    return fig
 
 
-def line(y: str, order_by: str) -> bytes:
+def line(y: str, order_by: str, session_id: str = DEFAULT_SESSION) -> go.Figure:
     """
     Pour compatibilité : la précédente 'courbe' est remplacée par un Camembert (pie)
     représentant la répartition de la colonne `y`.
     """
-    df = _get_df_or_raise()
-    if y not in df.columns:
+    import plotly.express as px
+    df, profile = _get_profile_or_raise(session_id)
+    if y not in profile:
         raise ValueError(f"Colonne '{y}' introuvable dans le DataFrame.")
 
-    counts = df[y].value_counts(dropna=False).reset_index()
-    counts.columns = [y, "count"]
+    counts = _category_counts(df, profile[y])
     fig = px.pie(counts, names=y, values="count", title=f"Répartition de {y}")
-    return _fig_to_png_bytes(fig)
+    return fig
 
 
-def kde(var: str) -> bytes:
-    df = _get_df_or_raise()
-    if var not in df.columns:
-        raise ValueError(f"Colonne '{var}' introuvable dans le DataFrame.")
+# Au-delà, seules les modalités les plus fréquentes ont leur courbe
+KDE_MAX_GROUPS = 20
+
 
-    series = pd.to_numeric(df[var], errors="coerce").dropna()
-    if series.empty:
+def kde(
+    var: str,
+    session_id: str = DEFAULT_SESSION,
+    by: Optional[str] = None,
+    bandwidth: str = "scott",
+) -> go.Figure:
+    """
+    Densité d'une variable numérique (moteur binné + FFT, voir kde_engine), ou une
+    densité par modalité de `by`. Les valeurs triées viennent du cache de rangs.
+    """
+    import plotly.express as px
+    import plotly.graph_objects as go
+    df, profile = _get_profile_or_raise(session_id)
+    if var not in profile:
+        raise ValueError(f"Colonne '{var}' introuvable dans le DataFrame.")
+    if profile[var].numeric is None:
         raise ValueError(f"Pas de données numériques pour la colonne {var}.")
+    col = get_rank_cache(session_id).column(var)
+    if col.n == 0:
+        raise ValueError(f"Pas de données numériques pour la colonne {var}.")
+
+    if by is None:
+        with metrics.span("compute"):
+            res = kde_engine.kde(col.values, method=bandwidth)
+        return px.line(x=res["x"], y=res["density"], labels={"x": var, "y": "Densité"}, title=f"KDE de {var}")
 
-    kde_est = stats.gaussian_kde(series.values)
-    xs = np.linspace(series.min(), series.max(), 300)
-    ys = kde_est(xs)
-    fig = px.line(x=xs, y=ys, labels={"x": var, "y": "Densité"}, title=f"KDE de {var}")
-    return _fig_to_png_bytes(fig)
+    if by not in df.columns:
+        raise ValueError(f"Colonne '{by}' introuvable dans le DataFrame.")
+    codes, levels = pd.factorize(df[by], sort=True)
+    title = f"KDE de {var} par {by}"
+    if len(levels) > KDE_MAX_GROUPS:
+        top = np.argsort(-np.bincount(codes[codes >= 0], minlength=len(levels)), kind="stable")[:KDE_MAX_GROUPS]
+        remap = np.full(len(levels), -1)
+        remap[np.sort(top)] = np.arange(KDE_MAX_GROUPS)
+        codes = np.where(codes >= 0, remap[codes], -1)
+        levels = levels[np.sort(top)]
+        title += f" ({KDE_MAX_GROUPS} modalités les plus fréquentes)"
 
+    # Modalité de chaque valeur, dans l'ordre croissant des valeurs : chaque groupe reste trié
+    labels = codes[col.order]
+    keep = labels >= 0
+    with metrics.span("compute"):
+        res = kde_engine.grouped_kde(col.values[keep], labels[keep], len(levels), method=bandwidth)
+    fig = go.Figure([
+        go.Scatter(x=res["x"], y=density, mode="lines", name=str(levels[g]))
+        for g, density in zip(res["groups"], res["density"])
+    ])
+    fig.update_layout(title=title, xaxis_title=var, yaxis_title="Densité", legend_title=by)
+    return fig
 
-def bar(cat: str, topk: int = 10) -> bytes:
-    df = _get_df_or_raise()
-    if cat not in df.columns:
+
+def bar(cat: str, topk: int = 10, session_id: str = DEFAULT_SESSION) -> go.Figure:
+    import plotly.express as px
+    df, profile = _get_profile_or_raise(session_id)
+    if cat not in profile:
         raise ValueError(f"Colonne '{cat}' introuvable dans le DataFrame.")
 
-    counts = df[cat].value_counts(dropna=False).head(topk).reset_index()
-    counts.columns = [cat, "count"]
+    counts = _category_counts(df, profile[cat], topk)
     fig = px.bar(counts, x=cat, y="count", title=f"Top {topk} de {cat}")
-    return _fig_to_png_bytes(fig)
-
+    return fig
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from backend.services import metrics, renderer
+
+logger = logging.getLogger(__name__)
+
+# Préchauffage au démarrage, hors du chemin des requêtes : étapes séparées par des virgules
+# parmi stats, viz, render, prediction ; "none" (ou vide) le désactive. Un déploiement qui ne
+# sert que /data peut le désactiver : scipy, plotly et scikit-learn ne seront jamais chargés.
+WARMUP = os.getenv("WARMUP", "stats,viz,render")
+
+
+def record(step: str, seconds: float) -> None:
+    """Durée d'une étape du démarrage : journalisée et exposée sur /metrics (startup_duration_seconds)."""
+    metrics.startup_seconds.set((step,), seconds)
+    logger.info("Démarrage : %s en %.3f s", step, seconds)
+
+
+def _stats() -> None:
+    # Tests de /stats (scipy.stats charge aussi scipy.special et scipy.optimize)
+    from scipy import special, stats  # noqa: F401
+
+
+def _viz() -> None:
+    # Le premier graphique plotly.express charge aussi les validateurs et le thème par défaut
+    import plotly.express as px
+    px.scatter(x=[0, 1], y=[0, 1]).to_dict()
+
+
+# Modules des pipelines de /prediction/train, et de ceux qu'on désérialise
+PREDICTION_MODULES = (
+    "sklearn.compose", "sklearn.ensemble", "sklearn.impute", "sklearn.linear_model",
+    "sklearn.metrics", "sklearn.model_selection", "sklearn.pipeline", "sklearn.preprocessing",
+)
+
+
+def _prediction() -> None:
+    for name in PREDICTION_MODULES:
+        importlib.import_module(name)
+
+
+STEPS: dict[str, Callable[[], None]] = {
+    "stats": _stats,
+    "viz": _viz,
+    "prediction": _prediction,
+}
+
+
+def steps(setting: str = WARMUP) -> list[str]:
+    names = [s.strip() for s in setting.split(",") if s.strip() and s.strip() != "none"]
+    unknown = [s for s in names if s not in STEPS and s != "render"]
+    if unknown:
+        logger.warning("WARMUP : étapes inconnues ignorées : %s", ", ".join(unknown))
+    return [s for s in names if s not in unknown]
+
+
+def run(names: list[str]) -> None:
+    """Exécute les étapes dans l'ordre ; un échec est journalisé et n'arrête pas les suivantes."""
+    for name in names:
+        started = time.perf_counter()
+        try:
+            STEPS[name]()
+        except Exception as e:
+            logger.warning("Préchauffage '%s' en échec : %s", name, e)
+            continue
+        record(f"warmup.{name}", time.perf_counter() - started)
+
+
+def _render() -> None:
+    started = time.perf_counter()
+    renderer.get_pool().warm()
+    record("warmup.render", time.perf_counter() - started)
+
+
+def start(setting: str = WARMUP) -> Optional[threading.Thread]:
+    """
+    Lance le préchauffage en arrière-plan : l'API répond (healthcheck compris) pendant
+    ce temps ; une requête qui arrive avant la fin importe elle-même ce qui lui manque.
+    Les processus kaleido (rendu jetable) démarrent dans leur propre thread, en parallèle.
+    """
+    names = steps(setting)
+    if "render" in names:
+        threading.Thread(target=_render, name="kaleido-warmup", daemon=True).start()
+        names.remove("render")
+    if not names:
+        return None
+    thread = threading.Thread(target=run, args=(names,), name="warmup", daemon=True)
+    thread.start()
+    return thread
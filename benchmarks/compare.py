@@ -0,0 +1,87 @@
+"""
+Compare deux fichiers de résultats de benchmarks.run (médianes, cas par cas).
+
+    python -m benchmarks.compare benchmarks/results/<avant>.json benchmarks/results/<après>.json
+    python -m benchmarks.compare avant.json après.json --threshold 0.15 --fail
+
+Un cas est signalé quand sa médiane (ou son minimum, --stat min) varie de plus de
+`threshold` (10 % par défaut) et d'au moins `min_delta_ms` : les écarts de quelques
+microsecondes des cas très courts ne sont que du bruit. Avec --fail, le code de sortie
+vaut 1 s'il y a au moins une régression.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Optional
+
+
+def _load(path: str) -> tuple[dict, dict]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    results = {(r["case"], r["rows"], r["cols"]): r for r in data["results"]}
+    return data.get("meta", {}), results
+
+
+def compare(base: dict, head: dict, threshold: float = 0.10, min_delta_ms: float = 1.0,
+            stat: str = "median") -> list[dict]:
+    """Une ligne par cas commun aux deux fichiers : temps, rapport après / avant et verdict."""
+    field = f"{stat}_s"
+    rows = []
+    for key in sorted(set(base) & set(head)):
+        b, h = base[key], head[key]
+        row = {"case": key[0], "rows": key[1], "cols": key[2],
+               "base_s": b.get(field), "head_s": h.get(field), "ratio": None, "verdict": ""}
+        if b.get("error") or h.get("error"):
+            row["verdict"] = "erreur"
+        elif b[field] > 0:
+            row["ratio"] = h[field] / b[field]
+            significant = abs(h[field] - b[field]) * 1000 >= min_delta_ms
+            if significant and row["ratio"] > 1 + threshold:
+                row["verdict"] = "régression"
+            elif significant and row["ratio"] < 1 / (1 + threshold):
+                row["verdict"] = "amélioration"
+        rows.append(row)
+    return rows
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.2f}"
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare deux résultats de benchmarks.")
+    parser.add_argument("base", help="Résultats de référence (avant)")
+    parser.add_argument("head", help="Résultats à comparer (après)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Variation relative signalée (0.10 = 10 %%)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="Écart absolu minimal signalé (ms)")
+    parser.add_argument("--stat", choices=("median", "min", "mean"), default="median")
+    parser.add_argument("--fail", action="store_true", help="Code de sortie 1 en cas de régression")
+    args = parser.parse_args(argv)
+
+    base_meta, base = _load(args.base)
+    head_meta, head = _load(args.head)
+    print(f"avant : {base_meta.get('commit', '?')[:12]}   après : {head_meta.get('commit', '?')[:12]}")
+    if base_meta.get("platform") != head_meta.get("platform") or base_meta.get("cpu_count") != head_meta.get("cpu_count"):
+        print("attention : résultats obtenus sur des machines différentes")
+
+    rows = compare(base, head, args.threshold, args.min_delta_ms, args.stat)
+    print(f"{'cas':<32} {'lignes':>9} {'cols':>5} {'avant ms':>11} {'après ms':>11} {'rapport':>8}")
+    for row in rows:
+        ratio = "-" if row["ratio"] is None else f"{row['ratio']:.2f}"
+        print(f"{row['case']:<32} {row['rows']:>9} {row['cols']:>5} {_ms(row['base_s']):>11} "
+              f"{_ms(row['head_s']):>11} {ratio:>8}  {row['verdict']}")
+    for label, keys in (("absents avant", set(head) - set(base)), ("absents après", set(base) - set(head))):
+        if keys:
+            listed = ", ".join(f"{c} ({r}×{k})" for c, r, k in sorted(keys)[:10])
+            print(f"{len(keys)} cas {label} : {listed}{', ...' if len(keys) > 10 else ''}")
+
+    regressions = [r for r in rows if r["verdict"] == "régression"]
+    print(f"{len(regressions)} régression(s), "
+          f"{sum(r['verdict'] == 'amélioration' for r in rows)} amélioration(s) sur {len(rows)} cas")
+    return 1 if args.fail and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
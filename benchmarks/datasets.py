@@ -0,0 +1,150 @@
+"""
+Jeux de données synthétiques « diabète » pour les benchmarks.
+
+Génération déterministe : pour une graine, un nombre de lignes et de colonnes donnés,
+le jeu est identique d'une machine et d'un commit à l'autre (générateur PCG64 de NumPy,
+un flux par bloc de CHUNK_ROWS lignes). Les grands jeux sont écrits en CSV bloc par bloc,
+sans jamais tenir entièrement en mémoire.
+"""
+from __future__ import annotations
+
+import os
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+
+# Taille des blocs de génération : elle fait partie de la définition du jeu (ne pas changer)
+CHUNK_ROWS = 100_000
+MIN_COLUMNS = 5
+MAX_COLUMNS = 500
+TARGET = "diagnosed_diabetes"
+
+# Colonnes de base, par ordre de priorité (un jeu de k colonnes prend les k premières).
+# (nom, taux de valeurs manquantes)
+BASE_COLUMNS = [
+    ("age", 0.01),
+    ("bmi", 0.03),
+    ("glucose_fasting", 0.05),
+    ("hba1c", 0.08),
+    (TARGET, 0.0),
+    ("sex", 0.005),
+    ("systolic_bp", 0.02),
+    ("family_history", 0.0),
+    ("physical_activity", 0.04),
+    ("smoking", 0.02),
+    ("id", 0.0),
+    ("region", 0.01),
+    ("visit_date", 0.0),
+]
+# Colonnes supplémentaires, tirées dans ces proportions
+EXTRA_KINDS = (("lab", 0.6), ("count", 0.15), ("level", 0.1), ("flag", 0.1), ("code", 0.05))
+
+SEXES = np.array(["F", "M"], dtype=object)
+ACTIVITY = np.array(["low", "medium", "high"], dtype=object)
+SMOKING = np.array(["never", "former", "current"], dtype=object)
+REGIONS = np.array([f"R{i:03d}" for i in range(200)], dtype=object)
+EPOCH = np.datetime64("2015-01-01")
+
+
+def _schema(n_cols: int, seed: int) -> list[dict]:
+    """Description des colonnes (type et paramètres), fixée par la graine seule."""
+    if not MIN_COLUMNS <= n_cols <= MAX_COLUMNS:
+        raise ValueError(f"Nombre de colonnes entre {MIN_COLUMNS} et {MAX_COLUMNS}.")
+    rng = np.random.default_rng([seed, 0xC01])
+    schema = [{"name": name, "kind": name, "nan": nan} for name, nan in BASE_COLUMNS[:n_cols]]
+    kinds, weights = zip(*EXTRA_KINDS)
+    for i in range(n_cols - len(schema)):
+        kind = kinds[rng.choice(len(kinds), p=weights)]
+        col = {"name": f"{kind}_{i:03d}", "kind": kind, "nan": float(rng.choice([0.0, 0.01, 0.05, 0.2]))}
+        if kind == "lab":
+            col.update(mean=float(rng.uniform(1, 200)), sd=float(rng.uniform(0.5, 40)), skew=bool(rng.random() < 0.3))
+        elif kind == "count":
+            col.update(lam=float(rng.uniform(0.5, 30)))
+        elif kind == "level":
+            col.update(levels=int(rng.integers(3, 13)))
+        elif kind == "code":
+            col.update(levels=1000)
+        schema.append(col)
+    return schema
+
+
+def _with_nans(values: np.ndarray, rate: float, rng: np.random.Generator) -> np.ndarray:
+    if rate <= 0:
+        return values
+    mask = rng.random(len(values)) < rate
+    if not mask.any():
+        return values
+    if values.dtype == object:
+        values = values.copy()
+        values[mask] = None
+        return values
+    values = values.astype(float)
+    values[mask] = np.nan
+    return values
+
+
+def _chunk(schema: list[dict], start: int, n: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng([seed, start // CHUNK_ROWS])
+    # Variables cliniques corrélées : le diagnostic dépend de la glycémie, de l'HbA1c et de l'IMC
+    age = rng.integers(18, 91, n)
+    bmi = rng.normal(27.5, 5.5, n).clip(14, 60)
+    glucose = rng.lognormal(np.log(100) + 0.004 * (bmi - 27.5), 0.22, n)
+    hba1c = (4.2 + glucose / 60 + rng.normal(0, 0.35, n)).clip(3.5, 15)
+    logit = -7.0 + 0.045 * glucose + 0.6 * (hba1c - 5.7) + 0.03 * (bmi - 27.5) + 0.01 * (age - 50)
+    target = (rng.random(n) < 1 / (1 + np.exp(-logit))).astype(np.int8)
+
+    base = {
+        "age": age,
+        "bmi": bmi.round(1),
+        "glucose_fasting": glucose.round(0),
+        "hba1c": hba1c.round(1),
+        TARGET: target,
+        "sex": SEXES[rng.integers(0, 2, n)],
+        "systolic_bp": rng.normal(122 + 0.35 * (age - 50), 16, n).round(0),
+        "family_history": (rng.random(n) < 0.25 + 0.2 * target).astype(np.int8),
+        "physical_activity": ACTIVITY[rng.choice(3, n, p=[0.4, 0.4, 0.2])],
+        "smoking": SMOKING[rng.choice(3, n, p=[0.55, 0.3, 0.15])],
+        "id": np.arange(start, start + n, dtype=np.int64),
+        "region": REGIONS[(rng.zipf(1.3, n) - 1) % len(REGIONS)],
+        "visit_date": (EPOCH + rng.integers(0, 3650, n).astype("timedelta64[D]")).astype(str).astype(object),
+    }
+
+    data = {}
+    for col in schema:
+        kind = col["kind"]
+        if kind in base:
+            values = base[kind]
+        elif kind == "lab":
+            values = (rng.lognormal(np.log(col["mean"]), col["sd"] / col["mean"] / 2, n) if col["skew"]
+                      else rng.normal(col["mean"], col["sd"], n)).round(3)
+        elif kind == "count":
+            values = rng.poisson(col["lam"], n)
+        elif kind == "level":
+            values = np.array([f"L{i}" for i in range(col["levels"])], dtype=object)[rng.integers(0, col["levels"], n)]
+        elif kind == "flag":
+            values = np.where(rng.random(n) < 0.3, "true", "false").astype(object)
+        else:
+            values = np.char.add("C", rng.integers(0, col["levels"], n).astype(str)).astype(object)
+        data[col["name"]] = _with_nans(values, col["nan"], rng)
+    return pd.DataFrame(data)
+
+
+def iter_chunks(rows: int, cols: int = 13, seed: int = 0) -> Iterator[pd.DataFrame]:
+    """Le jeu par blocs de CHUNK_ROWS lignes (le dernier est plus court)."""
+    schema = _schema(cols, seed)
+    for start in range(0, rows, CHUNK_ROWS):
+        yield _chunk(schema, start, min(CHUNK_ROWS, rows - start), seed)
+
+
+def generate(rows: int, cols: int = 13, seed: int = 0) -> pd.DataFrame:
+    """Jeu complet en mémoire : `rows` lignes (1e3 à 1e7), `cols` colonnes (5 à 500)."""
+    return pd.concat(list(iter_chunks(rows, cols, seed)), ignore_index=True)
+
+
+def write_csv(path: str, rows: int, cols: int = 13, seed: int = 0) -> int:
+    """Écrit le jeu en CSV bloc par bloc (mémoire bornée). Retourne la taille du fichier en octets."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for i, chunk in enumerate(iter_chunks(rows, cols, seed)):
+            chunk.to_csv(f, index=False, header=i == 0)
+    return os.path.getsize(path)
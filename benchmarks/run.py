@@ -0,0 +1,353 @@
+"""
+Benchmarks du backend sur des jeux synthétiques (voir datasets.py).
+
+    python -m benchmarks.run --rows 1e3,1e5,1e6 --cols 13,100 --repeat 5
+    python -m benchmarks.run --groups stats --filter spearman
+    python -m benchmarks.run --groups permutation --permutation-workers 8
+
+Chaque cas est mesuré `repeat` fois (après un passage d'échauffement) ; sa préparation
+n'est pas chronométrée. Les résultats sont écrits en JSON (par défaut
+benchmarks/results/<commit>.json) et se comparent avec `python -m benchmarks.compare`.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+# Avant tout import du backend : pas de snapshots sur disque, pas de surveillance des modèles
+os.environ.setdefault("DATASTORE_SNAPSHOTS", "0")
+os.environ.setdefault("MODEL_RELOAD_INTERVAL_S", "0")
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import datasets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+GROUPS = ("upload", "stats", "viz", "prediction", "permutation")
+SESSION = "benchmark"
+UPLOAD_SESSION = "benchmark-upload"
+# Tests par permutation : taille fixe, indépendante des jeux, et temps visé par test
+PERMUTATION_N = 3000
+PERMUTATION_COUNT = 100_000
+PERMUTATION_TARGET_S = 1.0
+
+
+@dataclass
+class Case:
+    name: str
+    group: str
+    run: Callable[[Any], Any]
+    # Préparation non chronométrée, refaite avant chaque mesure (caches froids) ; son résultat est passé à `run`
+    setup: Optional[Callable[[], Any]] = None
+    # Appels par mesure pour les cas très courts (le temps rapporté est celui d'un appel)
+    calls: int = 1
+    # Temps visé (médiane), rapporté avec le résultat
+    target_s: Optional[float] = None
+
+
+def measure(case: Case, repeat: int, warmup: int = 1) -> dict:
+    times = []
+    for i in range(warmup + repeat):
+        state = case.setup() if case.setup is not None else None
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(case.calls):
+            result = case.run(state)
+        elapsed = (time.perf_counter() - started) / case.calls
+        # Les services signalent certaines erreurs dans le résultat plutôt que par une exception
+        if isinstance(result, dict) and "error" in result:
+            raise RuntimeError(result["error"])
+        if i >= warmup:
+            times.append(elapsed)
+    record = {
+        "times_s": [round(t, 6) for t in times],
+        "min_s": round(min(times), 6),
+        "median_s": round(statistics.median(times), 6),
+        "mean_s": round(statistics.fmean(times), 6),
+    }
+    if case.target_s is not None:
+        record["target_s"] = case.target_s
+        record["target_met"] = record["median_s"] <= case.target_s
+    return record
+
+
+def _roles(df: pd.DataFrame) -> dict:
+    """Colonnes utilisées par les cas : trois numériques, une binaire, une à plusieurs modalités."""
+    binary = "sex" if "sex" in df.columns else datasets.TARGET
+    return {
+        "a": "bmi",
+        "b": "glucose_fasting",
+        "c": "hba1c",
+        "numeric": [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c]) and c != "id"],
+        "binary": binary,
+        "multi": "physical_activity" if "physical_activity" in df.columns else binary,
+    }
+
+
+def upload_cases(csv_path: str, client) -> list[Case]:
+    from backend.services.compaction import compact_frame
+    from backend.services.ingest import read_csv_file
+
+    with open(csv_path, "rb") as f:
+        payload = f.read()
+    parsed = read_csv_file(csv_path, ",")[0]
+    return [
+        Case("upload.read_csv", "upload", lambda _: read_csv_file(csv_path, ",")),
+        Case("upload.compact_frame", "upload", lambda frame: compact_frame(frame), setup=lambda: parsed.copy()),
+        Case("upload.route", "upload", lambda _: _ok(client.post(
+            "/data/upload", files={"file": ("data.csv", payload, "text/csv")}, headers={"X-Session-ID": UPLOAD_SESSION},
+        ))),
+    ]
+
+
+def stats_cases(df: pd.DataFrame) -> list[Case]:
+    from backend.services import stats_services as s
+    from backend.services.profile import build_profile
+    from backend.services.rank_cache import RankCache
+
+    r = _roles(df)
+    a, b, c = r["a"], r["b"], r["c"]
+    profile = build_profile(df)
+    fresh_ranks = lambda: RankCache(profile)  # noqa: E731
+    x, y, z = (df[col].dropna().to_numpy(dtype=float) for col in (a, b, c))
+    n = min(len(x), len(y), len(z))
+    paired = [x[:n], y[:n], z[:n]]
+    return [
+        Case("stats.build_profile", "stats", lambda _: build_profile(df)),
+        Case("stats.interpret_pvalue", "stats", lambda _: s.interpret_pvalue(0.03), calls=1000),
+        Case("stats.spearman_test", "stats", lambda _: s.spearman_test(df, a, b)),
+        Case("stats.mann_whitney_test", "stats", lambda _: s.mann_whitney_test(df, r["binary"], b)),
+        Case("stats.kruskal_wallis_test", "stats", lambda _: s.kruskal_wallis_test(df, r["multi"], c)),
+        Case("stats.friedman_test", "stats", lambda _: s.friedman_test(df, [a, b, c])),
+        Case("stats.ks_two_samples_test", "stats", lambda _: s.ks_two_samples_test(df, a, b)),
+        Case("stats.chi2_test", "stats", lambda _: s.chi2_test(df, r["binary"], r["multi"])),
+        Case("stats.spearman_corr", "stats", lambda _: s.spearman_corr(paired[0], paired[1])),
+        Case("stats.mann_whitney", "stats", lambda _: s.mann_whitney(x, y)),
+        Case("stats.kruskal_test", "stats", lambda _: s.kruskal_test([x, y, z])),
+        Case("stats.ks_two_samples", "stats", lambda _: s.ks_two_samples(x, y)),
+        Case("stats.friedman", "stats", lambda _: s.friedman(paired)),
+        Case("stats.spearman_columns", "stats", lambda ranks: s.spearman_columns(ranks, a, b), setup=fresh_ranks),
+        Case("stats.mann_whitney_columns", "stats", lambda ranks: s.mann_whitney_columns(ranks, a, b), setup=fresh_ranks),
+        Case("stats.kruskal_columns", "stats", lambda ranks: s.kruskal_columns(ranks, [a, b, c]), setup=fresh_ranks),
+        Case("stats.ks_columns", "stats", lambda ranks: s.ks_columns(ranks, a, b), setup=fresh_ranks),
+        Case("stats.spearman_matrix", "stats", lambda ranks: s.spearman_matrix(ranks, r["numeric"]), setup=fresh_ranks),
+    ]
+
+
+def viz_cases(df: pd.DataFrame, render: bool) -> list[Case]:
+    from backend.services import renderer
+    from backend.services import viz_services as v
+    from backend.services.data_store import DataStore
+    from backend.services.profile import get_profile
+
+    r = _roles(df)
+    a, b = r["a"], r["b"]
+
+    def fresh_session():
+        # Jeu rechargé : caches dérivés vides, profil construit comme au téléversement
+        DataStore.set_df(df, SESSION)
+        get_profile(SESSION)
+
+    cases = [
+        Case("viz.histogram", "viz", lambda _: v.histogram(a, 30, SESSION), setup=fresh_session),
+        Case("viz.boxplot", "viz", lambda _: v.boxplot(a, r["multi"], SESSION), setup=fresh_session),
+        Case("viz.scatter", "viz", lambda _: v.scatter(a, b, None, SESSION), setup=fresh_session),
+        Case("viz.scatter_hue", "viz", lambda _: v.scatter(a, b, r["binary"], SESSION), setup=fresh_session),
+        Case("viz.line", "viz", lambda _: v.line(r["multi"], a, SESSION), setup=fresh_session),
+        Case("viz.kde", "viz", lambda _: v.kde(a, SESSION), setup=fresh_session),
+        Case("viz.kde_by", "viz", lambda _: v.kde(a, SESSION, by=r["multi"]), setup=fresh_session),
+        Case("viz.bar", "viz", lambda _: v.bar(r["multi"], 10, SESSION), setup=fresh_session),
+    ]
+
+    def built(builder):
+        def setup():
+            fresh_session()
+            return builder()
+        return setup
+
+    cases.append(Case("viz.figure_bytes_spec", "viz", lambda fig: v.figure_bytes(fig, "spec"),
+                      setup=built(lambda: v.kde(a, SESSION))))
+    if render:
+        renderer.get_pool().warm()
+        cases += [
+            Case("viz.figure_bytes_png", "viz", lambda fig: v.figure_bytes(fig, "png"),
+                 setup=built(lambda: v.kde(a, SESSION))),
+            Case("viz.figure_bytes_svg", "viz", lambda fig: v.figure_bytes(fig, "svg"),
+                 setup=built(lambda: v.histogram(a, 30, SESSION))),
+        ]
+    return cases
+
+
+def prediction_cases(df: pd.DataFrame, client, seed: int) -> list[Case]:
+    from backend.services.batch_prediction import FEATURES
+
+    features = df if all(f in df.columns for f in FEATURES) else datasets.generate(len(df), 8, seed)
+    payload = features[FEATURES].to_csv(index=False).encode("utf-8")
+    body = {"age": 54, "bmi": 31.2, "systolic_bp": 138, "glucose_fasting": 118, "hba1c": 6.1, "family_history": 1}
+    return [
+        Case("prediction.manual_route", "prediction", lambda _: _ok(client.post("/prediction/manual", json=body)), calls=50),
+        Case("prediction.batch_route", "prediction", lambda _: _ok(client.post(
+            "/prediction/batch?output=csv", files={"file": ("patients.csv", payload, "text/csv")},
+        ))),
+    ]
+
+
+def permutation_cases(seed: int) -> list[Case]:
+    from scipy import stats
+
+    from backend.services.permutation import rank_permutation_test
+
+    rng = np.random.default_rng(seed)
+    cases = []
+    for name, k in (("two_groups", 2), ("three_groups", 3)):
+        sizes = [PERMUTATION_N // k] * k
+        ranks = stats.rankdata(np.concatenate([rng.normal(0.05 * g, 1.0, s) for g, s in enumerate(sizes)]))
+        # tolerance=0 : toutes les permutations, sans arrêt anticipé (pire cas)
+        cases.append(Case(f"permutation.{name}", "permutation", lambda _, ranks=ranks, sizes=sizes: rank_permutation_test(
+            ranks, sizes, n_permutations=PERMUTATION_COUNT, seed=seed, tolerance=0,
+        ), target_s=PERMUTATION_TARGET_S))
+    return cases
+
+
+def _ok(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code} : {response.text[:200]}")
+    body = response.json() if response.headers.get("content-type", "").startswith("application/json") else None
+    if isinstance(body, dict) and "detail" in body and "rows" not in body and "result" not in body:
+        raise RuntimeError(str(body["detail"])[:200])
+    return response
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata(args: argparse.Namespace) -> dict:
+    import plotly
+    import scipy
+    import sklearn
+
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "permutation_workers": int(os.environ.get("PERMUTATION_WORKERS", os.cpu_count() or 1)),
+        "versions": {m.__name__: m.__version__ for m in (np, pd, scipy, sklearn, plotly)},
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "warmup": args.warmup,
+    }
+
+
+def _sizes(text: str) -> list[int]:
+    return [int(float(v)) for v in text.split(",") if v.strip()]
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks du backend sur des jeux synthétiques.")
+    parser.add_argument("--rows", default="1e3,1e4,1e5", help="Tailles des jeux (1e3 à 1e7), séparées par des virgules")
+    parser.add_argument("--cols", default="13", help="Nombres de colonnes (5 à 500), séparés par des virgules")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"Groupes de cas parmi {', '.join(GROUPS)}")
+    parser.add_argument("--filter", default=None, help="Ne garder que les cas dont le nom contient ce texte")
+    parser.add_argument("--permutation-workers", type=int, default=None,
+                        help="Threads des tests par permutation (défaut : PERMUTATION_WORKERS, sinon nombre de cœurs)")
+    parser.add_argument("--no-render", action="store_true", help="Ne pas mesurer le rendu kaleido (PNG, SVG)")
+    parser.add_argument("--out", default=None, help="Fichier JSON de sortie (défaut : benchmarks/results/<commit>.json)")
+    return parser.parse_args(argv)
+
+
+def run_cases(cases: list[Case], args: argparse.Namespace, context: dict) -> list[dict]:
+    records = []
+    for case in cases:
+        if args.filter and args.filter not in case.name:
+            continue
+        record = {"case": case.name, "group": case.group, **context}
+        try:
+            record.update(measure(case, args.repeat, args.warmup))
+            target = "" if case.target_s is None else f"  (objectif {case.target_s * 1000:.0f} ms : {'atteint' if record['target_met'] else 'MANQUÉ'})"
+            print(f"  {case.name:<32} {record['median_s'] * 1000:>10.2f} ms{target}", file=sys.stderr)
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            print(f"  {case.name:<32} ERREUR {record['error']}", file=sys.stderr)
+        records.append(record)
+    return records
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    groups = [g for g in args.groups.split(",") if g]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        raise SystemExit(f"Groupes inconnus : {sorted(unknown)}")
+    # Lu à l'import du backend : fixé avant, pour mesurer avec le nombre de cœurs du déploiement
+    if args.permutation_workers is not None:
+        os.environ["PERMUTATION_WORKERS"] = str(args.permutation_workers)
+
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+    from backend.services.data_store import DataStore
+
+    meta = metadata(args)
+    results = []
+    with TestClient(app) as client, tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        if "permutation" in groups:
+            print(f"== tests par permutation : {PERMUTATION_N} observations, {PERMUTATION_COUNT} permutations, "
+                  f"{meta['permutation_workers']} thread(s)", file=sys.stderr)
+            results += run_cases(permutation_cases(args.seed), args, {"rows": PERMUTATION_N, "cols": 1, "csv_bytes": None})
+
+        # Les autres groupes sont mesurés sur chaque jeu synthétique
+        for cols in _sizes(args.cols) if set(groups) - {"permutation"} else []:
+            for rows in _sizes(args.rows):
+                print(f"== {rows} lignes × {cols} colonnes", file=sys.stderr)
+                csv_path = os.path.join(tmp, f"data_{rows}_{cols}.csv")
+                csv_bytes = datasets.write_csv(csv_path, rows, cols, args.seed)
+                df = datasets.generate(rows, cols, args.seed)
+
+                cases: list[Case] = []
+                if "upload" in groups:
+                    cases += upload_cases(csv_path, client)
+                if "stats" in groups:
+                    cases += stats_cases(df)
+                if "viz" in groups:
+                    cases += viz_cases(df, render=not args.no_render)
+                if "prediction" in groups:
+                    cases += prediction_cases(df, client, args.seed)
+
+                results += run_cases(cases, args, {"rows": rows, "cols": cols, "csv_bytes": csv_bytes})
+
+                DataStore.drop(SESSION)
+                DataStore.drop(UPLOAD_SESSION)
+                os.remove(csv_path)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{(meta['commit'] or 'local')[:12]}{'-dirty' if meta['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=1)
+    print(f"Résultats : {out}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
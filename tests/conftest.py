@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Snapshots et catalogue des tests hors du dépôt (avant tout import de backend)
+os.environ.setdefault("DATASTORE_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="stattest-snapshots-"))
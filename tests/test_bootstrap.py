@@ -0,0 +1,161 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from backend.services import bootstrap
+from backend.services.rank_cache import pool_sorted
+from backend.services.stats_services import _sorted_orders
+
+
+def two_sample(x, y, kind="two_sample"):
+    return bootstrap.groups_problem(pool_sorted([np.sort(x), np.sort(y)]), kind)
+
+
+def repeat(values, weights):
+    return np.repeat(values, weights)
+
+
+@pytest.fixture(scope="module")
+def samples():
+    rng = np.random.default_rng(0)
+    # Valeurs arrondies : nombreux ex-aequo, dans et entre les échantillons
+    x = np.round(rng.normal(0.0, 1.0, size=40), 1)
+    y = np.round(rng.normal(0.4, 1.2, size=55), 1)
+    z = np.round(rng.normal(0.2, 1.0, size=30), 1)
+    return x, y, z
+
+
+# ---------------------------------------------------------------- statistiques pondérées
+
+
+def random_weights(rng, n, size):
+    return np.stack([np.bincount(rng.integers(0, n, n), minlength=n) for _ in range(size)])
+
+
+def test_two_sample_weights_match_scipy(samples):
+    x, y, _ = samples
+    problem = two_sample(x, y)
+    xs, ys = np.sort(x), np.sort(y)
+    rng = np.random.default_rng(1)
+    wx, wy = random_weights(rng, len(x), 20), random_weights(rng, len(y), 20)
+    # Rééchantillons dégénérés : tout le poids sur une seule observation de chaque échantillon
+    wx[0], wy[0] = 0, 0
+    wx[0, 3], wy[0, 7] = len(x), len(y)
+    wx[1], wy[1] = 0, 0
+    wx[1, -1], wy[1, 0] = len(x), len(y)
+    got = bootstrap._two_sample_stats(problem, [wx, wy])
+    for b in range(20):
+        rx, ry = repeat(xs, wx[b]), repeat(ys, wy[b])
+        u = stats.mannwhitneyu(rx, ry).statistic
+        assert got["u"][b] == pytest.approx(u)
+        assert got["cles"][b] == pytest.approx(u / (len(rx) * len(ry)))
+        assert got["d"][b] == pytest.approx(stats.ks_2samp(rx, ry).statistic)
+
+
+def test_kruskal_weights_match_scipy(samples):
+    x, y, z = samples
+    problem = bootstrap.groups_problem(pool_sorted([np.sort(x), np.sort(y), np.sort(z)]), "kruskal")
+    sorted_samples = [np.sort(x), np.sort(y), np.sort(z)]
+    rng = np.random.default_rng(2)
+    weights = [random_weights(rng, len(s), 10) for s in sorted_samples]
+    for w in weights:
+        w[0] = 0
+        w[0, 0] = w.shape[1]
+    got = bootstrap._kruskal_stats(problem, weights)["h"]
+    for b in range(10):
+        expected = stats.kruskal(*(repeat(s, w[b]) for s, w in zip(sorted_samples, weights))).statistic
+        assert got[b] == pytest.approx(expected, rel=1e-9)
+
+
+def test_kruskal_single_value_resample_is_nan():
+    # Toutes les observations tirées ont la même valeur : H indéfini, écarté des intervalles
+    problem = bootstrap.groups_problem(pool_sorted([np.array([1.0, 2.0]), np.array([1.0, 3.0])]), "kruskal")
+    h = bootstrap._kruskal_stats(problem, [np.array([[2, 0]]), np.array([[2, 0]])])["h"]
+    assert np.isnan(h[0])
+
+
+def test_spearman_weights_match_scipy(samples):
+    x, y, _ = samples
+    y = y[:len(x)] + x
+    problem = bootstrap.spearman_problem(*_sorted_orders(x, y))
+    rng = np.random.default_rng(3)
+    w = random_weights(rng, len(x), 20)
+    w[0] = 0
+    w[0, 5] = len(x)            # une seule ligne tirée : corrélation indéfinie
+    got = bootstrap._spearman_stats(problem, [w])["rho"]
+    assert np.isnan(got[0])
+    for b in range(1, 20):
+        expected = stats.spearmanr(repeat(x, w[b]), repeat(y, w[b])).statistic
+        assert got[b] == pytest.approx(expected, abs=1e-12)
+
+
+# ---------------------------------------------------------------- intervalles contre scipy.stats.bootstrap
+
+
+N_RESAMPLES = 20000
+SCIPY_RESAMPLES = 5000
+# Écart toléré entre les bornes : 0,2 écart-type bootstrap (erreur Monte-Carlo des deux côtés,
+# environ 0,03 écart-type à ces nombres de rééchantillons, et jackknife groupé pour le BCa)
+TOLERANCE = 0.2
+
+
+def compare(ours: dict, theirs, se: float):
+    assert ours["se"] == pytest.approx(se, rel=0.05)
+    assert abs(ours["low"] - theirs.confidence_interval.low) <= TOLERANCE * se
+    assert abs(ours["high"] - theirs.confidence_interval.high) <= TOLERANCE * se
+
+
+@pytest.mark.parametrize("method", ["percentile", "bca"])
+def test_mann_whitney_interval(samples, method):
+    x, y, _ = samples
+    res = bootstrap.bootstrap_intervals(two_sample(x, y), N_RESAMPLES, method=method, seed=4, workers=1)
+    theirs = stats.bootstrap(
+        (x, y), lambda a, b: stats.mannwhitneyu(a, b).statistic, vectorized=False, paired=False,
+        n_resamples=SCIPY_RESAMPLES, method="BCa" if method == "bca" else method, random_state=5,
+    )
+    u = res["intervals"]["u"]
+    assert u["estimate"] == pytest.approx(stats.mannwhitneyu(x, y).statistic)
+    compare(u, theirs, theirs.standard_error)
+
+
+@pytest.mark.parametrize("method", ["percentile", "bca"])
+def test_kruskal_interval(samples, method):
+    x, y, z = samples
+    problem = bootstrap.groups_problem(pool_sorted([np.sort(x), np.sort(y), np.sort(z)]), "kruskal")
+    res = bootstrap.bootstrap_intervals(problem, N_RESAMPLES, method=method, seed=6, workers=1)
+    theirs = stats.bootstrap(
+        (x, y, z), lambda *s: stats.kruskal(*s).statistic, vectorized=False, paired=False,
+        n_resamples=SCIPY_RESAMPLES, method="BCa" if method == "bca" else method, random_state=7,
+    )
+    compare(res["intervals"]["h"], theirs, theirs.standard_error)
+
+
+@pytest.mark.parametrize("method", ["percentile", "bca"])
+def test_spearman_interval(samples, method):
+    x, y, _ = samples
+    y = y[:len(x)] + x
+    res = bootstrap.bootstrap_intervals(
+        bootstrap.spearman_problem(*_sorted_orders(x, y)), N_RESAMPLES, method=method, seed=8, workers=1,
+    )
+    theirs = stats.bootstrap(
+        (x, y), lambda a, b: stats.spearmanr(a, b).statistic, vectorized=False, paired=True,
+        n_resamples=SCIPY_RESAMPLES, method="BCa" if method == "bca" else method, random_state=9,
+    )
+    compare(res["intervals"]["rho"], theirs, theirs.standard_error)
+
+
+def test_degenerate_resamples_are_dropped():
+    # Deux lignes : la moitié des rééchantillons tire deux fois la même ligne (rho indéfini)
+    x, y = np.array([1.0, 2.0]), np.array([3.0, 5.0])
+    res = bootstrap.bootstrap_intervals(bootstrap.spearman_problem(*_sorted_orders(x, y)), 1000, seed=1, workers=1)
+    rho = res["intervals"]["rho"]
+    assert rho["estimate"] == 1.0
+    assert rho["low"] == rho["high"] == 1.0
+
+
+def test_seed_reproducible(samples):
+    x, y, _ = samples
+    problem = two_sample(x, y)
+    one = bootstrap.bootstrap_intervals(problem, 3000, method="bca", seed=11, workers=1)
+    again = bootstrap.bootstrap_intervals(problem, 3000, method="bca", seed=11, workers=1)
+    assert one == again
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from backend.services import global_analysis as ga
+from backend.services.profile import build_profile
+from backend.services.rank_cache import RankCache
+from backend.services.utils import pool
+
+
+@pytest.fixture(scope="module")
+def prepared():
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        "x": rng.normal(size=n),
+        "y": np.round(rng.normal(size=n), 1),
+        "g": rng.choice(["a", "b", "c"], n),
+        "h": rng.choice(["u", "v"], n),
+    })
+    df.loc[rng.random(n) < 0.1, "x"] = np.nan
+    df.loc[rng.random(n) < 0.1, "g"] = None
+    profile = build_profile(df)
+    state, header = ga.prepare_global(df, profile, RankCache(profile))
+    return df, state, header
+
+
+def parse(lines):
+    return [json.loads(line) for line in lines]
+
+
+def test_state_holds_only_sorted_values(prepared):
+    _, state, _ = prepared
+    assert set(state) == {"codes", "ranks", "rows"}
+    col = state["ranks"]["x"]
+    assert isinstance(col, ga.SortedColumn) and col.order.dtype == np.uint16
+    assert np.array_equal(np.sort(col.values), col.values)
+
+
+def test_pairs_match_scipy(prepared):
+    df, state, header = prepared
+    out = parse(ga.stream_global(state, header, workers=1))
+    assert out[0]["type"] == "meta" and out[-1]["type"] == "done" and out[-1]["errors"] == 0
+    pair = next(r for r in out if r.get("categorical") == "g" and r.get("numeric") == "x")
+    samples = [df.loc[df["g"] == g, "x"].dropna() for g in pair["groups"]]
+    assert pair["kruskal"]["statistic"] == pytest.approx(stats.kruskal(*samples).statistic)
+    assert pair["ks"]["statistic"] == pytest.approx(stats.ks_2samp(*samples[:2]).statistic)
+
+
+def test_pool_matches_single_process(prepared, monkeypatch):
+    _, state, header = prepared
+    monkeypatch.setattr(ga, "PARALLEL_MIN_CELLS", 0)
+    single = parse(ga.stream_global(state, header, workers=1))
+    pooled = parse(ga.stream_global(state, header, workers=2))
+    assert pooled[0]["workers"] == 2
+    key = lambda r: (r["categorical"], r["numeric"])
+    assert sorted(single[1:-1], key=key) == sorted(pooled[1:-1], key=key)
+
+
+def test_shared_arrays_fall_back_to_temp_dir(monkeypatch):
+    # Mémoire partagée trop petite : fichier écrit dans le dossier temporaire
+    monkeypatch.setattr(pool, "SHARED_DIR", tempfile.mkdtemp(prefix="shm-"))
+    monkeypatch.setattr(pool, "_free_bytes", lambda directory: 0)
+    with pool.SharedArrays({"a": np.arange(10.0)}) as shared:
+        assert os.path.dirname(shared.path) == tempfile.gettempdir()
+        assert np.array_equal(pool.attach(shared.handle)["a"], np.arange(10.0))
+    assert not os.path.exists(shared.path)
+
+
+def test_failure_mid_stream_becomes_error_line(prepared, monkeypatch):
+    _, state, header = prepared
+    calls = []
+
+    def failing(state, cat, num):
+        calls.append(1)
+        if len(calls) == 2:
+            raise MemoryError("plus de mémoire")
+        return {"type": "pair", "categorical": cat, "numeric": num}
+
+    monkeypatch.setattr(ga, "analyse_pair", failing)
+    out = parse(ga.stream_global(state, header, workers=1))
+    assert [r["type"] for r in out] == ["meta", "pair", "error"]
+    assert out[-1]["pairs_done"] == 1
@@ -0,0 +1,101 @@
+import asyncio
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from backend.services import ingest
+
+
+def csv_bytes(n: int) -> bytes:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"x": rng.normal(size=n), "g": rng.choice(["a", "b"], n), "d": "2024-05-01"})
+    return df.to_csv(index=False, sep=";").encode()
+
+
+def spooled(data: bytes) -> UploadFile:
+    """Fichier comme le construit Starlette : en mémoire jusqu'à 1 Mo, puis sur disque."""
+    from tempfile import SpooledTemporaryFile
+    f = SpooledTemporaryFile(max_size=1024 * 1024)
+    f.write(data)
+    f.seek(0)
+    return UploadFile(f, size=len(data), filename="data.csv", headers=Headers({"content-type": "text/csv"}))
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._data.readinto(b)
+
+
+@pytest.mark.parametrize("rows", [100, 60000])
+def test_reads_spooled_upload_without_copy(monkeypatch, rows):
+    data = csv_bytes(rows)
+
+    async def no_copy(*args, **kwargs):
+        raise AssertionError("copie inutile")
+
+    monkeypatch.setattr(ingest, "spool_upload", no_copy)
+    upload = spooled(data)
+    assert upload.file._rolled == (len(data) > 1024 * 1024)
+    df, info = asyncio.run(ingest.ingest_csv(upload))
+    expected = pd.read_csv(io.BytesIO(data), sep=";")
+    assert info["sep"] == ";" and info["size_mb"] == round(len(data) / (1024 * 1024), 3)
+    assert df.shape == expected.shape
+    assert np.allclose(df["x"].to_numpy(float), expected["x"].to_numpy())
+    assert list(df["d"].astype(str).unique()) == ["2024-05-01"]
+
+
+def test_unseekable_upload_falls_back_to_copy():
+    data = csv_bytes(100)
+    upload = UploadFile(io.BufferedReader(Unseekable(data)), filename="data.csv")
+    assert ingest.buffered_upload(upload) is None
+    df, info = asyncio.run(ingest.ingest_csv(upload))
+    assert df.shape == (100, 3) and info["sep"] == ";"
+
+
+def test_dates_kept_as_text_in_a_single_parse(monkeypatch, tmp_path):
+    import pyarrow.csv as pacsv
+
+    path = tmp_path / "dates.csv"
+    path.write_bytes(b"d,t,x\n2024-01-01,2024-01-01 10:00:00,1\n2024-01-02,,2\n")
+    calls = []
+    read_csv = pacsv.read_csv
+    monkeypatch.setattr(pacsv, "read_csv", lambda *a, **k: calls.append(1) or read_csv(*a, **k))
+    df, engine = ingest.read_csv_file(str(path), ",")
+    assert engine == "pyarrow" and len(calls) == 1
+    assert df["d"].tolist() == ["2024-01-01", "2024-01-02"]
+    assert df["t"].tolist() == ["2024-01-01 10:00:00", None]
+
+
+def test_parse_does_not_block_event_loop(monkeypatch):
+    import time
+
+    def slow_read(source, sep):
+        time.sleep(0.3)
+        return pd.DataFrame({"x": [1.0]}), "c"
+
+    monkeypatch.setattr(ingest, "read_csv_file", slow_read)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.02)
+
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(ingest.ingest_csv(spooled(csv_bytes(10))), ticker())
+        return started
+
+    started = asyncio.run(main())
+    # La boucle a continué de tourner pendant la lecture
+    assert len(ticks) == 5 and ticks[-1] - started < 0.25
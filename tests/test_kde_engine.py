@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from backend.services import kde_engine
+
+
+def distributions():
+    rng = np.random.default_rng(0)
+    return {
+        "normal": rng.normal(3.0, 2.0, size=4000),
+        "lognormal": rng.lognormal(0.0, 0.8, size=3000),
+        "bimodal": np.r_[rng.normal(-4.0, 1.0, size=1500), rng.normal(5.0, 0.5, size=800)],
+        "rounded": np.round(rng.normal(size=2000), 1),
+    }
+
+
+def exact(values: np.ndarray, h: float, xs: np.ndarray) -> np.ndarray:
+    """KDE exact de référence, à la largeur de bande h (facteur relatif à l'écart-type chez scipy)."""
+    return stats.gaussian_kde(values, bw_method=h / values.std(ddof=1))(xs)
+
+
+def assert_close(density: np.ndarray, expected: np.ndarray):
+    # Tolérance annoncée par le module : 1e-3 × la densité maximale
+    assert np.abs(density - expected).max() <= kde_engine.TOLERANCE * expected.max()
+
+
+@pytest.mark.parametrize("name", ["normal", "lognormal", "bimodal", "rounded"])
+@pytest.mark.parametrize("method", kde_engine.BANDWIDTHS)
+def test_matches_gaussian_kde(name, method):
+    values = np.sort(distributions()[name])
+    res = kde_engine.kde(values, method)
+    assert res["n"] == len(values) and len(res["x"]) == kde_engine.KDE_POINTS
+    assert_close(res["density"], exact(values, res["bandwidth"], res["x"]))
+
+
+def test_scott_is_gaussian_kde_default():
+    values = np.sort(distributions()["lognormal"])
+    res = kde_engine.kde(values, "scott")
+    reference = stats.gaussian_kde(values)
+    assert res["bandwidth"] == pytest.approx(np.sqrt(reference.covariance[0, 0]), rel=1e-12)
+    assert_close(res["density"], reference(res["x"]))
+
+
+def test_silverman_bandwidth():
+    values = np.sort(distributions()["bimodal"])
+    q25, q75 = np.percentile(values, [25, 75])
+    expected = 0.9 * min(values.std(ddof=1), (q75 - q25) / 1.349) * len(values) ** -0.2
+    assert kde_engine.bandwidth(kde_engine.summarize(values), "silverman") == pytest.approx(expected, rel=1e-12)
+
+
+def test_grouped_matches_gaussian_kde_per_group():
+    data = distributions()
+    names = ["normal", "lognormal", "bimodal"]
+    values = np.concatenate([data[k] for k in names])
+    labels = np.repeat(np.arange(3), [len(data[k]) for k in names])
+    order = np.argsort(values, kind="stable")
+    res = kde_engine.grouped_kde(values[order], labels[order], 3, "silverman")
+    assert res["groups"] == [0, 1, 2] and res["errors"] == {}
+    for g, name in enumerate(names):
+        assert res["n"][g] == len(data[name])
+        assert_close(res["density"][g], exact(data[name], res["bandwidth"][g], res["x"]))
+
+
+@pytest.mark.parametrize("values", [[2.5], [1.0, 1.0, 1.0]])
+def test_single_value_column(values):
+    # Une seule valeur (ou une valeur répétée) : densité non définie, comme gaussian_kde
+    with pytest.raises(ValueError):
+        kde_engine.kde(np.asarray(values))
+
+
+def test_grouped_skips_single_value_group():
+    rng = np.random.default_rng(1)
+    a, b = rng.normal(size=500), np.array([0.3])
+    values = np.r_[a, b]
+    labels = np.r_[np.zeros(len(a), dtype=int), 1]
+    order = np.argsort(values, kind="stable")
+    res = kde_engine.grouped_kde(values[order], labels[order], 2)
+    assert res["groups"] == [0] and set(res["errors"]) == {1}
+    assert_close(res["density"][0], exact(a, res["bandwidth"][0], res["x"]))
+    with pytest.raises(ValueError):
+        kde_engine.grouped_kde(b, np.array([1]), 2)
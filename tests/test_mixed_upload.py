@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from scipy import stats
+
+from backend.main import app
+from backend.services import stats_services as ss
+from backend.services.data_store import DataStore
+
+SESSION = "mixed-upload"
+HEADERS = {"X-Session-ID": SESSION}
+
+
+@pytest.fixture(scope="module")
+def raw():
+    rng = np.random.default_rng(0)
+    n = 300
+    df = pd.DataFrame({
+        "age": rng.integers(20, 80, n),
+        "bmi": np.round(rng.normal(27, 4, n), 1),
+        "sex": rng.choice(["F", "M"], n),
+        "region": rng.choice(["nord", "sud", "est", "ouest"], n),
+        "patient": [f"p{i:05d}" for i in range(n)],
+        "visit": pd.date_range("2024-01-01", periods=n, freq="D").strftime("%Y-%m-%d"),
+        "flag": rng.choice([True, False], n),
+    })
+    df.loc[rng.random(n) < 0.1, "bmi"] = np.nan
+    df.loc[rng.random(n) < 0.1, "region"] = np.nan
+    return df.to_csv(index=False).encode()
+
+
+@pytest.fixture(scope="module")
+def client(raw):
+    # Sans `with` : pas de démarrage des pools de calcul et de rendu
+    client = TestClient(app)
+    res = client.post("/data/upload", files={"file": ("mixed.csv", raw, "text/csv")}, headers=HEADERS)
+    assert res.json()["rows"] == 300
+    yield client
+    DataStore.drop(SESSION)
+
+
+@pytest.fixture(scope="module")
+def baseline(raw):
+    """Lecture pandas sans compaction : colonnes texte en `object`."""
+    return pd.read_csv(io.BytesIO(raw))
+
+
+def test_compacted_dtypes(client):
+    df = DataStore.get_df(SESSION)
+    dtypes = df.dtypes
+    assert str(dtypes["age"]) == "int8"
+    assert isinstance(dtypes["sex"], pd.CategoricalDtype) and isinstance(dtypes["region"], pd.CategoricalDtype)
+    # Dates laissées en texte, comme avec le lecteur de pandas
+    assert pd.api.types.is_string_dtype(dtypes["visit"]) and df["visit"].iloc[0] == "2024-01-01"
+    columns = client.get("/data/columns", headers=HEADERS).json()
+    assert columns["numeric"] == ["age", "bmi"]
+    assert {"sex", "region"} <= set(columns["categorical"])
+
+
+def test_rank_tests_match_scipy(client, baseline):
+    age, bmi = baseline["age"].to_numpy(float), baseline["bmi"].dropna().to_numpy()
+    res = client.post("/stats/mannwhitney", json={"var1": "age", "var2": "bmi"}, headers=HEADERS).json()
+    assert res["statistic"] == pytest.approx(stats.mannwhitneyu(age, bmi).statistic)
+    res = client.post("/stats/ks", json={"var1": "age", "var2": "bmi"}, headers=HEADERS).json()
+    assert res["statistic"] == pytest.approx(stats.ks_2samp(age, bmi).statistic)
+    pair = baseline[["age", "bmi"]].dropna()
+    res = client.post("/stats/spearman", json={"var1": "age", "var2": "bmi"}, headers=HEADERS).json()
+    assert res["correlation"] == pytest.approx(stats.spearmanr(pair["age"], pair["bmi"]).statistic, abs=1e-12)
+
+
+def test_chi2_on_categories_matches_object_columns(client, baseline):
+    res = client.post("/stats/chi2", json={"var1": "sex", "var2": "region"}, headers=HEADERS)
+    assert res.status_code == 200
+    expected = stats.chi2_contingency(pd.crosstab(baseline["sex"], baseline["region"]))
+    assert res.json()["statistic"] == pytest.approx(expected.statistic)
+    assert res.json()["degrees_of_freedom"] == expected.dof
+
+
+def test_non_numeric_compacted_columns_are_reported():
+    df = DataStore.get_df(SESSION)
+    # Colonnes `category` et chaînes pyarrow : erreur explicite, pas d'exception de NumPy
+    assert "error" in ss.spearman_test(df, "age", "patient")
+    assert "error" in ss.mann_whitney_test(df, "sex", "region")
+    assert "error" in ss.kruskal_wallis_test(df, "region", "sex")
+    res = ss.mann_whitney_test(df, "sex", "bmi")
+    first, second = (df.loc[df["sex"] == g, "bmi"].dropna() for g in res["groups"])
+    assert res["statistic"] == pytest.approx(stats.mannwhitneyu(first, second).statistic)
@@ -0,0 +1,113 @@
+import itertools
+from fractions import Fraction
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from backend.services import permutation
+
+
+def exact_p_value(ranks, sizes):
+    """P-value exacte : toutes les répartitions des rangs en groupes, Σ n_g·(R̄_g − R̄)² en fractions."""
+    ranks = [Fraction(r) for r in ranks]
+    mean = sum(ranks) / len(ranks)
+
+    def statistic(groups):
+        return sum(len(g) * (sum(g) / len(g) - mean) ** 2 for g in groups)
+
+    def partitions(indices, sizes):
+        if len(sizes) == 1:
+            yield [indices]
+            return
+        for chosen in itertools.combinations(indices, sizes[0]):
+            rest = [i for i in indices if i not in chosen]
+            for tail in partitions(rest, sizes[1:]):
+                yield [list(chosen)] + tail
+
+    starts = np.r_[0, np.cumsum(sizes)[:-1]]
+    observed = statistic([ranks[s:s + m] for s, m in zip(starts, sizes)])
+    values = [statistic([[ranks[i] for i in g] for g in part]) for part in partitions(list(range(len(ranks))), list(sizes))]
+    return sum(v >= observed for v in values) / len(values)
+
+
+CASES = [
+    ([1, 2, 3, 4, 5, 6, 7, 8], [4, 4]),
+    ([1, 1, 2, 3, 3, 4, 5, 5, 6], [4, 5]),
+    ([5, 5, 5, 5, 5, 1, 2, 3], [3, 5]),
+    ([1, 1, 2, 3, 3, 3, 4, 5, 6], [3, 3, 3]),
+    ([2, 1, 4, 3, 6, 5, 8, 7], [2, 3, 3]),
+]
+
+
+@pytest.mark.parametrize("subsets", [True, False])
+@pytest.mark.parametrize("values, sizes", CASES)
+def test_matches_exact_p_value(monkeypatch, values, sizes, subsets):
+    # Les deux tirages (sous-ensembles, mélange complet) sur les mêmes petits jeux
+    monkeypatch.setattr(permutation, "SUBSET_N_PER_GROUP", 1 if subsets else 10 ** 9)
+    if not subsets:
+        monkeypatch.setattr(permutation, "SUBSET_MAX_GROUPS", 1)
+    ranks = stats.rankdata(values)
+    exact = exact_p_value(ranks, sizes)
+    n_permutations = 20000
+    result = permutation.rank_permutation_test(ranks, sizes, n_permutations=n_permutations, seed=7, tolerance=0)
+    assert result["n_permutations"] == n_permutations
+    # Égalités avec la statistique observée comptées : écart limité à l'erreur Monte-Carlo (4,5 σ)
+    sigma = np.sqrt(exact * (1 - exact) / n_permutations) + 1 / n_permutations
+    assert abs(result["p_value"] - exact) <= 4.5 * sigma
+
+
+def test_large_two_groups_close_to_mann_whitney():
+    # Centrage : la p-value ne dépend plus de la grande constante Σ R²/n (n = 3000)
+    rng = np.random.default_rng(1)
+    x, y = rng.normal(size=1500), rng.normal(0.08, 1, size=1500)
+    ranks = stats.rankdata(np.r_[x, y])
+    result = permutation.rank_permutation_test(ranks, [1500, 1500], n_permutations=20000, seed=3, tolerance=0)
+    expected = stats.mannwhitneyu(x, y, method="asymptotic").pvalue
+    assert abs(result["p_value"] - expected) <= 4.5 * np.sqrt(expected * (1 - expected) / 20000)
+
+
+def test_large_three_groups_close_to_kruskal():
+    rng = np.random.default_rng(2)
+    groups = [rng.normal(mu, 1, size=1000) for mu in (0, 0.05, 0.1)]
+    ranks = stats.rankdata(np.concatenate(groups))
+    result = permutation.rank_permutation_test(ranks, [1000, 1000, 1000], n_permutations=20000, seed=4, tolerance=0)
+    expected = stats.kruskal(*groups).pvalue
+    assert abs(result["p_value"] - expected) <= 4.5 * np.sqrt(expected * (1 - expected) / 20000) + 0.005
+
+
+@pytest.mark.parametrize("sizes", [[3, 5], [2, 2, 4]])
+def test_subsets_are_uniform(sizes):
+    # Rangs puissances de 2 : la somme identifie le sous-ensemble tiré
+    subsets = permutation._Subsets(2 ** np.arange(8, dtype=np.int64))
+    sums = permutation._batch_subsets(subsets, np.asarray(sizes), 100000, np.random.SeedSequence(5))
+    assert (sums.sum(axis=1) == 255).all()
+    _, counts = np.unique(sums[:, :-1], axis=0, return_counts=True)
+    expected = len(list(itertools.combinations(range(8), sizes[0])))
+    if len(sizes) == 3:
+        expected *= len(list(itertools.combinations(range(8 - sizes[0]), sizes[1])))
+    assert len(counts) == expected
+    assert stats.chisquare(counts).pvalue > 1e-4
+
+
+def test_group_masks_are_consistent():
+    # Masques des groupes intermédiaires : taille exacte, disjoints, sommes cohérentes
+    n = 203
+    values = np.arange(1, n + 1, dtype=np.int64) * 2
+    subsets = permutation._Subsets(values)
+    rng = np.random.default_rng(0)
+    first, first_sums = subsets.draw(rng, 500, None, n, 60)
+    available = subsets.full & ~first
+    second, second_sums = subsets.draw(rng, 500, available, n - 60, 90)
+    first_bits = np.unpackbits(first, axis=1)[:, :n]
+    second_bits = np.unpackbits(second, axis=1)[:, :n]
+    assert (first_bits.sum(axis=1) == 60).all() and (second_bits.sum(axis=1) == 90).all()
+    assert not (first_bits & second_bits).any()
+    assert (first_bits @ values == first_sums).all() and (second_bits @ values == second_sums).all()
+
+
+def test_seed_reproducible():
+    ranks = stats.rankdata(np.random.default_rng(3).normal(size=500))
+    a = permutation.rank_permutation_test(ranks, [200, 300], n_permutations=5000, seed=11)
+    b = permutation.rank_permutation_test(ranks, [200, 300], n_permutations=5000, seed=11)
+    assert a == b
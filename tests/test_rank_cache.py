@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from backend.services import stats_services as ss
+from backend.services.profile import build_profile
+from backend.services.rank_cache import RankCache, average_ranks_sorted, pool_sorted
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    n = 60
+    df = pd.DataFrame({
+        "x": rng.normal(size=n),
+        "ties": rng.integers(0, 5, size=n).astype(float),
+        "y": rng.normal(size=n),
+        "constant": np.full(n, 2.0),
+        "two": np.r_[1.0, 3.0, np.full(n - 2, np.nan)],
+        "one": np.r_[4.0, np.full(n - 1, np.nan)],
+    })
+    df["y"] += df["x"] * 0.5
+    df.loc[rng.random(n) < 0.2, "x"] = np.nan
+    df.loc[rng.random(n) < 0.3, "ties"] = np.nan
+    return df
+
+
+@pytest.fixture(scope="module")
+def ranks(frame):
+    return RankCache(build_profile(frame))
+
+
+def present(frame, *cols):
+    return [frame[c].dropna().to_numpy() for c in cols]
+
+
+# ---------------------------------------------------------------- rangs
+
+
+@pytest.mark.parametrize("values", [[], [3.0], [1.0, 1.0], [1, 2, 2, 2, 5, 7, 7], list(range(10))])
+def test_average_ranks_sorted(values):
+    values = np.sort(np.asarray(values, dtype=float))
+    got, tie_term = average_ranks_sorted(values)
+    assert np.allclose(got, stats.rankdata(values))
+    _, counts = np.unique(values, return_counts=True)
+    assert tie_term == float((counts ** 3 - counts).sum())
+
+
+@pytest.mark.parametrize("col", ["x", "ties", "constant", "two", "one"])
+def test_column_ranks_skip_missing(frame, ranks, col):
+    entry = ranks.column(col)
+    values = frame[col].to_numpy()
+    expected = stats.rankdata(values, nan_policy="omit")
+    assert entry.n == np.count_nonzero(~np.isnan(values))
+    assert entry.complete == (entry.n == len(values))
+    assert np.array_equal(np.isnan(entry.ranks), np.isnan(values))
+    assert np.allclose(entry.ranks[~np.isnan(values)], expected[~np.isnan(values)])
+    assert np.array_equal(entry.values, np.sort(values[~np.isnan(values)]))
+
+
+def test_paired_ranks_rerank_shared_rows(frame, ranks):
+    rx, ry = ranks.paired_ranks("x", "ties")
+    pair = frame[["x", "ties"]].dropna()
+    assert np.allclose(rx, stats.rankdata(pair["x"]))
+    assert np.allclose(ry, stats.rankdata(pair["ties"]))
+
+
+def test_grouped_matches_pooled_samples(frame, ranks):
+    codes = np.where(frame["ties"].isna(), -1, (frame["ties"].fillna(0) % 2).astype(int))
+    grouped = ranks.grouped("y", codes, 2)
+    pooled = pool_sorted([np.sort(frame["y"][codes == g].to_numpy()) for g in range(2)])
+    assert np.array_equal(grouped.values, pooled.values)
+    assert np.allclose(grouped.rank_sums(), pooled.rank_sums())
+    assert grouped.tie_term == pooled.tie_term
+    assert list(grouped.sizes) == list(pooled.sizes)
+
+
+# ---------------------------------------------------------------- tests à partir des rangs
+
+
+@pytest.mark.parametrize("a, b", [("x", "y"), ("x", "ties"), ("ties", "y"), ("y", "y")])
+def test_spearman(frame, ranks, a, b):
+    res = ss.spearman_columns(ranks, a, b)
+    pair = frame[[a, b]].dropna() if a != b else frame[[a]].dropna()
+    expected = stats.spearmanr(pair.iloc[:, 0], pair.iloc[:, -1])
+    assert res["n"] == len(pair)
+    assert res["correlation"] == pytest.approx(expected.statistic, abs=1e-12)
+    assert res["p_value"] == pytest.approx(max(expected.pvalue, 1e-16), rel=1e-9, abs=1e-15)
+
+
+@pytest.mark.parametrize("a, b", [("x", "constant"), ("x", "two")])
+def test_spearman_degenerate(ranks, a, b):
+    # Colonne constante, ou moins de 3 lignes communes : corrélation indéfinie (comme scipy)
+    corr, p, _ = ss._spearman_from_ranks(*ranks.paired_ranks(a, b))
+    assert np.isnan(corr) and np.isnan(p)
+
+
+def test_spearman_from_groups(frame):
+    values = frame["y"].to_numpy()
+    codes = frame["ties"].fillna(-1).astype(int).to_numpy()
+    keep = codes >= 0
+    pooled = pool_sorted([np.sort(values[keep & (codes == g)]) for g in range(5)])
+    rs, p, n = ss._spearman_from_groups(pooled.rank_sums(), pooled.sizes, pooled.tie_term)
+    expected = stats.spearmanr(values[keep], codes[keep])
+    assert n == keep.sum()
+    assert rs == pytest.approx(expected.statistic, abs=1e-12)
+    assert p == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+@pytest.mark.parametrize("a, b", [("x", "y"), ("ties", "y"), ("ties", "constant"), ("one", "x"), ("two", "one")])
+def test_mann_whitney(frame, ranks, a, b):
+    res = ss.mann_whitney_columns(ranks, a, b)
+    x, y = present(frame, a, b)
+    expected = stats.mannwhitneyu(x, y, alternative="two-sided")
+    assert (res["n1"], res["n2"]) == (len(x), len(y))
+    assert res["statistic"] == pytest.approx(expected.statistic)
+    assert res["p_value"] == pytest.approx(max(expected.pvalue, 1e-16), rel=1e-9)
+
+
+@pytest.mark.parametrize("cols", [["x", "y", "ties"], ["x", "constant"], ["ties", "constant", "two"]])
+def test_kruskal(frame, ranks, cols):
+    res = ss.kruskal_columns(ranks, cols)
+    expected = stats.kruskal(*present(frame, *cols))
+    assert res["statistic"] == pytest.approx(expected.statistic, rel=1e-12)
+    assert res["p_value"] == pytest.approx(max(expected.pvalue, 1e-16), rel=1e-9)
+
+
+def test_kruskal_identical_values():
+    # Toutes les valeurs égales : erreur comme scipy, renvoyée dans le résultat
+    res = ss.kruskal_columns(RankCache(build_profile(pd.DataFrame({"a": [1.0] * 4, "b": [1.0, 1.0, 1.0, np.nan]}))), ["a", "b"])
+    assert "error" in res
+
+
+@pytest.mark.parametrize("a, b", [("x", "y"), ("ties", "y"), ("ties", "constant"), ("one", "x"), ("two", "ties")])
+def test_ks(frame, ranks, a, b):
+    res = ss.ks_columns(ranks, a, b)
+    expected = stats.ks_2samp(*present(frame, a, b))
+    assert res["statistic"] == pytest.approx(expected.statistic)
+    assert res["p_value"] == pytest.approx(max(expected.pvalue, 1e-16), rel=1e-9)
+
+
+def test_ks_large_samples():
+    # Au-delà de 10 000 valeurs, D est lu sur l'échantillon regroupé (loi asymptotique)
+    rng = np.random.default_rng(1)
+    x, y = np.round(rng.normal(size=12000), 2), np.round(rng.normal(0.02, 1, size=15000), 2)
+    stat, p = ss._ks_from_pooled(pool_sorted([np.sort(x), np.sort(y)]))
+    expected = stats.ks_2samp(x, y, method="asymp")
+    assert stat == pytest.approx(expected.statistic, abs=1e-12)
+    assert p == pytest.approx(expected.pvalue, rel=1e-6)
+
+
+@pytest.mark.parametrize("k, ties", [(3, False), (4, True), (5, True)])
+def test_friedman(k, ties):
+    rng = np.random.default_rng(k)
+    arrays = [rng.normal(size=30) for _ in range(k)]
+    if ties:
+        arrays = [np.round(a) for a in arrays]
+        arrays[1][:5] = arrays[0][:5]
+    stat, p = ss._friedman_arrays(arrays)
+    expected = stats.friedmanchisquare(*arrays)
+    assert stat == pytest.approx(expected.statistic, rel=1e-12)
+    assert p == pytest.approx(expected.pvalue, rel=1e-9)
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from backend.services import result_cache
+from backend.services.data_store import DataStore
+
+
+@pytest.fixture
+def sessions():
+    result_cache.clear()
+    frame = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": ["x", "y", "x"]})
+    for session in ("rc-a", "rc-b"):
+        DataStore.set_df(frame.copy(), session)
+    yield "rc-a", "rc-b"
+    for session in ("rc-a", "rc-b"):
+        DataStore.drop(session)
+
+
+def compute_once(session: str, calls: list) -> dict:
+    return result_cache.cached_result(session, "test", ["a"], None, lambda: calls.append(1) or {"value": len(calls)})
+
+
+def test_same_content_shares_results(sessions):
+    a, b = sessions
+    calls = []
+    assert compute_once(a, calls) == compute_once(b, calls) == {"value": 1}
+    assert len(calls) == 1
+
+
+def test_replacing_one_session_keeps_shared_results(sessions):
+    a, b = sessions
+    calls = []
+    compute_once(a, calls)
+    # Empreinte connue de la session b (calculée à sa première requête de statistiques)
+    DataStore.fingerprint(b)
+    DataStore.set_df(pd.DataFrame({"a": [5.0, 6.0]}), a)
+    assert result_cache.is_cached(b, "test", ["a"])
+    compute_once(b, calls)
+    assert len(calls) == 1
+    # Plus aucune session n'a ce contenu : ses résultats sont supprimés
+    before = result_cache.cache_stats()["invalidated"]
+    DataStore.drop(b)
+    assert result_cache.cache_stats()["invalidated"] == before + 1
+
+
+def test_dropping_last_session_invalidates(sessions):
+    a, b = sessions
+    calls = []
+    compute_once(a, calls)
+    DataStore.drop(b)
+    DataStore.drop(a)
+    assert result_cache.cache_stats()["entries"] == 0
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from backend.services.profile import build_profile
+from backend.services.rank_cache import RankCache
+from backend.services.stats_services import spearman_columns, spearman_matrix
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    n = 400
+    x = rng.normal(size=(n, 8))
+    x[:, 1] = x[:, 0] + rng.normal(size=n) * 0.5
+    x[:, 2] = np.round(x[:, 2])               # ex-aequo
+    x[:, 3] = 3.0                             # constante
+    x[rng.random(n) < 0.2, 4] = np.nan
+    x[rng.random(n) < 0.5, 5] = np.nan
+    x[rng.random(n) < 0.3, 6] = np.nan
+    x[2:, 7] = np.nan                         # deux valeurs seulement
+    return pd.DataFrame(x, columns=[f"c{j}" for j in range(8)])
+
+
+def reference(df):
+    k = df.shape[1]
+    rho, n = np.full((k, k), np.nan), np.zeros((k, k), dtype=int)
+    for i in range(k):
+        for j in range(k):
+            pair = df.iloc[:, [i, j]].dropna()
+            n[i, j] = len(pair)
+            if len(pair) >= 3:
+                rho[i, j] = stats.spearmanr(pair.iloc[:, 0], pair.iloc[:, 1]).statistic
+                if i == j and not np.isnan(rho[i, j]):
+                    rho[i, j] = 1.0
+    return rho, n
+
+
+def as_array(matrix):
+    return np.array([[np.nan if v is None else v for v in row] for row in matrix])
+
+
+# Sans `exact`, rangs de la colonne entière sous le masque de la paire : approximation documentée
+@pytest.mark.parametrize("exact, tolerance", [(True, 1e-12), (False, 1e-2)])
+@pytest.mark.parametrize("max_memory_mb", [256, 0.01])
+def test_matches_scipy(frame, exact, tolerance, max_memory_mb):
+    result = spearman_matrix(RankCache(build_profile(frame)), list(frame.columns), max_memory_mb=max_memory_mb, exact=exact)
+    expected, n = reference(frame)
+    assert result["approximate"] == (not exact)
+    rho = as_array(result["correlation"])
+    assert (np.array(result["n"]) == n).all()
+    assert (np.isnan(rho) == np.isnan(expected)).all()
+    both = ~np.isnan(expected)
+    assert np.abs(rho[both] - expected[both]).max() <= tolerance
+    # Paires complètes : toujours identiques à scipy
+    complete = [0, 1, 2, 3]
+    block = np.ix_(complete, complete)
+    assert np.allclose(np.nan_to_num(rho[block]), np.nan_to_num(expected[block]), atol=1e-12)
+
+
+def test_default_matches_single_pair(frame):
+    # Par défaut, chaque cellule est celle de /stats/spearman (corrélation et p-value)
+    ranks = RankCache(build_profile(frame))
+    result = spearman_matrix(ranks, list(frame.columns))
+    assert result["exact"] and not result["approximate"]
+    for a, b in [("c0", "c4"), ("c4", "c5"), ("c5", "c6"), ("c1", "c6")]:
+        i, j = list(frame.columns).index(a), list(frame.columns).index(b)
+        single = spearman_columns(ranks, a, b)
+        assert result["correlation"][i][j] == pytest.approx(single["correlation"], abs=1e-12)
+        assert result["p_value"][i][j] == pytest.approx(single["p_value"], rel=1e-9)
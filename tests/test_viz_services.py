@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.services import viz_services as v
+from backend.services.data_store import DataStore
+
+SESSION = "test-viz"
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    n = 600
+    df = pd.DataFrame({
+        "age": rng.normal(50, 10, n),
+        "bmi": rng.normal(27, 4, n),
+        "group": rng.choice(["a", "b", "c"], n),
+        "city": pd.Series([f"v{i}" for i in rng.integers(0, 40, n)], dtype=object),
+    })
+    df.loc[rng.random(n) < 0.1, "age"] = np.nan
+    df.loc[rng.random(n) < 0.1, "group"] = None
+    DataStore.set_df(df, SESSION)
+    yield df
+    DataStore.drop(SESSION)
+
+
+def test_histogram_and_boxplot_use_numeric_view(frame):
+    fig = v.histogram("age", 20, SESSION)
+    assert np.allclose(np.sort(fig.data[0].x), np.sort(frame["age"].dropna()))
+    assert fig.layout.xaxis.title.text == "age"
+    fig = v.boxplot("bmi", "group", SESSION)
+    assert np.allclose(fig.data[0].y, frame["bmi"])
+    present = frame["group"].notna().to_numpy()
+    assert list(np.asarray(fig.data[0].x)[present]) == list(frame["group"][present])
+    with pytest.raises(ValueError):
+        v.histogram("absente", 20, SESSION)
+
+
+@pytest.mark.parametrize("mode", ["points", "sample", "density"])
+def test_scatter_keeps_complete_rows(frame, mode, monkeypatch):
+    monkeypatch.setattr(v, "SCATTER_MAX_POINTS", 200)
+    hue = "group" if mode == "sample" else None
+    fig = v.scatter("age", "bmi", hue, SESSION, mode=mode)
+    complete = frame.dropna(subset=["age", "bmi"] + ([hue] if hue else []))
+    if mode == "density":
+        assert fig.data[0].z is not None
+        assert f"{len(complete)} points" in fig.layout.title.text
+        return
+    xs = np.concatenate([t.x for t in fig.data])
+    ys = np.concatenate([t.y for t in fig.data])
+    pairs = set(zip(complete["age"], complete["bmi"]))
+    assert all(p in pairs for p in zip(xs, ys))
+    if mode == "points":
+        assert len(xs) == len(complete)
+    else:
+        assert len(xs) < len(complete)
+        assert {t.name for t in fig.data} == {"a", "b", "c"}
+
+
+@pytest.mark.parametrize("col, topk", [("group", 10), ("group", 2), ("city", 5), ("city", 30)])
+def test_category_counts_match_value_counts(frame, col, topk):
+    fig = v.bar(col, topk, SESSION)
+    expected = frame[col].value_counts(dropna=False).head(topk)
+    assert list(fig.data[0].y) == list(expected.to_numpy())
+    fig = v.line(col, col, SESSION)
+    assert sorted(fig.data[0].values) == sorted(frame[col].value_counts(dropna=False).to_numpy())